@@ -1,8 +1,42 @@
+import multiprocessing
+import os
+
 from flask import Flask
 from routes.main import main_bp
+from routes.exportar import exportar_bp
+from routes.graficos import graficos_bp
+from routes.recursos import recursos_bp
+from routes.render import render_bp
+from routes.trabajos import trabajos_bp
+from servicios import hexagonos, recursos
 
 app = Flask(__name__)
 app.register_blueprint(main_bp)
+app.register_blueprint(graficos_bp)
+app.register_blueprint(recursos_bp)
+app.register_blueprint(trabajos_bp)
+app.register_blueprint(exportar_bp)
+app.register_blueprint(render_bp)
+
+# Copias locales de Bootstrap/jQuery/Leaflet si existe static/vendor/manifest.json
+recursos.instalar(app)
+
+# Piramide de hexagonos precalculada en segundo plano (tarda varios segundos).
+# No en los procesos hijos de los pools, que con "spawn" vuelven a importar
+# este modulo como __mp_main__ cuando corre como script, ni en el proceso
+# vigilante del recargador de debug. PRECALCULAR=0 lo desactiva.
+def _precalcular_al_arrancar():
+    if os.environ.get("PRECALCULAR", "1") == "0":
+        return False
+    if __name__ == "__mp_main__" or multiprocessing.current_process().name != "MainProcess":
+        return False
+    if __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return False
+    return True
+
+
+if _precalcular_al_arrancar():
+    hexagonos.precalcular()
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5001)
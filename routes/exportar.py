@@ -0,0 +1,32 @@
+from flask import Blueprint, Response, abort, request
+
+from routes.main import SCOPES_TIPO, elegir_dataset, recordar_dataset
+from servicios.exportar import FORMATOS, exportar, tabla_parroquias
+
+
+exportar_bp = Blueprint("exportar", __name__, url_prefix="/export")
+
+exportar_bp.before_request(elegir_dataset)
+exportar_bp.after_request(recordar_dataset)
+
+
+@exportar_bp.route("/parroquias.<formato>")
+def exportar_parroquias(formato):
+    # ?scope=todas|rurales|urbanas&geometria=1. La tabla se arma en el request
+    # (desde las fuentes cacheadas) y el archivo se genera por bloques mientras
+    # se envia.
+    if formato not in FORMATOS:
+        abort(404, f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    scope = request.args.get("scope", default="todas", type=str).lower()
+    if scope not in SCOPES_TIPO:
+        abort(400, f"scope debe ser uno de: {', '.join(SCOPES_TIPO)}")
+    geometria = bool(request.args.get("geometria", default=0, type=int))
+    if formato == "xlsx" and geometria:
+        abort(400, "xlsx no admite geometria: usar geojson, parquet o csv")
+
+    gdf = tabla_parroquias(scope)
+    return Response(
+        exportar(gdf, formato, geometria=geometria),
+        mimetype=FORMATOS[formato],
+        headers={"Content-Disposition": f"attachment; filename=parroquias_{scope}.{formato}"},
+    )
@@ -0,0 +1,70 @@
+from concurrent.futures import CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, Response, abort, request
+
+from servicios.graficos import ANIOS, AREAS, FORMATOS, descartar_grafico, solicitar_grafico
+
+
+graficos_bp = Blueprint("graficos", __name__, url_prefix="/graficos")
+
+
+GRAFICOS_TIMEOUT = 60  # segundos de espera maxima por un render
+
+
+def leer_formato():
+    formato = request.args.get("formato", default="png", type=str).lower()
+    if formato not in FORMATOS:
+        abort(400, f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    return formato
+
+
+def responder_grafico(tipo, params, formato):
+    # El render corre en otro proceso; este hilo solo espera el resultado
+    # (sin retener el GIL), o lo recibe al instante si ya estaba cacheado.
+    futuro = solicitar_grafico(tipo, params, formato)
+    try:
+        contenido = futuro.result(timeout=GRAFICOS_TIMEOUT)
+    except KeyError as e:
+        abort(404, f"Sector sin datos: {e}")
+    except TimeoutError:
+        descartar_grafico(tipo, params, formato)
+        abort(504, f"El grafico no estuvo listo en {GRAFICOS_TIMEOUT} s; reintente")
+    except (BrokenProcessPool, CancelledError):
+        # El worker murio; el pool ya se reemplazo y el proximo pedido reintenta.
+        abort(503, "El proceso de graficos fallo; reintente")
+
+    respuesta = Response(contenido, mimetype=FORMATOS[formato])
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = 3600
+    return respuesta
+
+
+@graficos_bp.route("/piramide")
+def grafico_piramide():
+    area = request.args.get("area", default=None, type=str)
+    anio = request.args.get("anio", default=None, type=int)
+
+    if area is not None:
+        area = area.capitalize()
+        if area not in AREAS:
+            abort(400, f"area debe ser una de: {', '.join(AREAS)}")
+    if anio is not None and anio not in ANIOS:
+        abort(400, f"anio debe ser uno de: {', '.join(str(a) for a in ANIOS)}")
+    if area is None and anio is None:
+        abort(400, "Indique area y/o anio")
+
+    return responder_grafico("piramide", {"area": area, "anio": anio}, leer_formato())
+
+
+@graficos_bp.route("/sectores")
+def grafico_sectores():
+    base = request.args.get("base", default="UDLA", type=str).strip().upper()
+    otro = request.args.get("otro", default=None, type=str)
+
+    if not otro:
+        abort(400, "Indique el sector a comparar (otro)")
+
+    return responder_grafico(
+        "sectores", {"base": base, "otro": otro.strip().upper()}, leer_formato()
+    )
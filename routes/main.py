@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, abort, g, has_request_context, render_template, request
 import geopandas as gpd
 import pandas as pd
 
@@ -7,11 +7,68 @@ import folium
 import os
 import unicodedata
 import json
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from servicios.captacion import capa_anillos, cargar_campus
+from servicios.carga import cargar_concurrente
+from servicios.clasificacion import METODOS, clasificacion, cortes_cuantiles
+from servicios.clusters import clusterizar_parroquias
+from servicios.datasets import obtener_de_cache, obtener_dataset, obtener_o_construir
+from servicios.etiquetas import etiquetas_cacheadas
+from servicios.hexagonos import TAMANOS_M
+from servicios.proyeccion import ANIO_BASE, claves_parroquias, proyeccion_parroquias, tabla_poblacion_base
+from servicios.topojson import codificar_topologia, copia_estilable
+from servicios.trabajos import calcular
+from servicios.vectorial import leer_vector
 
 
 main_bp = Blueprint("main", __name__)
 
 
+@main_bp.before_request
+def elegir_dataset():
+    # ?dataset=<nombre> elige la region; la eleccion queda en una cookie para que
+    # la navegacion entre vistas siga en la misma region.
+    nombre = request.args.get("dataset") or request.cookies.get("dataset")
+    try:
+        g.dataset = obtener_dataset(nombre)
+    except KeyError:
+        abort(404, f"Dataset desconocido: {nombre}")
+
+
+@main_bp.after_request
+def recordar_dataset(respuesta):
+    if "dataset" in request.args and "dataset" in g:
+        respuesta.set_cookie("dataset", g.dataset.nombre, samesite="Lax")
+    return respuesta
+
+
+_dataset_forzado = contextvars.ContextVar("dataset_forzado", default=None)
+
+
+@contextmanager
+def usar_dataset(ds):
+    # Fija el dataset fuera de un request (p. ej. en un worker de servicios.trabajos).
+    token = _dataset_forzado.set(ds)
+    try:
+        yield ds
+    finally:
+        _dataset_forzado.reset(token)
+
+
+def dataset_actual():
+    # Dataset del request en curso; fuera de un request (CLIs, notebooks), el fijado
+    # con usar_dataset o el por defecto.
+    forzado = _dataset_forzado.get()
+    if forzado is not None:
+        return forzado
+    if has_request_context() and "dataset" in g:
+        return g.dataset
+    return obtener_dataset()
+
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
@@ -72,14 +129,14 @@ def obtener_nombre(row):
     return "Sin nombre"
 
 
-def obtener_codigo(row):
+def obtener_codigo(row, codigo_otras=None):
     for campo in ["DPA_PARROQ", "dpa_parroq", "Cod_Parr"]:
         valor = row.get(campo, None)
         if pd.notna(valor) and str(valor).strip() != "" and str(valor) != "nan":
             return str(valor)
 
     nombre_norm = normalizar_nombre(obtener_nombre(row))
-    return CODIGO_OTRAS.get(nombre_norm, "")
+    return (CODIGO_OTRAS if codigo_otras is None else codigo_otras).get(nombre_norm, "")
 
 
 def convertir_a_porcentaje(valor):
@@ -93,39 +150,121 @@ def convertir_a_porcentaje(valor):
     return None
 
 
+# Unicos atributos que usan las rutas; el resto no se lee del GeoJSON.
+COLUMNAS_PARROQUIA = [
+    "nombre",
+    "DPA_DESPAR",
+    "dpa_despar",
+    "DPA_PARROQ",
+    "dpa_parroq",
+    "Cod_Parr",
+    "A_ZONAL",
+    "AD_ZONAL",
+    "ur_ru",
+]
+
+
+def leer_parroquias(ruta, where=None):
+    return asegurar_crs(leer_vector(ruta, columnas=COLUMNAS_PARROQUIA, where=where), DEFAULT_CRS)
+
+
+def filtro_otras(ds, ur_ru):
+    # Subconjunto de otras.geojson por tipo, sin las parroquias excluidas del dataset.
+    condiciones = [f"ur_ru = '{ur_ru}'"] + [f"nombre <> '{n}'" for n in ds.excluir_otras]
+    return " AND ".join(condiciones)
+
+
+# Cada lector recibe el dataset (rutas y filtros de la region).
+FUENTES = {
+    "rurales": lambda ds: leer_parroquias(ds.ruta("rurales")),
+    "urbanas": lambda ds: leer_parroquias(ds.ruta("urbanas")),
+    "otras": lambda ds: leer_parroquias(ds.ruta("otras")),
+    # Subconjuntos de otras.geojson filtrados en el lector (en Quito, sin FAJARDO).
+    "otras_rurales": lambda ds: leer_parroquias(ds.ruta("otras"), where=filtro_otras(ds, "RURAL")),
+    "otras_urbanas": lambda ds: leer_parroquias(ds.ruta("otras"), where=filtro_otras(ds, "URBANO")),
+    "crecimiento": lambda ds: pd.read_excel(ds.ruta("crecimiento")),
+    "poblacion": lambda ds: pd.read_excel(ds.ruta("poblacion")),
+    "desglose": lambda ds: pd.read_excel(ds.ruta("desglose")),
+}
+
+
+def cargar_fuentes(*nombres, dataset=None):
+    # Fuentes ya leidas, por dataset y version de datos. Las que faltan se leen
+    # todas juntas en el pool de hilos; si otro request ya esta leyendo alguna,
+    # se espera esa lectura en vez de repetirla. Los objetos devueltos son
+    # compartidos: no mutarlos.
+    ds = dataset or dataset_actual()
+    nombres = nombres or tuple(FUENTES)
+    fuentes = {nombre: obtener_de_cache(ds, "fuentes", nombre) for nombre in nombres}
+
+    faltantes = {
+        nombre: (
+            lambda nombre=nombre: obtener_o_construir(
+                ds, "fuentes", nombre, lambda: FUENTES[nombre](ds)
+            )
+        )
+        for nombre, valor in fuentes.items()
+        if valor is None
+    }
+    if faltantes:
+        resultados, _ = cargar_concurrente(faltantes)
+        fuentes.update(resultados)
+
+    return fuentes
+
+
+COLUMNAS_PARROQUIAS = ["codigo", "nombre", "tipo", "zona_admin", "geometry"]
+
+
 def cargar_parroquias(scope="todas"):
     scope = (scope or "todas").lower()
+    ds = dataset_actual()
+
+    necesarias = {
+        "rurales": ("rurales",),
+        "urbanas": ("urbanas",),
+    }.get(scope, ("rurales", "urbanas", "otras"))
+    fuentes = cargar_fuentes(*necesarias)
+
+    # Cada fuente se reduce a las columnas finales antes del concat, asi la
+    # union no arrastra los atributos crudos de los shapefiles.
+    def reducir(fuente, tipo, zona):
+        gdf = gpd.GeoDataFrame(
+            {
+                "nombre": fuente.apply(obtener_nombre, axis=1),
+                "codigo": fuente.apply(obtener_codigo, axis=1, codigo_otras=ds.codigo_otras),
+                "tipo": tipo,
+                "zona_admin": zona,
+            },
+            geometry=fuente.geometry.values,
+            crs=fuente.crs,
+        )
+        return gdf[COLUMNAS_PARROQUIAS]
 
     gdfs = []
 
     if scope in ("todas", "rurales"):
-        gdf_rurales = asegurar_crs(gpd.read_file(GJSON_RURAL), DEFAULT_CRS).copy()
-        gdf_rurales["tipo"] = "RURAL"
-        gdf_rurales["zona_admin"] = gdf_rurales.get("A_ZONAL", None)
-        gdfs.append(gdf_rurales)
+        rurales = fuentes["rurales"]
+        gdfs.append(reducir(rurales, "RURAL", rurales.get("A_ZONAL", None)))
 
     if scope in ("todas", "urbanas"):
-        gdf_urbanas = asegurar_crs(gpd.read_file(GJSON_URBANA), DEFAULT_CRS).copy()
-        gdf_urbanas["tipo"] = "URBANO"
-        gdf_urbanas["zona_admin"] = gdf_urbanas.get("AD_ZONAL", None)
-        gdfs.append(gdf_urbanas)
+        urbanas = fuentes["urbanas"]
+        gdfs.append(reducir(urbanas, "URBANO", urbanas.get("AD_ZONAL", None)))
 
     if scope == "todas":
-        gdf_otras = asegurar_crs(gpd.read_file(GJSON_OTRAS), DEFAULT_CRS).copy()
-        gdf_otras["tipo"] = gdf_otras.get("ur_ru", "OTRAS")
-        gdf_otras["zona_admin"] = gdf_otras.get("ur_ru", None)
-        gdfs.append(gdf_otras)
+        otras = fuentes["otras"]
+        gdfs.append(reducir(otras, otras.get("ur_ru", "OTRAS"), otras.get("ur_ru", None)))
 
     gdf = pd.concat(gdfs, ignore_index=True)
-    gdf["nombre"] = gdf.apply(obtener_nombre, axis=1)
-    gdf["codigo"] = gdf.apply(obtener_codigo, axis=1)
-
-    cols = ["codigo", "nombre", "tipo", "zona_admin", "geometry"]
-    return gdf[cols].copy()
+    # Pocas categorias distintas: `category` guarda un codigo por fila.
+    for columna in ("tipo", "zona_admin"):
+        gdf[columna] = gdf[columna].astype("category")
+    return gdf
 
 
-def cargar_config_sectorial():
-    if not os.path.exists(SECTORES_CONFIG_PATH):
+def cargar_config_sectorial(ruta=None):
+    ruta = ruta or dataset_actual().ruta("sectores")
+    if not os.path.exists(ruta):
         return {
             "por_parroquia": {},
             "por_zona": {},
@@ -133,7 +272,7 @@ def cargar_config_sectorial():
             "default": "OTROS",
         }
 
-    with open(SECTORES_CONFIG_PATH, "r", encoding="utf-8") as f:
+    with open(ruta, "r", encoding="utf-8") as f:
         cfg = json.load(f)
 
     cfg.setdefault("por_parroquia", {})
@@ -148,9 +287,10 @@ def clasificar_sectorial(gdf, config=None):
     cfg = config or cargar_config_sectorial()
 
     # Centroides (lat/lon) para regla Norte/Sur cuando no hay match por zona o parroquia.
-    gdf_proj = asegurar_crs(gdf, DEFAULT_CRS).to_crs(AREA_CRS)
+    area_crs = dataset_actual().area_crs
+    gdf_proj = asegurar_crs(gdf, DEFAULT_CRS).to_crs(area_crs)
     centroides_proj = gdf_proj.geometry.centroid
-    centroides_wgs84 = gpd.GeoSeries(centroides_proj, crs=AREA_CRS).to_crs(DEFAULT_CRS)
+    centroides_wgs84 = gpd.GeoSeries(centroides_proj, crs=area_crs).to_crs(DEFAULT_CRS)
     gdf["lon"] = centroides_wgs84.x.astype(float)
     gdf["lat"] = centroides_wgs84.y.astype(float)
 
@@ -211,160 +351,346 @@ def clasificar_sectorial(gdf, config=None):
 
         return default_sector
 
-    gdf["sector"] = gdf.apply(sector_row, axis=1)
+    gdf["sector"] = gdf.apply(sector_row, axis=1).astype("category")
     return gdf
 
 
-@main_bp.route("/")
-def mapa_rural():
+PALETA_AZULES = ["#E6F2FF", "#CCE5FF", "#99CCFF", "#66B3FF", "#3399FF", "#0070C0"]
 
-    # Cargar parroquias rurales
+# 7 colores combinando azules y cafes pastel (mismos que /sectores)
+PALETA_SECTORES = [
+    "#C8A882",
+    "#A8C8E1",
+    "#D4C5B9",
+    "#7BB3D9",
+    "#A68A6D",
+    "#4A7BA7",
+    "#F0E6D2",
+]
 
-    gdf_rurales = gpd.read_file(GJSON_RURAL)
+# Metodo por defecto para las variables continuas; ?clasificacion= lo cambia.
+METODO_CLASIFICACION = "jenks"
 
-    # Asegurar que esté en EPSG:4326 (WGS84)
 
-    if gdf_rurales.crs != "EPSG:4326":
+def clase_por_cortes(valor, cortes):
+    if valor is None or pd.isna(valor):
+        return None
+    return int(np.searchsorted(cortes, valor, side="right"))
 
-        gdf_rurales = gdf_rurales.to_crs("EPSG:4326")
 
-    # Cargar parroquias de otras.geojson y filtrar las rurales
+def metodo_pedido():
+    metodo = request.args.get("clasificacion", default=METODO_CLASIFICACION, type=str)
+    return metodo if metodo in METODOS else METODO_CLASIFICACION
 
-    gdf_otras = gpd.read_file(GJSON_OTRAS)
 
-    if gdf_otras.crs != "EPSG:4326":
+def valores_tasa(gdf):
+    df = cargar_fuentes("crecimiento")["crecimiento"]
+    tasas = dict(
+        zip(df["Cod_Parr"].astype(str), df["Tasa de crecimiento anual poblacion"])
+    )
+    return [convertir_a_porcentaje(tasas.get(str(c))) for c in gdf["codigo"]]
 
-        gdf_otras = gdf_otras.to_crs("EPSG:4326")
 
-    # Filtrar solo las rurales de otras y excluir FAJARDO
+def valores_poblacion(gdf):
+    # Por canton y nombre, sin los agregados del Excel (ver tabla_poblacion_base).
+    tabla = tabla_poblacion_base()
+    porcentajes = dict(zip(zip(tabla["canton"], tabla["nombre"]), tabla["porcentaje"]))
+    return [convertir_a_porcentaje(porcentajes.get(clave)) for clave in claves_parroquias(gdf)]
 
-    gdf_otras_rurales = gdf_otras[
-        (gdf_otras["ur_ru"] == "RURAL") & (gdf_otras["nombre"] != "FAJARDO")
-    ].copy()
 
-    # Combinar ambos GeoDataFrames
+VALORES_CLASIFICABLES = {
+    "tasa": valores_tasa,
+    "poblacion": valores_poblacion,
+}
 
-    gdf_rurales = pd.concat([gdf_rurales, gdf_otras_rurales], ignore_index=True)
 
-    # Cargar datos de crecimiento desde Excel
+def clasificacion_variable(variable, metodo=None):
+    # Cortes y leyenda sobre todas las parroquias del dataset (los mismos en /,
+    # /urbanas y /comparar), cacheados por version de datos.
+    metodo = metodo or METODO_CLASIFICACION
+    ds = dataset_actual()
 
-    df_crecimiento = pd.read_excel(EXCEL_PATH)
+    def construir():
+        valores = VALORES_CLASIFICABLES[variable](cargar_parroquias(scope="todas"))
+        return clasificacion(valores, metodo, clases=len(PALETA_AZULES), unidad="%")
 
-    # Convertir Cod_Parr a string para hacer match
-
-    df_crecimiento["Cod_Parr"] = df_crecimiento["Cod_Parr"].astype(str)
+    return obtener_o_construir(ds, "clasificacion", (variable, metodo), construir)
 
-    # Crear diccionario de codigo -> tasa de crecimiento
 
-    tasa_dict = dict(
-        zip(
-            df_crecimiento["Cod_Parr"],
-            df_crecimiento["Tasa de crecimiento anual poblacion"],
-        )
+def leyenda_clases(titulo, colores, etiquetas):
+    items = "\n".join(
+        f"""
+        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+            <div style="width: 20px; height: 20px; background-color: {color}; border: 1px solid black; margin-right: 10px;"></div>
+            <span>{etiqueta}</span>
+        </div>
+        """
+        for color, etiqueta in zip(colores, etiquetas)
     )
+    return f"""
+    <div style="position: fixed;
+                bottom: 50px; right: 10px; width: 250px; height: auto;
+                background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
+                padding: 10px; border-radius: 5px;">
+        <p style="margin: 0 0 10px 0; font-weight: bold;">{titulo}</p>
+        {items}
+    </div>
+    """
 
-    # Función para obtener color según la tasa de crecimiento
 
-    def get_color(tasa):
+def agregar_etiquetas(grupo, capa, gdf, lineas, prioridad=None):
+    # Nombres de las parroquias anclados en su polo de inaccesibilidad. Cada
+    # etiqueta lleva en data-zooms los zooms en los que no choca con otra mas
+    # prioritaria; layout.html oculta las demas al cambiar el zoom.
+    ubicacion = etiquetas_cacheadas(capa, gdf, lineas, prioridad)
+    for lon, lat, zooms, textos in zip(ubicacion["lon"], ubicacion["lat"], ubicacion["zooms"], lineas):
+        if not zooms or pd.isna(lon) or pd.isna(lat):
+            continue
+        filas = "".join(f"<div>{texto}</div>" for texto in textos)
+        html_label = f"""
+        <div class="parroquia-label" data-zooms="{','.join(map(str, zooms))}" style="font-weight: bold; color: black; text-align: center; white-space: nowrap; transform: translate(-50%, -50%);">
+            {filas}
+        </div>
+        """
+        folium.Marker(
+            location=[lat, lon],
+            icon=folium.DivIcon(html=html_label, icon_size=(0, 0), icon_anchor=(0, 0)),
+        ).add_to(grupo)
+
+
+def metrica_tasa(gdf, metodo=None):
+    valores = valores_tasa(gdf)
+    clases = clasificacion_variable("tasa", metodo)
+    return {
+        "titulo": "Tasa de crecimiento anual población",
+        "valores": [None if v is None else round(v, 2) for v in valores],
+        "clases": [clase_por_cortes(v, clases["cortes"]) for v in valores],
+        "colores": PALETA_AZULES,
+        "etiquetas": clases["etiquetas"],
+    }
 
-        if tasa is None:
-            return "transparent"
 
-        # Convertir a porcentaje si está en decimal
+def metrica_poblacion(gdf, metodo=None):
+    valores = valores_poblacion(gdf)
+    clases = clasificacion_variable("poblacion", metodo)
+    return {
+        "titulo": "Población parroquias",
+        "valores": [None if v is None else round(v, 2) for v in valores],
+        "clases": [clase_por_cortes(v, clases["cortes"]) for v in valores],
+        "colores": PALETA_AZULES,
+        "etiquetas": clases["etiquetas"],
+    }
 
-        tasa_porcentaje = tasa * 100 if tasa < 1 else tasa
 
-        if tasa_porcentaje < -1.64:
+def metrica_sector(gdf, config_path=None):
+    config_path = config_path or dataset_actual().ruta("sectores")
+    sectores = clasificar_sectorial(gdf, config=cargar_config_sectorial(config_path))[
+        "sector"
+    ]
+    nombres = sorted(sectores.dropna().unique().tolist())
+    indice = {s: i for i, s in enumerate(nombres)}
+    return {
+        "titulo": f"Sectores ({os.path.basename(config_path)})",
+        "valores": sectores.tolist(),
+        "clases": [indice.get(s) for s in sectores],
+        "colores": [PALETA_SECTORES[i % len(PALETA_SECTORES)] for i in range(len(nombres))],
+        "etiquetas": nombres,
+    }
 
-            return "#E6F2FF"  # Azul muy claro (casi blanco)
 
-        elif tasa_porcentaje < -0.46:
+def metrica_zona(gdf):
+    zonas = [None if pd.isna(z) else z for z in gdf["zona_admin"]]
+    nombres = sorted({str(z) for z in zonas if z is not None})
+    indice = {z: i for i, z in enumerate(nombres)}
+    return {
+        "titulo": "Zona administrativa",
+        "valores": [None if z is None else str(z) for z in zonas],
+        "clases": [None if z is None else indice[str(z)] for z in zonas],
+        "colores": [PALETA_SECTORES[i % len(PALETA_SECTORES)] for i in range(len(nombres))],
+        "etiquetas": nombres,
+    }
 
-            return "#CCE5FF"  # Azul muy claro
 
-        elif tasa_porcentaje < 1.18:
+# Rojo/azul para clusters significativos (hot/cold spots), tonos claros para outliers.
+COLORES_LISA = {
+    "HH": "#D7191C",
+    "LL": "#2C7BB6",
+    "HL": "#FDAE61",
+    "LH": "#ABD9E9",
+    "NS": "#EEEEEE",
+}
 
-            return "#99CCFF"  # Azul claro
+ETIQUETAS_LISA = {
+    "HH": "Alto-Alto (hot spot)",
+    "LL": "Bajo-Bajo (cold spot)",
+    "HL": "Alto rodeado de bajos",
+    "LH": "Bajo rodeado de altos",
+    "NS": "No significativo",
+}
 
-        elif tasa_porcentaje < 2.44:
 
-            return "#66B3FF"  # Azul medio claro
+def metrica_lisa(gdf, scope="todas", variable="tasa"):
+    # Capa de hot spots de LISA; `gdf` debe ser cargar_parroquias(scope), en el
+    # mismo orden, porque el resultado se calcula (y cachea) por scope.
+    resultado = calcular(
+        "autocorrelacion",
+        {"variable": variable, "scope": scope, "criterio": "queen", "permutaciones": 999},
+        dataset=dataset_actual().nombre,
+    )
+    if resultado["codigos"] != gdf["codigo"].astype(str).tolist():
+        raise ValueError("metrica_lisa: gdf no coincide con cargar_parroquias(scope)")
+
+    claves = list(COLORES_LISA)
+    cuadrantes = resultado["local"]["cuadrante"]
+    return {
+        "titulo": f"LISA {variable} (I global = {resultado['global']['I']:.3f}, p = {resultado['global']['p']:.3f})",
+        "valores": [None if c is None else ETIQUETAS_LISA[c] for c in cuadrantes],
+        "clases": [None if c is None else claves.index(c) for c in cuadrantes],
+        "colores": list(COLORES_LISA.values()),
+        "etiquetas": list(ETIQUETAS_LISA.values()),
+    }
 
-        elif tasa_porcentaje < 3.32:
 
-            return "#3399FF"  # Azul medio
-        else:
+def capa_indexada(gdf):
+    # Geometria con solo `idx` y `nombre`: los valores viajan aparte como arreglos
+    # alineados por `idx`, asi varias vistas pueden compartir la misma geometria.
+    return gpd.GeoDataFrame(
+        {"idx": range(len(gdf)), "nombre": gdf["nombre"].astype(str)},
+        geometry=gdf.geometry.values,
+        crs=gdf.crs,
+    )
 
-            return "#0070C0"  # Azul oscuro
 
-    # Crear mapa centrado en Ecuador
+# "topojson" (arcos compartidos, cuantizados) o "geojson" (doble precision, como antes)
+MODO_GEOMETRIA = os.environ.get("MODO_GEOMETRIA", "topojson").lower()
 
-    m = folium.Map(location=[-0.20, -78.50], zoom_start=11, tiles="cartodbpositron")
+def topologia_parroquias(scope="todas"):
+    # Capa indexada de `cargar_parroquias(scope)` codificada como TopoJSON, una vez
+    # por dataset y version de datos. Se comparte entre requests: no mutarla (ver
+    # copia_estilable).
+    scope = (scope or "todas").lower()
+    return obtener_o_construir(
+        dataset_actual(),
+        "topologias",
+        scope,
+        lambda: codificar_topologia(
+            capa_indexada(cargar_parroquias(scope=scope)), propiedades=("idx", "nombre")
+        ),
+    )
 
-    # Añadir leyenda
 
-    legend_html = """
+def recursos_leaflet():
+    # Mismas URLs que usa folium, para que las vistas con Leaflet "a mano" carguen
+    # exactamente la misma version que los mapas de folium.
+    js = dict(folium.Map.default_js)
+    css = dict(folium.Map.default_css)
+    return {
+        "leaflet_js": js["leaflet"],
+        "leaflet_css": css["leaflet_css"],
+        "topojson_js": dict(folium.TopoJson.default_js)["topojson"],
+    }
 
-    <div style="position: fixed; 
 
-                bottom: 50px; right: 10px; width: 250px; height: auto; 
+def pagina_cacheada(parametros=lambda: ()):
+    # Mapas de folium renderizados una vez por ruta, parametros, dataset (cada
+    # uno tiene su cache) y version de datos: una rafaga de pedidos en frio
+    # espera un solo render. La clave sale de `parametros()`, los valores ya
+    # validados y normalizados que usa la vista, y no de la query completa: un
+    # parametro de mas o en otro orden no arma (ni guarda en disco) otra pagina.
+    # Sin stale-while-revalidate, porque el render necesita el request.
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            clave = (request.path, *parametros())
+            return obtener_o_construir(
+                dataset_actual(), "paginas", clave, lambda: vista(*args, **kwargs), swr=0
+            )
 
-                background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
+        return envoltura
 
-                padding: 10px; border-radius: 5px;">
+    return decorador
 
-        <p style="margin: 0 0 10px 0; font-weight: bold;">Tasa de crecimiento anual población</p>
 
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+def scope_pedido():
+    scope = request.args.get("scope", default="todas", type=str).lower()
+    if scope not in SCOPES_TIPO:
+        abort(400, f"scope debe ser uno de: {', '.join(SCOPES_TIPO)}")
+    return scope
 
-            <div style="width: 20px; height: 20px; background-color: #E6F2FF; border: 1px solid black; margin-right: 10px;"></div>
 
-            <span>-2.82 - -1.64</span>
+# Anios que acepta /proyeccion; fuera de este rango se recorta.
+ANIOS_PROYECCION = (ANIO_BASE - 50, ANIO_BASE + 100)
 
-        </div>
 
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+def rango_proyeccion():
+    desde = request.args.get("desde", default=ANIO_BASE, type=int)
+    hasta = request.args.get("hasta", default=ANIO_BASE + 15, type=int)
+    desde = min(max(desde, ANIOS_PROYECCION[0]), ANIOS_PROYECCION[1])
+    hasta = max(desde, min(hasta, desde + 100, ANIOS_PROYECCION[1]))
+    return desde, hasta
 
-            <div style="width: 20px; height: 20px; background-color: #CCE5FF; border: 1px solid black; margin-right: 10px;"></div>
 
-            <span>-1.63 - -0.46</span>
+@main_bp.route("/")
+@pagina_cacheada(lambda: (metodo_pedido(),))
+def mapa_rural():
 
-        </div>
+    # Cargar parroquias rurales, otras y crecimiento (en paralelo, cacheadas)
 
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+    fuentes = cargar_fuentes("rurales", "otras_rurales", "crecimiento")
 
-            <div style="width: 20px; height: 20px; background-color: #99CCFF; border: 1px solid black; margin-right: 10px;"></div>
+    gdf_rurales = fuentes["rurales"]
 
-            <span>-0.45 - 1.18</span>
+    # Asegurar que esté en EPSG:4326 (WGS84)
 
-        </div>
+    if gdf_rurales.crs != "EPSG:4326":
 
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+        gdf_rurales = gdf_rurales.to_crs("EPSG:4326")
 
-            <div style="width: 20px; height: 20px; background-color: #66B3FF; border: 1px solid black; margin-right: 10px;"></div>
+    # Parroquias rurales de otras.geojson, sin FAJARDO (filtrado en el lector)
 
-            <span>1.18 - 2.44</span>
+    gdf_otras_rurales = fuentes["otras_rurales"]
 
-        </div>
+    # Combinar ambos GeoDataFrames
 
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+    gdf_rurales = pd.concat([gdf_rurales, gdf_otras_rurales], ignore_index=True)
 
-            <div style="width: 20px; height: 20px; background-color: #3399FF; border: 1px solid black; margin-right: 10px;"></div>
+    # Cargar datos de crecimiento desde Excel
 
-            <span>2.44 - 3.32</span>
+    df_crecimiento = fuentes["crecimiento"].copy()
 
-        </div>
+    # Convertir Cod_Parr a string para hacer match
 
-        <div style="display: flex; align-items: center;">
+    df_crecimiento["Cod_Parr"] = df_crecimiento["Cod_Parr"].astype(str)
 
-            <div style="width: 20px; height: 20px; background-color: #0070C0; border: 1px solid black; margin-right: 10px;"></div>
+    # Crear diccionario de codigo -> tasa de crecimiento
 
-            <span>3.32 - 4.93</span>
+    tasa_dict = dict(
+        zip(
+            df_crecimiento["Cod_Parr"],
+            df_crecimiento["Tasa de crecimiento anual poblacion"],
+        )
+    )
 
-        </div>
+    # Colores segun los cortes de la clasificacion (calculados sobre los datos)
 
-    </div>
-    """
+    clases = clasificacion_variable("tasa", metodo_pedido())
+
+    def get_color(tasa):
+
+        clase = clase_por_cortes(convertir_a_porcentaje(tasa), clases["cortes"])
+
+        return "transparent" if clase is None else PALETA_AZULES[clase]
+
+    # Crear mapa centrado en Ecuador
+
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
+
+    # Añadir leyenda (generada a partir de los cortes)
+
+    legend_html = leyenda_clases(
+        "Tasa de crecimiento anual población", PALETA_AZULES, clases["etiquetas"]
+    )
 
     m.get_root().html.add_child(folium.Element(legend_html))
 
@@ -373,15 +699,11 @@ def mapa_rural():
     fg_parroquias = folium.FeatureGroup(name="Parroquias Rurales", show=True).add_to(m)
     fg_nombres = folium.FeatureGroup(name="Nombres (Rurales)", show=True).add_to(m)
 
-    # Mapeo de códigos para parroquias de otras.geojson
+    # Mapeo de códigos para parroquias de otras.geojson (por nombre normalizado)
 
-    codigo_otras = {
-        "SANGOLQUÍ": "170501",
-        "RUMIPAMBA": "170552",
-        "COTOGCHOA": "170551",
-        "SAN RAFAEL": "170503",
-        "SAN PEDRO": "170502",
-    }
+    codigo_otras = ds.codigo_otras
+
+    lineas_etiquetas = []
 
     for _, row in gdf_rurales.iterrows():
 
@@ -403,7 +725,7 @@ def mapa_rural():
 
             # Si no hay código, buscar en el mapeo de otras.geojson
 
-            codigo = codigo_otras.get(nombre, "")
+            codigo = codigo_otras.get(normalizar_nombre(nombre), "")
 
         # Obtener tasa de crecimiento
 
@@ -428,39 +750,20 @@ def mapa_rural():
             tooltip=folium.GeoJsonTooltip(fields=["nombre"], aliases=["Parroquia:"]),
         ).add_to(fg_parroquias)
 
-        # Añadir etiqueta con el nombre y la tasa de crecimiento en el centroide
-
-        centroide = row.geometry.centroid
+        # Texto de la etiqueta (se ubica despues, con todas las parroquias)
 
         if tasa is not None:
 
-            tasa_porcentaje = tasa * 100
-
-            html_label = f"""
+            lineas_etiquetas.append([nombre, f"{tasa * 100:.2f}%"])
 
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
-
-                <div>{nombre}</div>
-
-                <div>{tasa_porcentaje:.2f}%</div>
-
-            </div>
-            """
         else:
 
-            html_label = f"""
-
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
+            lineas_etiquetas.append([nombre])
 
-                <div>{nombre}</div>
+    # Etiquetas en el polo de inaccesibilidad de cada parroquia, solo en los
+    # zooms en que no se solapan con otra
 
-            </div>
-            """
-
-        folium.Marker(
-            location=[centroide.y, centroide.x],
-            icon=folium.DivIcon(html=html_label),
-        ).add_to(fg_nombres)
+    agregar_etiquetas(fg_nombres, "rurales", gdf_rurales, lineas_etiquetas)
 
     # Añadir control de capas
 
@@ -475,11 +778,14 @@ def mapa_rural():
 
 
 @main_bp.route("/urbanas")
+@pagina_cacheada(lambda: (metodo_pedido(),))
 def mapa_urbanas():
 
-    # Cargar parroquias urbanas
+    # Cargar parroquias urbanas, otras y crecimiento (en paralelo, cacheadas)
+
+    fuentes = cargar_fuentes("urbanas", "otras_urbanas", "crecimiento")
 
-    gdf_urbanas = gpd.read_file(GJSON_URBANA)
+    gdf_urbanas = fuentes["urbanas"]
 
     # Asegurar que esté en EPSG:4326 (WGS84)
 
@@ -487,19 +793,9 @@ def mapa_urbanas():
 
         gdf_urbanas = gdf_urbanas.to_crs("EPSG:4326")
 
-    # Cargar parroquias de otras.geojson y filtrar las urbanas
-
-    gdf_otras = gpd.read_file(GJSON_OTRAS)
-
-    if gdf_otras.crs != "EPSG:4326":
-
-        gdf_otras = gdf_otras.to_crs("EPSG:4326")
-
-    # Filtrar solo las urbanas de otras y excluir FAJARDO
+    # Parroquias urbanas de otras.geojson, sin FAJARDO (filtrado en el lector)
 
-    gdf_otras_urbanas = gdf_otras[
-        (gdf_otras["ur_ru"] == "URBANO") & (gdf_otras["nombre"] != "FAJARDO")
-    ].copy()
+    gdf_otras_urbanas = fuentes["otras_urbanas"]
 
     # Combinar ambos GeoDataFrames
 
@@ -507,7 +803,7 @@ def mapa_urbanas():
 
     # Cargar datos de crecimiento desde Excel
 
-    df_crecimiento = pd.read_excel(EXCEL_PATH)
+    df_crecimiento = fuentes["crecimiento"].copy()
 
     # Convertir Cod_Parr a string para hacer match
 
@@ -522,127 +818,40 @@ def mapa_urbanas():
         )
     )
 
-    # Función para obtener color según la tasa de crecimiento
-
-    def get_color(tasa):
-
-        if tasa is None:
-            return "transparent"
-
-        # Convertir a porcentaje si está en decimal
-
-        tasa_porcentaje = tasa * 100 if tasa < 1 else tasa
-
-        if tasa_porcentaje < -1.64:
-
-            return "#E6F2FF"  # Azul muy claro (casi blanco)
-
-        elif tasa_porcentaje < -0.46:
-
-            return "#CCE5FF"  # Azul muy claro
-
-        elif tasa_porcentaje < 1.18:
-
-            return "#99CCFF"  # Azul claro
-
-        elif tasa_porcentaje < 2.44:
+    # Colores segun los cortes de la clasificacion (calculados sobre los datos)
 
-            return "#66B3FF"  # Azul medio claro
+    clases = clasificacion_variable("tasa", metodo_pedido())
 
-        elif tasa_porcentaje < 3.32:
+    def get_color(tasa):
 
-            return "#3399FF"  # Azul medio
-        else:
+        clase = clase_por_cortes(convertir_a_porcentaje(tasa), clases["cortes"])
 
-            return "#0070C0"  # Azul oscuro
+        return "transparent" if clase is None else PALETA_AZULES[clase]
 
     # Crear mapa centrado en Ecuador
 
-    m = folium.Map(location=[-0.20, -78.50], zoom_start=11, tiles="cartodbpositron")
-
-    # Añadir leyenda
-
-    legend_html = """
-
-    <div style="position: fixed; 
-
-                bottom: 50px; right: 10px; width: 250px; height: auto; 
-
-                background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
-
-                padding: 10px; border-radius: 5px;">
-
-        <p style="margin: 0 0 10px 0; font-weight: bold;">Tasa de crecimiento anual población</p>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #E6F2FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>-2.82 - -1.64</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #CCE5FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>-1.63 - -0.46</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
 
-            <div style="width: 20px; height: 20px; background-color: #99CCFF; border: 1px solid black; margin-right: 10px;"></div>
+    # Añadir leyenda (generada a partir de los cortes)
 
-            <span>-0.45 - 1.18</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #66B3FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>1.18 - 2.44</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #3399FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>2.44 - 3.32</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center;">
-
-            <div style="width: 20px; height: 20px; background-color: #0070C0; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>3.32 - 4.93</span>
-
-        </div>
-
-    </div>
-    """
+    legend_html = leyenda_clases(
+        "Tasa de crecimiento anual población", PALETA_AZULES, clases["etiquetas"]
+    )
 
     m.get_root().html.add_child(folium.Element(legend_html))
 
-    # Mapeo de códigos para parroquias de otras.geojson
+    # Mapeo de códigos para parroquias de otras.geojson (por nombre normalizado)
 
-    codigo_otras = {
-        "SANGOLQUÍ": "170501",
-        "RUMIPAMBA": "170552",
-        "COTOGCHOA": "170551",
-        "SAN PEDRO": "170502",
-        "SAN RAFAEL": "170503",
-        "FAJARDO": "170504",
-    }
+    codigo_otras = ds.codigo_otras
 
     # Añadir capas: polígonos y etiquetas (nombres) para poder mostrar/ocultar.
 
     fg_parroquias = folium.FeatureGroup(name="Parroquias Urbanas", show=True).add_to(m)
     fg_nombres = folium.FeatureGroup(name="Nombres (Urbanas)", show=True).add_to(m)
 
+    lineas_etiquetas = []
+
     for _, row in gdf_urbanas.iterrows():
 
         # Obtener nombre y código de la parroquia (compatible con ambos GeoJSON)
@@ -663,7 +872,7 @@ def mapa_urbanas():
 
             # Si no hay código, buscar en el mapeo de otras.geojson
 
-            codigo = codigo_otras.get(nombre, "")
+            codigo = codigo_otras.get(normalizar_nombre(nombre), "")
 
         # Obtener tasa de crecimiento
 
@@ -688,39 +897,20 @@ def mapa_urbanas():
             tooltip=folium.GeoJsonTooltip(fields=["nombre"], aliases=["Parroquia:"]),
         ).add_to(fg_parroquias)
 
-        # Añadir etiqueta con el nombre y la tasa de crecimiento en el centroide
-
-        centroide = row.geometry.centroid
+        # Texto de la etiqueta (se ubica despues, con todas las parroquias)
 
         if tasa is not None:
 
-            tasa_porcentaje = tasa * 100
-
-            html_label = f"""
-
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
+            lineas_etiquetas.append([nombre, f"{tasa * 100:.2f}%"])
 
-                <div>{nombre}</div>
-
-                <div>{tasa_porcentaje:.2f}%</div>
-
-            </div>
-            """
         else:
 
-            html_label = f"""
-
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
+            lineas_etiquetas.append([nombre])
 
-                <div>{nombre}</div>
+    # Etiquetas en el polo de inaccesibilidad de cada parroquia, solo en los
+    # zooms en que no se solapan con otra
 
-            </div>
-            """
-
-        folium.Marker(
-            location=[centroide.y, centroide.x],
-            icon=folium.DivIcon(html=html_label),
-        ).add_to(fg_nombres)
+    agregar_etiquetas(fg_nombres, "urbanas", gdf_urbanas, lineas_etiquetas)
 
     # Añadir control de capas
 
@@ -735,6 +925,7 @@ def mapa_urbanas():
 
 
 @main_bp.route("/poblacion")
+@pagina_cacheada(lambda: (metodo_pedido(),))
 def mapa_poblacion():
 
     # Función para normalizar nombres (sin tildes y en mayúsculas)
@@ -756,13 +947,15 @@ def mapa_poblacion():
 
         return nombre_sin_tildes.upper()
 
-    # Cargar todas las parroquias (rurales, urbanas y otras)
+    # Cargar todas las parroquias (rurales, urbanas y otras) y la poblacion
+
+    fuentes = cargar_fuentes("rurales", "urbanas", "otras", "poblacion")
 
-    gdf_rurales = gpd.read_file(GJSON_RURAL)
+    gdf_rurales = fuentes["rurales"]
 
-    gdf_urbanas = gpd.read_file(GJSON_URBANA)
+    gdf_urbanas = fuentes["urbanas"]
 
-    gdf_otras = gpd.read_file(GJSON_OTRAS)
+    gdf_otras = fuentes["otras"]
 
     # Asegurar que todas estén en EPSG:4326 (WGS84)
 
@@ -798,22 +991,24 @@ def mapa_poblacion():
 
         return "Sin nombre"
 
-    # Normalizar nombres de parroquias en el GeoDataFrame
+    # Clave de union con el Excel: canton (prefijo del codigo) y nombre
 
-    gdf_todas["nombre_normalizado"] = gdf_todas.apply(
-        lambda row: normalizar_nombre(obtener_nombre(row)),
-        axis=1,
+    gdf_todas["clave_poblacion"] = claves_parroquias(
+        pd.DataFrame(
+            {
+                "codigo": gdf_todas.apply(
+                    obtener_codigo, axis=1, codigo_otras=dataset_actual().codigo_otras
+                ),
+                "nombre": gdf_todas.apply(obtener_nombre, axis=1),
+            }
+        )
     )
 
-    # Cargar datos de población desde Excel
+    # Cargar datos de población desde Excel (sin los agregados repetidos)
 
-    df_poblacion = pd.read_excel(EXCEL_POBLACION)
+    df_poblacion = tabla_poblacion_base().rename(columns={"porcentaje": "Porcentaje"})
 
-    # Normalizar nombres de parroquias en el Excel
-
-    df_poblacion["Parroquia_normalizada"] = df_poblacion["Parroquia"].apply(
-        normalizar_nombre
-    )
+    df_poblacion["clave_poblacion"] = list(zip(df_poblacion["canton"], df_poblacion["nombre"]))
 
     # Convertir porcentaje a número para cálculos
 
@@ -833,45 +1028,15 @@ def mapa_poblacion():
         convertir_porcentaje_a_numero
     )
 
-    # Rangos personalizados para mejor distinción visual
-
-    # Basados en la distribución real de los datos (muchas parroquias pequeñas, pocas grandes)
-
-    rangos = [0, 0.5, 1.0, 2.0, 5.0, 10.0, 35.0]
+    # Colores segun los cortes de la clasificacion (calculados sobre los datos)
 
-    # Función para obtener color según el porcentaje de población
+    clases = clasificacion_variable("poblacion", metodo_pedido())
 
     def get_color_poblacion(porcentaje_val):
 
-        if porcentaje_val is None:
-
-            return "#CCCCCC"  # Gris para sin datos
-
-        # Colores de menor a mayor (azul claro a azul oscuro)
-
-        if porcentaje_val < rangos[1]:  # 0 - 0.5%
-
-            return "#E6F2FF"  # Azul muy claro
-
-        elif porcentaje_val < rangos[2]:  # 0.5 - 1.0%
-
-            return "#CCE5FF"  # Azul claro
-
-        elif porcentaje_val < rangos[3]:  # 1.0 - 2.0%
-
-            return "#99CCFF"  # Azul medio claro
-
-        elif porcentaje_val < rangos[4]:  # 2.0 - 5.0%
+        clase = clase_por_cortes(porcentaje_val, clases["cortes"])
 
-            return "#66B3FF"  # Azul medio
-
-        elif porcentaje_val < rangos[5]:  # 5.0 - 10.0%
-
-            return "#3399FF"  # Azul medio oscuro
-
-        else:  # 10.0% en adelante
-
-            return "#0070C0"  # Azul oscuro
+        return "#CCCCCC" if clase is None else PALETA_AZULES[clase]  # gris: sin datos
 
     # Mantener el porcentaje como texto para mostrar
 
@@ -896,81 +1061,21 @@ def mapa_poblacion():
     # Crear diccionarios de nombre normalizado -> porcentaje
 
     poblacion_dict_texto = dict(
-        zip(df_poblacion["Parroquia_normalizada"], df_poblacion["Porcentaje_texto"])
+        zip(df_poblacion["clave_poblacion"], df_poblacion["Porcentaje_texto"])
     )
 
     poblacion_dict_numero = dict(
-        zip(df_poblacion["Parroquia_normalizada"], df_poblacion["Porcentaje_numero"])
+        zip(df_poblacion["clave_poblacion"], df_poblacion["Porcentaje_numero"])
     )
 
     # Crear mapa centrado en Ecuador
 
-    m = folium.Map(location=[-0.20, -78.50], zoom_start=11, tiles="cartodbpositron")
-
-    # Añadir leyenda
-
-    legend_html = """
-
-    <div style="position: fixed; 
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
 
-                bottom: 50px; right: 10px; width: 250px; height: auto; 
+    # Añadir leyenda (generada a partir de los cortes)
 
-                background-color: white; border:2px solid grey; z-index:9999; font-size:14px;
-
-                padding: 10px; border-radius: 5px;">
-
-        <p style="margin: 0 0 10px 0; font-weight: bold;">Población parroquias</p>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #E6F2FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>0.00% - 0.50%</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #CCE5FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>0.50% - 1.00%</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #99CCFF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>1.00% - 2.00%</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #66B3FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>2.00% - 5.00%</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center; margin-bottom: 8px;">
-
-            <div style="width: 20px; height: 20px; background-color: #3399FF; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>5.00% - 10.00%</span>
-
-        </div>
-
-        <div style="display: flex; align-items: center;">
-
-            <div style="width: 20px; height: 20px; background-color: #0070C0; border: 1px solid black; margin-right: 10px;"></div>
-
-            <span>10.00% - 35.00%</span>
-
-        </div>
-
-    </div>
-    """
+    legend_html = leyenda_clases("Población parroquias", PALETA_AZULES, clases["etiquetas"])
 
     m.get_root().html.add_child(folium.Element(legend_html))
 
@@ -978,21 +1083,21 @@ def mapa_poblacion():
 
     fg_parroquias = folium.FeatureGroup(name="Todas las Parroquias").add_to(m)
 
+    lineas_etiquetas = []
+
+    prioridad_etiquetas = []
+
     for _, row in gdf_todas.iterrows():
 
         # Obtener nombre original de la parroquia usando la función auxiliar
 
         nombre_original = obtener_nombre(row)
 
-        # Obtener nombre normalizado
-
-        nombre_normalizado = row["nombre_normalizado"]
-
         # Obtener porcentaje de población (texto para mostrar y número para color)
 
-        porcentaje_texto = poblacion_dict_texto.get(nombre_normalizado, None)
+        porcentaje_texto = poblacion_dict_texto.get(row["clave_poblacion"], None)
 
-        porcentaje_numero = poblacion_dict_numero.get(nombre_normalizado, None)
+        porcentaje_numero = poblacion_dict_numero.get(row["clave_poblacion"], None)
 
         # Obtener color según el porcentaje
 
@@ -1013,37 +1118,25 @@ def mapa_poblacion():
             tooltip=folium.GeoJsonTooltip(fields=["nombre"], aliases=["Parroquia:"]),
         ).add_to(fg_parroquias)
 
-        # Añadir etiqueta con el nombre y el porcentaje en el centroide
-
-        centroide = row.geometry.centroid
+        # Texto de la etiqueta (se ubica despues, con todas las parroquias); las
+        # parroquias con mas poblacion tienen prioridad cuando dos chocan
 
         if porcentaje_texto is not None:
 
-            html_label = f"""
-
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
-
-                <div>{nombre_original}</div>
+            lineas_etiquetas.append([nombre_original, porcentaje_texto])
 
-                <div>{porcentaje_texto}</div>
-
-            </div>
-            """
         else:
 
-            html_label = f"""
-
-            <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
+            lineas_etiquetas.append([nombre_original])
 
-                <div>{nombre_original}</div>
+        prioridad_etiquetas.append(
+            -1 if porcentaje_numero is None or pd.isna(porcentaje_numero) else porcentaje_numero
+        )
 
-            </div>
-            """
+    # Etiquetas en el polo de inaccesibilidad de cada parroquia, solo en los
+    # zooms en que no se solapan con otra
 
-        folium.Marker(
-            location=[centroide.y, centroide.x],
-            icon=folium.DivIcon(html=html_label),
-        ).add_to(fg_parroquias)
+    agregar_etiquetas(fg_parroquias, "poblacion", gdf_todas, lineas_etiquetas, prioridad_etiquetas)
 
     # Añadir control de capas
 
@@ -1065,7 +1158,8 @@ def mapa_clusters():
     gdf = cargar_parroquias(scope=scope)
     gdf = clusterizar_parroquias(gdf, k=k, incluir_espacial=incluir_espacial)
 
-    m = folium.Map(location=[-0.20, -78.50], zoom_start=11, tiles="cartodbpositron")
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
 
     # 7 azules bien diferenciados (para tus 7 sectores).
     palette = [
@@ -1109,6 +1203,7 @@ def mapa_clusters():
 
     fg = folium.FeatureGroup(name="Clusters").add_to(m)
 
+    lineas_etiquetas = []
     for _, row in gdf.iterrows():
         cid = row.get("cluster", None)
         fill_color = color_cluster(cid)
@@ -1164,18 +1259,9 @@ def mapa_clusters():
             ),
         ).add_to(fg)
 
-        centroide_lat = row.get("lat", None)
-        centroide_lon = row.get("lon", None)
-        html_label = f"""
-        <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
-            <div>{row.get('nombre','Sin nombre')}</div>
-            <div>Cluster {int(cid)}</div>
-        </div>
-        """
-        folium.Marker(
-            location=[centroide_lat, centroide_lon],
-            icon=folium.DivIcon(html=html_label),
-        ).add_to(fg)
+        lineas_etiquetas.append([row.get("nombre", "Sin nombre"), f"Cluster {int(cid)}"])
+
+    agregar_etiquetas(fg, f"clusters_{scope}_{k}_{int(incluir_espacial)}", gdf, lineas_etiquetas)
 
     folium.LayerControl().add_to(m)
 
@@ -1188,12 +1274,14 @@ def mapa_clusters():
 
 
 @main_bp.route("/sectores")
+@pagina_cacheada(lambda: (scope_pedido(),))
 def mapa_sectores():
-    scope = request.args.get("scope", default="todas", type=str)
+    scope = scope_pedido()
     gdf = cargar_parroquias(scope=scope)
     gdf = clasificar_sectorial(gdf)
 
-    m = folium.Map(location=[-0.20, -78.50], zoom_start=11, tiles="cartodbpositron")
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
 
     # 7 colores combinando azules y cafés pastel
     palette = [
@@ -1236,6 +1324,7 @@ def mapa_sectores():
     fg = folium.FeatureGroup(name="Sectores", show=True).add_to(m)
     fg_nombres = folium.FeatureGroup(name="Nombres (Sectores)", show=True).add_to(m)
 
+    lineas_etiquetas = []
     for _, row in gdf.iterrows():
         sector = row.get("sector", "OTROS")
         fill_color = color_by_sector.get(sector, "#cccccc")
@@ -1267,16 +1356,294 @@ def mapa_sectores():
             ),
         ).add_to(fg)
         
-        html_label = f"""
-        <div class="parroquia-label" style="font-weight: bold; color: black; text-align: center; white-space: nowrap;">
-            <div>{row.get('nombre','Sin nombre')}</div>
-            <div>{sector}</div>
+        lineas_etiquetas.append([row.get("nombre", "Sin nombre"), sector])
+
+    # Etiquetas en el polo de inaccesibilidad, solo en los zooms en que no se
+    # solapan con otra.
+    agregar_etiquetas(fg_nombres, f"sectores_{scope}", gdf, lineas_etiquetas)
+
+    folium.LayerControl().add_to(m)
+
+    return render_template(
+        "index.html",
+        mapa=m.get_root().render(),
+        map_name=m.get_name(),
+        ruta_activa="sectores",
+    )
+
+
+@main_bp.route("/proyeccion")
+@pagina_cacheada(lambda: (scope_pedido(), *rango_proyeccion()))
+def mapa_proyeccion():
+    scope = scope_pedido()
+    desde, hasta = rango_proyeccion()
+
+    gdf = cargar_parroquias(scope=scope)
+    anios, matriz = proyeccion_parroquias(gdf, desde, hasta)
+    # Cortes comunes a todos los anios para que el color sea comparable en el slider.
+    cortes = cortes_cuantiles(matriz)
+
+    palette = PALETA_AZULES
+
+    ds = dataset_actual()
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
+
+    limites = [np.nanmin(matriz)] + cortes + [np.nanmax(matriz)]
+    items = "\n".join(
+        f"""
+        <div style="display:flex; align-items:center; margin-bottom:6px;">
+          <div style="width:18px; height:18px; background-color:{palette[i]}; border:1px solid #111; margin-right:8px;"></div>
+          <span>{limites[i]:,.0f} - {limites[i + 1]:,.0f}</span>
         </div>
         """
+        for i in range(len(limites) - 1)
+    )
+
+    legend_html = f"""
+    <div style="position: fixed;
+                bottom: 50px; right: 10px; width: 260px; height: auto;
+                background-color: white; border:2px solid grey; z-index:9999; font-size:13px;
+                padding: 10px; border-radius: 5px;">
+        <p style="margin: 0 0 10px 0; font-weight: bold;">Población proyectada</p>
+        <p style="margin: 0 0 10px 0; font-size: 12px;">base {ANIO_BASE} | scope={scope}</p>
+        {items}
+    </div>
+    """
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    # La geometria viaja una sola vez; cada anio es solo un arreglo de valores
+    # indexado por `idx` que el cliente usa para repintar.
+    fg = folium.FeatureGroup(name="Proyeccion", show=True).add_to(m)
+    estilo = lambda _: {
+        "fillColor": "#CCCCCC",
+        "color": "black",
+        "weight": 0.5,
+        "fillOpacity": 0.7,
+    }
+    if MODO_GEOMETRIA == "topojson":
+        geo = folium.TopoJson(
+            copia_estilable(topologia_parroquias(scope)),
+            "objects.parroquias",
+            style_function=estilo,
+        ).add_to(fg)
+    else:
+        geo = folium.GeoJson(capa_indexada(gdf), style_function=estilo).add_to(fg)
+
+    folium.LayerControl().add_to(m)
+
+    proyeccion = {
+        "anios": anios.tolist(),
+        "valores": [
+            [None if np.isnan(v) else int(round(v)) for v in columna]
+            for columna in matriz.T
+        ],
+        "cortes": cortes,
+        "colores": palette,
+    }
+
+    return render_template(
+        "proyeccion.html",
+        mapa=m.get_root().render(),
+        map_name=m.get_name(),
+        capa_name=geo.get_name(),
+        proyeccion=proyeccion,
+        ruta_activa="proyeccion",
+    )
+
+
+METRICAS = {
+    "tasa": metrica_tasa,
+    "poblacion": metrica_poblacion,
+    "sector": metrica_sector,
+    "zona": metrica_zona,
+    "lisa": metrica_lisa,
+}
+
+
+def ruta_config_sectorial(nombre):
+    # Solo versiones de sectores*.json dentro de data/, nunca rutas arbitrarias.
+    ds = dataset_actual()
+    nombre = os.path.basename(nombre or ds.archivos["sectores"])
+    if not (nombre.startswith("sectores") and nombre.endswith(".json")):
+        abort(400, "config debe ser un archivo sectores*.json de data/")
+    ruta = os.path.join(ds.data_dir, nombre)
+    if not os.path.exists(ruta):
+        abort(404, f"No existe data/{nombre}")
+    return ruta
+
+
+@main_bp.route("/comparar")
+def mapa_comparar():
+    scope = scope_pedido()
+    gdf = cargar_parroquias(scope=scope)
+
+    paneles = []
+    for lado, por_defecto in (("izq", "tasa"), ("der", "poblacion")):
+        metrica = request.args.get(lado, default=por_defecto, type=str)
+        if metrica not in METRICAS:
+            abort(400, f"{lado} debe ser uno de: {', '.join(METRICAS)}")
+
+        if metrica == "sector":
+            config = ruta_config_sectorial(request.args.get(f"config_{lado}"))
+            paneles.append(metrica_sector(gdf, config))
+        elif metrica == "lisa":
+            paneles.append(metrica_lisa(gdf, scope=scope))
+        elif metrica in VALORES_CLASIFICABLES:
+            paneles.append(METRICAS[metrica](gdf, metodo_pedido()))
+        else:
+            paneles.append(METRICAS[metrica](gdf))
+
+    if MODO_GEOMETRIA == "topojson":
+        geometria = topologia_parroquias(scope)
+    else:
+        geometria = capa_indexada(gdf).__geo_interface__
+
+    return render_template(
+        "comparar.html",
+        centro=dataset_actual().centro,
+        zoom=dataset_actual().zoom,
+        geometria=geometria,
+        paneles=paneles,
+        scope=scope,
+        ruta_activa="comparar",
+        **recursos_leaflet(),
+    )
+
+
+# Filtro de cada scope sobre la columna `tipo` de cargar_parroquias("todas").
+SCOPES_TIPO = {
+    "todas": None,
+    "rurales": "RURAL",
+    "urbanas": "URBANO",
+}
+
+# (scope, metrica) de /mapa -> enlace del menu que la representa.
+VISTAS_MENU = {
+    ("rurales", "tasa"): "rurales",
+    ("urbanas", "tasa"): "urbanas",
+    ("todas", "poblacion"): "poblacion",
+    ("todas", "sector"): "sectores",
+}
+
+
+def datos_mapa_unico():
+    # Geometria, atributos y todas las metricas (sectores, clasificaciones,
+    # LISA): lo mismo para cualquier metrica o scope elegidos, asi que se arma
+    # una vez por dataset y version de datos.
+    def construir():
+        gdf = cargar_parroquias(scope="todas")
+
+        if MODO_GEOMETRIA == "topojson":
+            geometria = topologia_parroquias("todas")
+        else:
+            geometria = capa_indexada(gdf).__geo_interface__
+
+        return {
+            "geometria": geometria,
+            "atributos": {
+                "codigo": gdf["codigo"].astype(str).tolist(),
+                "tipo": gdf["tipo"].astype(str).tolist(),
+                "zona": [None if pd.isna(z) else str(z) for z in gdf["zona_admin"]],
+            },
+            "metricas": {nombre: funcion(gdf) for nombre, funcion in METRICAS.items()},
+        }
+
+    return obtener_o_construir(dataset_actual(), "calculos", ("mapa_unico", MODO_GEOMETRIA), construir)
+
+
+@main_bp.route("/mapa")
+def mapa_unico():
+    # Una sola pagina para todas las vistas: la geometria de todas las parroquias
+    # viaja una vez y cada metrica es solo un arreglo de clases por `idx`, asi
+    # cambiar de metrica o de scope repinta en el cliente sin volver al servidor.
+    metrica = request.args.get("metrica", default="tasa", type=str)
+    scope = request.args.get("scope", default="todas", type=str).lower()
+    if metrica not in METRICAS:
+        abort(400, f"metrica debe ser una de: {', '.join(METRICAS)}")
+    if scope not in SCOPES_TIPO:
+        abort(400, f"scope debe ser uno de: {', '.join(SCOPES_TIPO)}")
+
+    return render_template(
+        "mapa.html",
+        centro=dataset_actual().centro,
+        zoom=dataset_actual().zoom,
+        **datos_mapa_unico(),
+        scopes=SCOPES_TIPO,
+        metrica=metrica,
+        scope=scope,
+        ruta_activa=VISTAS_MENU.get((scope, metrica), "mapa"),
+        **recursos_leaflet(),
+    )
+
+
+# Del anillo interior (mas intenso) al exterior.
+PALETA_ANILLOS = ["#0057B8", "#42A5F5", "#90CAF9", "#CCE5FF", "#E6F2FF"]
+
+
+@main_bp.route("/captacion")
+def mapa_captacion():
+    ds = dataset_actual()
+    sitios, radios = cargar_campus()
+    resultado = calcular("captacion", {"sitios": sitios, "anillos_km": list(radios)}, dataset=ds.nombre)
+    radios = resultado["anillos_km"]
+
+    m = folium.Map(location=ds.centro, zoom_start=ds.zoom, tiles="cartodbpositron")
+
+    def color_anillo(j):
+        return PALETA_ANILLOS[min(j, len(PALETA_ANILLOS) - 1)]
+
+    filas = "\n".join(
+        f"""
+        <tr><td>{sitio['nombre']}</td>{''.join(f'<td style="text-align:right;">{v:,}</td>' for v in sitio['acumulada'])}</tr>
+        """
+        for sitio in resultado["sitios"]
+    )
+    encabezado = "".join(
+        f'<th style="background-color:{color_anillo(j)};">&le; {r:g} km</th>' for j, r in enumerate(radios)
+    )
+
+    legend_html = f"""
+    <div style="position: fixed;
+                bottom: 50px; right: 10px; width: auto; height: auto;
+                background-color: white; border:2px solid grey; z-index:9999; font-size:13px;
+                padding: 10px; border-radius: 5px;">
+        <p style="margin: 0 0 10px 0; font-weight: bold;">Población en el área de captación</p>
+        <table style="border-spacing: 8px 2px;"><tr><th>Campus</th>{encabezado}</tr>{filas}</table>
+    </div>
+    """
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    # La banda j de cada campus lleva la poblacion entre el radio j-1 y el j.
+    capa = capa_anillos(sitios, radios, ds.area_crs)
+    por_sitio = {sitio["nombre"]: sitio["por_banda"] for sitio in resultado["sitios"]}
+    for feature in capa["features"]:
+        props = feature["properties"]
+        j = props["anillo"]
+        desde = 0 if j == 0 else radios[j - 1]
+        props["Banda"] = f"{desde:g} - {radios[j]:g} km"
+        props["Poblacion"] = por_sitio[props["sitio"]][j]
+
+    fg = folium.FeatureGroup(name="Anillos").add_to(m)
+    folium.GeoJson(
+        capa,
+        style_function=lambda feature: {
+            "fillColor": color_anillo(feature["properties"]["anillo"]),
+            "color": "#003F8C",
+            "weight": 1,
+            "fillOpacity": 0.35,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=["sitio", "Banda", "Poblacion"],
+            aliases=["Campus:", "Banda:", "Población:"],
+            localize=True,
+        ),
+    ).add_to(fg)
+
+    for sitio in resultado["sitios"]:
         folium.Marker(
-            location=[row.get("lat", None), row.get("lon", None)],
-            icon=folium.DivIcon(html=html_label),
-        ).add_to(fg_nombres)
+            location=[sitio["lat"], sitio["lon"]],
+            tooltip=sitio["nombre"],
+        ).add_to(fg)
 
     folium.LayerControl().add_to(m)
 
@@ -1284,5 +1651,27 @@ def mapa_sectores():
         "index.html",
         mapa=m.get_root().render(),
         map_name=m.get_name(),
-        ruta_activa="sectores",
+        ruta_activa="captacion",
+    )
+
+
+@main_bp.route("/poblacion/hexagonos")
+def mapa_hexagonos():
+    # Poblacion por hexagonos de tamano fijo (no distorsionada por el tamano de
+    # cada parroquia). El cliente pide a /api/hexagonos el nivel que toca segun
+    # el zoom y lo dibuja como una sola capa.
+    variable = request.args.get("variable", default="densidad", type=str)
+    if variable not in ("densidad", "tasa"):
+        abort(400, "variable debe ser densidad o tasa")
+
+    ds = dataset_actual()
+    return render_template(
+        "hexagonos.html",
+        centro=ds.centro,
+        zoom=ds.zoom,
+        tamanos=list(TAMANOS_M),
+        variable=variable,
+        colores=PALETA_AZULES,
+        ruta_activa="hexagonos",
+        **recursos_leaflet(),
     )
@@ -0,0 +1,37 @@
+import mimetypes
+import os
+
+from flask import Blueprint, abort, request, send_file
+from werkzeug.security import safe_join
+
+from servicios.recursos import URL_PREFIJO, VENDOR_DIR
+
+
+recursos_bp = Blueprint("recursos", __name__, url_prefix=URL_PREFIJO)
+
+
+UN_ANIO = 365 * 24 * 3600  # los nombres llevan huella: el contenido nunca cambia
+
+
+@recursos_bp.route("/<path:nombre>")
+def recurso(nombre):
+    ruta = safe_join(VENDOR_DIR, nombre)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+
+    # Variante precomprimida si el navegador la acepta (br antes que gzip).
+    aceptadas = request.accept_encodings
+    codificacion = None
+    for sufijo, nombre_codificacion in ((".br", "br"), (".gz", "gzip")):
+        if aceptadas[nombre_codificacion] and os.path.isfile(ruta + sufijo):
+            ruta, codificacion = ruta + sufijo, nombre_codificacion
+            break
+
+    mimetype = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+    respuesta = send_file(ruta, mimetype=mimetype, max_age=UN_ANIO, conditional=True)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    respuesta.vary.add("Accept-Encoding")
+    if codificacion:
+        respuesta.headers["Content-Encoding"] = codificacion
+    return respuesta
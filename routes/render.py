@@ -0,0 +1,90 @@
+import io
+import zipfile
+from concurrent.futures import CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, Response, abort, request
+
+from routes.main import elegir_dataset, metodo_pedido, recordar_dataset
+from servicios.render import (
+    ALTO,
+    ANCHO,
+    MAPAS,
+    MAX_PX,
+    MIN_PX,
+    RENDER_TIMEOUT,
+    SCOPES,
+    lote_png,
+    mapa_png,
+)
+
+
+render_bp = Blueprint("render", __name__, url_prefix="/render")
+
+render_bp.before_request(elegir_dataset)
+render_bp.after_request(recordar_dataset)
+
+
+# Los errores no se cachean (obtener_o_construir solo guarda resultados), asi
+# que el proximo pedido vuelve a intentar el render.
+@render_bp.errorhandler(TimeoutError)
+def render_demorado(e):
+    return f"El mapa no estuvo listo en {RENDER_TIMEOUT} s; reintente", 504
+
+
+@render_bp.errorhandler(BrokenProcessPool)
+@render_bp.errorhandler(CancelledError)
+def render_fallido(e):
+    # El worker murio; servicios.graficos ya reemplazo el pool.
+    return "El proceso de render fallo; reintente", 503
+
+
+def leer_tamano():
+    ancho = request.args.get("w", default=ANCHO, type=int)
+    alto = request.args.get("h", default=ALTO, type=int)
+    if not (MIN_PX <= ancho <= MAX_PX and MIN_PX <= alto <= MAX_PX):
+        abort(400, f"w y h deben estar entre {MIN_PX} y {MAX_PX}")
+    return ancho, alto
+
+
+def leer_scope():
+    scope = request.args.get("scope", default="todas", type=str).lower()
+    if scope not in SCOPES:
+        abort(400, f"scope debe ser uno de: {', '.join(SCOPES)}")
+    return scope
+
+
+def respuesta_cacheable(contenido, mimetype, **kwargs):
+    respuesta = Response(contenido, mimetype=mimetype, **kwargs)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = 3600
+    return respuesta
+
+
+@render_bp.route("/<mapa>.png")
+def render_mapa(mapa):
+    # ?scope=todas|urbanas|rurales&w=&h=&clasificacion=
+    if mapa not in MAPAS:
+        abort(404, f"mapa debe ser uno de: {', '.join(MAPAS)}")
+    ancho, alto = leer_tamano()
+    contenido = mapa_png(mapa, leer_scope(), ancho, alto, metodo_pedido())
+    return respuesta_cacheable(contenido, "image/png")
+
+
+@render_bp.route("/mapas.zip")
+def render_lote():
+    # Todos los mapas en un zip; ?scope= limita a un scope (por defecto, todos).
+    ancho, alto = leer_tamano()
+    scopes = [leer_scope()] if "scope" in request.args else list(SCOPES)
+    imagenes = lote_png(MAPAS, scopes, ancho, alto, metodo_pedido())
+
+    buffer = io.BytesIO()
+    # Los PNG ya vienen comprimidos: se guardan sin volver a comprimir.
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archivo:
+        for nombre, contenido in imagenes.items():
+            archivo.writestr(nombre, contenido)
+    return respuesta_cacheable(
+        buffer.getvalue(),
+        "application/zip",
+        headers={"Content-Disposition": "attachment; filename=mapas.zip"},
+    )
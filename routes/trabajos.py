@@ -0,0 +1,361 @@
+import json
+import math
+
+from flask import Blueprint, Response, abort, g, jsonify, request, url_for
+
+from routes.main import SCOPES_TIPO, elegir_dataset, recordar_dataset
+from servicios.autocorrelacion import VARIABLES
+from servicios.captacion import MAX_SITIOS, capa_anillos, cargar_campus
+from servicios.datasets import CACHE_DISCO_TIPOS, VERSION_APP, disco, registro
+from servicios.hexagonos import TAMANOS_M, params_piramide
+from servicios.interpolacion import MAX_ZONAS, VARIABLES as VARIABLES_INTERPOLACION
+from servicios.proyeccion import ANIO_BASE
+from servicios.regionalizacion import CRITERIOS
+from servicios.trabajos import TAREAS, calcular, consultar, enviar
+
+
+trabajos_bp = Blueprint("trabajos", __name__, url_prefix="/api")
+
+trabajos_bp.before_request(elegir_dataset)
+trabajos_bp.after_request(recordar_dataset)
+
+
+MAX_PUNTOS_SINCRONICO = 10_000  # mas puntos que esto: usar /api/jobs
+
+
+def objeto_json(valor, nombre="el cuerpo"):
+    # Un cuerpo vacio o ausente vale como {}; JSON valido que no es un objeto
+    # (lista, string, numero) es un error del cliente.
+    if valor is None:
+        return {}
+    if not isinstance(valor, dict):
+        abort(400, f"{nombre} debe ser un objeto JSON")
+    return valor
+
+
+def cuerpo_json():
+    return objeto_json(request.get_json(silent=True))
+
+
+def leer_scope(origen):
+    scope = str(origen.get("scope", "todas")).lower()
+    if scope not in SCOPES_TIPO:
+        abort(400, f"scope debe ser uno de: {', '.join(SCOPES_TIPO)}")
+    return scope
+
+
+def es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor)
+
+
+def parametros_clusters(origen):
+    try:
+        kmin = int(origen.get("kmin", 2))
+        kmax = int(origen.get("kmax", 10))
+        espacial = bool(int(origen.get("espacial", 0)))
+    except (TypeError, ValueError):
+        abort(400, "kmin, kmax y espacial deben ser enteros")
+    if not 2 <= kmin <= kmax <= 50:
+        abort(400, "Se requiere 2 <= kmin <= kmax <= 50")
+    return {
+        "kmin": kmin,
+        "kmax": kmax,
+        "scope": leer_scope(origen),
+        "espacial": espacial,
+    }
+
+
+def parametros_puntos(origen):
+    puntos = origen.get("puntos")
+    if not isinstance(puntos, list) or not all(
+        isinstance(p, (list, tuple)) and len(p) == 2 and all(es_numero(c) for c in p)
+        for p in puntos
+    ):
+        abort(400, "puntos debe ser una lista de [lat, lon] numericos")
+    if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in puntos):
+        abort(400, "lat debe estar entre -90 y 90 y lon entre -180 y 180")
+    return {"puntos": puntos, "scope": leer_scope(origen)}
+
+
+def parametros_regionalizacion(origen):
+    try:
+        k = int(origen.get("k", 7))
+        min_poblacion = float(origen.get("min_poblacion", 0.0))
+        pesos = [float(origen.get("peso_tasa", 1.0)), float(origen.get("peso_poblacion", 1.0))]
+    except (TypeError, ValueError):
+        abort(400, "k, min_poblacion y pesos deben ser numericos")
+    criterio = str(origen.get("criterio", "queen")).lower()
+    if not all(math.isfinite(v) for v in [min_poblacion, *pesos]):
+        abort(400, "min_poblacion y pesos deben ser finitos")
+    if not 2 <= k <= 50:
+        abort(400, "Se requiere 2 <= k <= 50")
+    if criterio not in CRITERIOS:
+        abort(400, f"criterio debe ser uno de: {', '.join(CRITERIOS)}")
+    return {
+        "k": k,
+        "scope": leer_scope(origen),
+        "criterio": criterio,
+        "min_poblacion": min_poblacion,
+        "pesos": pesos,
+    }
+
+
+def parametros_autocorrelacion(origen):
+    try:
+        permutaciones = int(origen.get("permutaciones", 999))
+        alfa = float(origen.get("alfa", 0.05))
+        seed = int(origen.get("seed", 12345))
+    except (TypeError, ValueError):
+        abort(400, "permutaciones, alfa y seed deben ser numericos")
+    variable = str(origen.get("variable", "tasa")).lower()
+    criterio = str(origen.get("criterio", "queen")).lower()
+    if variable not in VARIABLES:
+        abort(400, f"variable debe ser una de: {', '.join(VARIABLES)}")
+    if criterio not in CRITERIOS:
+        abort(400, f"criterio debe ser uno de: {', '.join(CRITERIOS)}")
+    if not 99 <= permutaciones <= 99_999:
+        abort(400, "Se requiere 99 <= permutaciones <= 99999")
+    if not 0 < alfa < 1:
+        abort(400, "alfa debe estar entre 0 y 1")
+    return {
+        "variable": variable,
+        "scope": leer_scope(origen),
+        "criterio": criterio,
+        "permutaciones": permutaciones,
+        "alfa": alfa,
+        "seed": seed,
+    }
+
+
+def parametros_captacion(origen):
+    # Sin "sitios" se usan los campus de data/campus.json (y sus radios).
+    campus, radios = cargar_campus()
+    sitios = origen.get("sitios", campus)
+    anillos_km = origen.get("anillos_km", radios)
+    if isinstance(anillos_km, str):
+        anillos_km = anillos_km.split(",")
+    try:
+        sitios = [
+            {"nombre": s.get("nombre"), "lat": float(s["lat"]), "lon": float(s["lon"])}
+            for s in sitios
+        ]
+        anillos_km = sorted({float(r) for r in anillos_km})
+    except (AttributeError, KeyError, TypeError, ValueError):
+        abort(400, "sitios debe ser una lista de {nombre, lat, lon} y anillos_km numeros")
+    if not all(-90 <= s["lat"] <= 90 and -180 <= s["lon"] <= 180 for s in sitios):
+        abort(400, "lat debe estar entre -90 y 90 y lon entre -180 y 180")
+    if not 1 <= len(sitios) <= MAX_SITIOS:
+        abort(400, f"Se requieren entre 1 y {MAX_SITIOS} sitios")
+    if not anillos_km or not all(0 < r <= 100 for r in anillos_km):
+        abort(400, "anillos_km deben estar entre 0 y 100")
+    return {"sitios": sitios, "anillos_km": anillos_km}
+
+
+def parametros_interpolacion(origen):
+    # El cuerpo puede ser la FeatureCollection sola o {"zonas": ..., "variables": ..., "anio": ...}.
+    zonas = origen if origen.get("type") == "FeatureCollection" else origen.get("zonas")
+    if not isinstance(zonas, dict) or not isinstance(zonas.get("features"), list):
+        abort(400, "zonas debe ser una FeatureCollection GeoJSON (EPSG:4326)")
+    if not 1 <= len(zonas["features"]) <= MAX_ZONAS:
+        abort(400, f"Se requieren entre 1 y {MAX_ZONAS} zonas")
+    if not all(
+        isinstance(f, dict)
+        and isinstance(f.get("geometry"), dict)
+        and isinstance(f.get("properties") or {}, dict)
+        for f in zonas["features"]
+    ):
+        abort(400, "Cada zona debe ser un Feature GeoJSON con geometry y properties objetos")
+    if any(f["geometry"].get("type") not in ("Polygon", "MultiPolygon") for f in zonas["features"]):
+        abort(400, "Todas las zonas deben ser Polygon o MultiPolygon")
+
+    variables = origen.get("variables") or list(VARIABLES_INTERPOLACION)
+    if not isinstance(variables, list) or not all(isinstance(v, str) for v in variables):
+        abort(400, "variables debe ser una lista de nombres")
+    desconocidas = [v for v in variables if v not in VARIABLES_INTERPOLACION]
+    if desconocidas:
+        abort(400, f"variables desconocidas: {', '.join(map(str, desconocidas))}")
+    try:
+        anio = int(origen.get("anio", ANIO_BASE))
+    except (TypeError, ValueError):
+        abort(400, "anio debe ser entero")
+    return {"zonas": zonas, "variables": variables, "anio": anio}
+
+
+def parametros_hexagonos(origen):
+    # Solo niveles de TAMANOS_M (los que sirve /api/hexagonos), como lista o "4000,1000".
+    tamanos = origen.get("tamanos", TAMANOS_M)
+    if isinstance(tamanos, str):
+        tamanos = tamanos.split(",")
+    try:
+        params = params_piramide(tamanos)
+    except (TypeError, ValueError):
+        abort(400, "tamanos debe ser una lista de numeros")
+    if not params["tamanos"] or not all(t in TAMANOS_M for t in params["tamanos"]):
+        abort(400, f"tamanos debe estar entre: {', '.join(f'{t:g}' for t in TAMANOS_M)}")
+    return params
+
+
+PARAMETROS = {
+    "clusters": parametros_clusters,
+    "puntos": parametros_puntos,
+    "regionalizacion": parametros_regionalizacion,
+    "autocorrelacion": parametros_autocorrelacion,
+    "captacion": parametros_captacion,
+    "interpolacion": parametros_interpolacion,
+    "hexagonos": parametros_hexagonos,
+}
+
+
+def respuesta_trabajo(trabajo, codigo=200):
+    trabajo["url"] = url_for("trabajos.estado_trabajo", id_trabajo=trabajo["id"])
+    return jsonify(trabajo), codigo
+
+
+@trabajos_bp.route("/jobs", methods=["POST"])
+def crear_trabajo():
+    # {"tarea": "clusters" | "puntos", "params": {...}} -> 202 con el id; el
+    # calculo corre en el pool de procesos y se consulta en /api/jobs/<id>.
+    cuerpo = cuerpo_json()
+    tarea = cuerpo.get("tarea")
+    # Solo las tareas con validacion de params se aceptan por HTTP.
+    if tarea not in TAREAS or tarea not in PARAMETROS:
+        abort(400, f"tarea debe ser una de: {', '.join(t for t in TAREAS if t in PARAMETROS)}")
+
+    params = PARAMETROS[tarea](objeto_json(cuerpo.get("params"), "params"))
+    trabajo = enviar(tarea, params, dataset=g.dataset.nombre)
+    return respuesta_trabajo(trabajo, 200 if trabajo["estado"] == "terminado" else 202)
+
+
+@trabajos_bp.route("/jobs/<id_trabajo>")
+def estado_trabajo(id_trabajo):
+    trabajo = consultar(id_trabajo)
+    if trabajo is None:
+        abort(404, f"No existe el trabajo {id_trabajo}")
+    return respuesta_trabajo(trabajo)
+
+
+@trabajos_bp.route("/clusters")
+def clusters_sincronico():
+    params = parametros_clusters(request.args)
+    return jsonify(calcular("clusters", params, dataset=g.dataset.nombre))
+
+
+@trabajos_bp.route("/puntos", methods=["POST"])
+def puntos_sincronico():
+    params = parametros_puntos(cuerpo_json())
+    if len(params["puntos"]) > MAX_PUNTOS_SINCRONICO:
+        abort(413, f"Mas de {MAX_PUNTOS_SINCRONICO} puntos: usar POST /api/jobs")
+    return jsonify(calcular("puntos", params, dataset=g.dataset.nombre))
+
+
+def regionalizacion_calculada():
+    params = parametros_regionalizacion(request.args)
+    try:
+        return calcular("regionalizacion", params, dataset=g.dataset.nombre)
+    except ValueError as e:
+        abort(422, str(e))
+
+
+@trabajos_bp.route("/regionalizacion")
+def regionalizacion_sincronica():
+    return jsonify(regionalizacion_calculada())
+
+
+@trabajos_bp.route("/regionalizacion/sectores.json")
+def regionalizacion_config():
+    # Descargable con el formato de data/sectores.json (usable en /comparar
+    # copiandolo a data/ como sectores_<algo>.json).
+    config = regionalizacion_calculada()["config"]
+    return Response(
+        json.dumps(config, ensure_ascii=False, indent=2),
+        mimetype="application/json",
+        headers={"Content-Disposition": "attachment; filename=sectores_regiones.json"},
+    )
+
+
+@trabajos_bp.route("/autocorrelacion")
+def autocorrelacion_sincronica():
+    # Moran global + LISA; con muchas permutaciones conviene POST /api/jobs.
+    params = parametros_autocorrelacion(request.args)
+    return jsonify(calcular("autocorrelacion", params, dataset=g.dataset.nombre))
+
+
+@trabajos_bp.route("/captacion", methods=["GET", "POST"])
+def captacion_sincronica():
+    # GET: campus configurados (?anillos_km=2,5,10). POST: {"sitios": [...]}
+    # para puntuar sitios candidatos. Con geometria=1 se agregan los anillos.
+    origen = cuerpo_json() if request.method == "POST" else request.args
+    params = parametros_captacion(origen)
+    resultado = calcular("captacion", params, dataset=g.dataset.nombre)
+    if str(origen.get("geometria", "0")).lower() in ("1", "true"):
+        resultado = {
+            **resultado,
+            "capa": capa_anillos(params["sitios"], params["anillos_km"], g.dataset.area_crs),
+        }
+    return jsonify(resultado)
+
+
+@trabajos_bp.route("/interpolacion", methods=["POST"])
+def interpolacion_sincronica():
+    # Devuelve las mismas zonas con las variables interpoladas en sus propiedades.
+    params = parametros_interpolacion(cuerpo_json())
+    resultado = calcular("interpolacion", params, dataset=g.dataset.nombre)
+
+    features = []
+    for i, feature in enumerate(params["zonas"]["features"]):
+        propiedades = dict(feature.get("properties") or {})
+        propiedades.update({v: valores[i] for v, valores in resultado["valores"].items()})
+        propiedades["area_km2"] = resultado["area_km2"][i]
+        propiedades["cobertura"] = resultado["cobertura"][i]
+        features.append({**feature, "properties": propiedades})
+
+    return jsonify(
+        {
+            "type": "FeatureCollection",
+            "features": features,
+            "variables": resultado["variables"],
+            "anio": resultado["anio"],
+            "parroquias_sin_dato": resultado["parroquias_sin_dato"],
+        }
+    )
+
+
+@trabajos_bp.route("/hexagonos")
+def hexagonos_nivel():
+    # Un nivel de la piramide (?tamano=<radio en m>) como arreglos q, r y valores,
+    # con la transformacion afin para armar los hexagonos en el cliente.
+    tamano = request.args.get("tamano", default=TAMANOS_M[0], type=float)
+    piramide = calcular("hexagonos", parametros_hexagonos({}), dataset=g.dataset.nombre)
+    for nivel in piramide["niveles"]:
+        if nivel["tamano"] == tamano:
+            return jsonify(
+                {
+                    **nivel,
+                    "afin": piramide["afin"],
+                    "parroquias_sin_poblacion": piramide["parroquias_sin_poblacion"],
+                }
+            )
+    abort(404, f"tamano debe ser uno de: {', '.join(f'{t:g}' for t in TAMANOS_M)}")
+
+
+@trabajos_bp.route("/cache")
+def estado_cache():
+    # Memoria estimada, entradas y contadores de single-flight por dataset y tipo
+    # (ejecuciones, pedidos coalescidos, versiones viejas servidas, revalidaciones).
+    return jsonify(registro.resumen())
+
+
+@trabajos_bp.route("/cache/disco")
+def estado_cache_disco():
+    # Cache compartida en disco: aciertos/fallos/escrituras/desalojos de este
+    # worker, y entradas y bytes de la base (de todos los workers).
+    if disco is None:
+        return jsonify({"activa": False})
+    return jsonify(
+        {
+            "activa": True,
+            "tipos": sorted(CACHE_DISCO_TIPOS),
+            "version_app": VERSION_APP,
+            **disco.estadisticas(),
+        }
+    )
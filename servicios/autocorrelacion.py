@@ -0,0 +1,170 @@
+import numpy as np
+from scipy import sparse
+
+
+VARIABLES = ("tasa", "poblacion")
+
+PERMUTACIONES = 999
+
+ALFA = 0.05
+
+BLOQUE = 4_000_000  # elementos maximos por bloque de permutaciones (memoria acotada)
+
+ALTO_ALTO = "HH"
+BAJO_BAJO = "LL"
+ALTO_BAJO = "HL"
+BAJO_ALTO = "LH"
+NO_SIGNIFICATIVO = "NS"
+
+CUADRANTES = (ALTO_ALTO, BAJO_BAJO, ALTO_BAJO, BAJO_ALTO, NO_SIGNIFICATIVO)
+
+
+def pesos_por_fila(A):
+    # W estandarizada por filas (cada fila suma 1); las islas quedan con fila 0.
+    suma = np.asarray(A.sum(axis=1)).ravel()
+    inversa = np.divide(1.0, suma, out=np.zeros_like(suma, dtype=float), where=suma > 0)
+    return sparse.diags(inversa) @ sparse.csr_matrix(A, dtype=float)
+
+
+def moran_global(z, W, permutaciones=PERMUTACIONES, rng=None):
+    # I = (n / S0) * z'Wz / z'z. La inferencia permuta z en bloques: cada bloque
+    # es una matriz (n, b) y el estadistico de todas sus columnas sale de un solo
+    # producto W @ Z.
+    rng = rng or np.random.default_rng()
+    n = len(z)
+    s0 = W.sum()
+    zz = z @ z
+    observado = float(n / s0 * (z @ (W @ z)) / zz)
+
+    bloque = max(1, BLOQUE // n)
+    simulados = []
+    for inicio in range(0, permutaciones, bloque):
+        b = min(bloque, permutaciones - inicio)
+        Z = z[rng.permuted(np.tile(np.arange(n), (b, 1)), axis=1)].T
+        simulados.append(n / s0 * np.einsum("ij,ij->j", Z, W @ Z) / zz)
+    simulados = np.concatenate(simulados)
+
+    mayores = int((simulados >= observado).sum())
+    extremos = min(mayores, permutaciones - mayores)
+    return {
+        "I": observado,
+        "esperado": -1.0 / (n - 1),
+        "media_simulada": float(simulados.mean()),
+        "desvio_simulado": float(simulados.std()),
+        "z": float((observado - simulados.mean()) / simulados.std()) if simulados.std() > 0 else None,
+        "p": (extremos + 1) / (permutaciones + 1),
+        "permutaciones": permutaciones,
+    }
+
+
+def _muestras_vecinos(n, kmax, permutaciones, rng):
+    # Para cada permutacion, kmax indices distintos de 0..n-2 (sin reemplazo). Se
+    # comparten entre observaciones, como el `crand` de PySAL: para la
+    # observacion i se corren los indices >= i para excluirla.
+    filas = []
+    bloque = max(1, BLOQUE // max(n - 1, 1))
+    for inicio in range(0, permutaciones, bloque):
+        b = min(bloque, permutaciones - inicio)
+        filas.append(np.argpartition(rng.random((b, n - 1)), kmax - 1, axis=1)[:, :kmax])
+    return np.concatenate(filas)
+
+
+def moran_local(z, W, permutaciones=PERMUTACIONES, alfa=ALFA, rng=None):
+    # LISA: I_i = z_i * (Wz)_i / m2, con aleatorizacion condicional (el valor de i
+    # queda fijo y se sortean sus vecinos entre los demas). Las observaciones se
+    # agrupan por numero de vecinos y el rezago simulado de cada grupo es un
+    # producto por bloques (filas, permutaciones, vecinos).
+    rng = rng or np.random.default_rng()
+    n = len(z)
+    m2 = (z @ z) / n
+    rezago = W @ z
+    Ii = z * rezago / m2
+
+    cardinalidad = np.diff(W.indptr)
+    kmax = int(cardinalidad.max()) if n else 0
+    p = np.full(n, np.nan)
+    if kmax == 0 or n < 3:
+        return Ii, p, rezago, np.array([NO_SIGNIFICATIVO] * n, dtype=object)
+
+    muestras = _muestras_vecinos(n, min(kmax, n - 1), permutaciones, rng)
+
+    for k in np.unique(cardinalidad[cardinalidad > 0]):
+        filas = np.flatnonzero(cardinalidad == k)
+        base = muestras[:, :k]
+        paso = max(1, BLOQUE // (permutaciones * k))
+        for inicio in range(0, len(filas), paso):
+            grupo = filas[inicio : inicio + paso]
+            indices = base[None, :, :] + (base[None, :, :] >= grupo[:, None, None])
+            pesos = np.vstack([W.data[W.indptr[i] : W.indptr[i + 1]] for i in grupo])
+            rezago_sim = np.einsum("mpk,mk->mp", z[indices], pesos)
+            simulados = z[grupo, None] * rezago_sim / m2
+
+            mayores = (simulados >= Ii[grupo, None]).sum(axis=1)
+            extremos = np.minimum(mayores, permutaciones - mayores)
+            p[grupo] = (extremos + 1) / (permutaciones + 1)
+
+    cuadrante = np.where(
+        z > 0,
+        np.where(rezago > 0, ALTO_ALTO, ALTO_BAJO),
+        np.where(rezago > 0, BAJO_ALTO, BAJO_BAJO),
+    ).astype(object)
+    cuadrante[~(p <= alfa)] = NO_SIGNIFICATIVO
+    return Ii, p, rezago, cuadrante
+
+
+def valores_variable(gdf, variable):
+    from routes.main import metrica_poblacion, metrica_tasa
+
+    metrica = {"tasa": metrica_tasa, "poblacion": metrica_poblacion}[variable]
+    return np.array([np.nan if v is None else v for v in metrica(gdf)["valores"]], dtype=float)
+
+
+def autocorrelacion(params, progreso=lambda *_: None):
+    # Tarea de servicios.trabajos: Moran global y LISA de la variable sobre las
+    # parroquias del scope. Las parroquias sin dato se excluyen de W.
+    from routes.main import cargar_parroquias
+    from servicios.regionalizacion import adyacencia_parroquias
+
+    variable = params.get("variable", "tasa")
+    scope = params.get("scope", "todas")
+    criterio = params.get("criterio", "queen")
+    permutaciones = int(params.get("permutaciones", PERMUTACIONES))
+    alfa = float(params.get("alfa", ALFA))
+    rng = np.random.default_rng(int(params.get("seed", 12345)))
+
+    gdf = cargar_parroquias(scope=scope)
+    x = valores_variable(gdf, variable)
+    validos = np.flatnonzero(np.isfinite(x))
+
+    A = adyacencia_parroquias(scope, criterio)[validos][:, validos]
+    W = pesos_por_fila(A)
+    z = x[validos] - x[validos].mean()
+
+    global_ = moran_global(z, W, permutaciones, rng)
+    progreso(0.5, "Moran global")
+    Ii, p, rezago, cuadrante = moran_local(z, W, permutaciones, alfa, rng)
+    progreso(1.0, "LISA")
+
+    def alinear(valores, redondeo=None):
+        salida = [None] * len(gdf)
+        for i, v in zip(validos, valores):
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                continue
+            salida[i] = round(float(v), redondeo) if redondeo is not None else v
+        return salida
+
+    return {
+        "variable": variable,
+        "criterio": criterio,
+        "alfa": alfa,
+        "global": global_,
+        "codigos": gdf["codigo"].astype(str).tolist(),
+        "nombres": gdf["nombre"].astype(str).tolist(),
+        "local": {
+            "I": alinear(Ii, 4),
+            "p": alinear(p, 4),
+            "rezago": alinear(rezago + x[validos].mean(), 4),
+            "cuadrante": alinear(cuadrante.tolist()),
+        },
+        "conteo": {c: int((cuadrante == c).sum()) for c in CUADRANTES},
+    }
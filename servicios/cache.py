@@ -0,0 +1,312 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")
+
+
+# Segundos durante los que se reusa la version de datos ya calculada: cada
+# consulta a una cache la pide, y calcularla es un listdir + stat por archivo.
+# Un cambio en data/ se nota a lo sumo este tiempo despues.
+VERSION_DATOS_TTL = float(os.environ.get("VERSION_DATOS_TTL", "2"))
+
+_versiones = {}  # directorio -> (momento, version)
+
+
+def version_datos(directorio=DATA_DIR):
+    # Huella de los archivos de datos (nombre, tamano, mtime). Si se edita cualquier
+    # Excel/GeoJSON/JSON la version cambia y todo lo cacheado con ella queda obsoleto.
+    ahora = time.monotonic()
+    guardada = _versiones.get(directorio)
+    if guardada is not None and ahora - guardada[0] < VERSION_DATOS_TTL:
+        return guardada[1]
+    version = _huella_datos(directorio)
+    _versiones[directorio] = (ahora, version)
+    return version
+
+
+def _huella_datos(directorio):
+    huella = hashlib.sha1()
+
+    for nombre in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, nombre)
+        if not os.path.isfile(ruta):
+            continue
+        stat = os.stat(ruta)
+        huella.update(f"{nombre}|{stat.st_size}|{stat.st_mtime_ns};".encode("utf-8"))
+
+    return huella.hexdigest()[:12]
+
+
+def version_codigo(raiz, entradas=("app.py", "routes", "servicios", "templates", "static")):
+    # Huella del contenido del codigo de la app (vistas, calculos, plantillas y
+    # recursos). Por contenido y no por mtime, para que dos copias del mismo
+    # deploy den la misma.
+    huella = hashlib.sha1()
+    rutas = []
+    for entrada in entradas:
+        ruta = os.path.join(raiz, entrada)
+        if os.path.isfile(ruta):
+            rutas.append(ruta)
+        for carpeta, subcarpetas, archivos in os.walk(ruta):
+            subcarpetas[:] = sorted(d for d in subcarpetas if d != "__pycache__")
+            rutas.extend(os.path.join(carpeta, a) for a in archivos)
+
+    for ruta in sorted(rutas):
+        huella.update(os.path.relpath(ruta, raiz).encode("utf-8"))
+        with open(ruta, "rb") as f:
+            huella.update(f.read())
+    return huella.hexdigest()[:12]
+
+
+_FALTANTE = object()
+
+
+class _Vuelo:
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+# "Single flight": mientras una clave se esta calculando, los demas hilos que
+# la piden esperan ese mismo calculo en vez de repetirlo.
+class VueloUnico:
+
+    def __init__(self):
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self._contadores = {"ejecuciones": 0, "coalescidos": 0, "errores": 0}
+
+    def ejecutar(self, clave, calcular):
+        with self._lock:
+            vuelo = self._en_curso.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_curso[clave] = _Vuelo()
+            self._contadores["ejecuciones" if lider else "coalescidos"] += 1
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            vuelo.valor = calcular()
+        except BaseException as e:
+            vuelo.error = e
+            self.contar("errores")
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            vuelo.listo.set()
+        return vuelo.valor
+
+    def en_curso(self, clave):
+        with self._lock:
+            return clave in self._en_curso
+
+    def contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + n
+
+    def estadisticas(self):
+        with self._lock:
+            return {**self._contadores, "en_curso": len(self._en_curso)}
+
+
+# Cache LRU en memoria del proceso, segura entre hilos.
+class CacheMemoria:
+
+    def __init__(self, max_items=256, al_descartar=None):
+        # al_descartar(clave, valor) se llama por cada valor que sale de la
+        # cache al reemplazarlo, al desalojarlo por LRU o con descartar (no con
+        # limpiar), fuera del lock.
+        self.max_items = max_items
+        self.al_descartar = al_descartar
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.vuelos = VueloUnico()
+
+    def obtener(self, clave, default=None):
+        with self._lock:
+            if clave not in self._datos:
+                return default
+            self._datos.move_to_end(clave)
+            return self._datos[clave]
+
+    def guardar(self, clave, valor):
+        salientes = []
+        with self._lock:
+            if clave in self._datos:
+                salientes.append((clave, self._datos[clave]))
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                salientes.append(self._datos.popitem(last=False))
+        self._avisar(salientes)
+        return valor
+
+    def descartar(self, clave):
+        with self._lock:
+            salientes = [(clave, self._datos.pop(clave))] if clave in self._datos else []
+        self._avisar(salientes)
+
+    def _avisar(self, salientes):
+        if self.al_descartar is not None:
+            for clave, valor in salientes:
+                self.al_descartar(clave, valor)
+
+    def obtener_o_calcular(self, clave, calcular):
+        # Pedidos simultaneos de una clave faltante comparten un solo calculo.
+        valor = self.obtener(clave, _FALTANTE)
+        if valor is not _FALTANTE:
+            return valor
+
+        def calcular_y_guardar():
+            # El lider anterior pudo terminar entre el obtener de arriba y este.
+            valor = self.obtener(clave, _FALTANTE)
+            return self.guardar(clave, calcular()) if valor is _FALTANTE else valor
+
+        return self.vuelos.ejecutar(clave, calcular_y_guardar)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+
+# Cache en disco compartida por todos los procesos de la maquina (los workers de
+# gunicorn, los CLIs): una base SQLite en modo WAL, donde varios lectores y un
+# escritor trabajan a la vez sin bloquearse y cada escritura es atomica. Los
+# valores se guardan con pickle. Al pasar `max_bytes` se borran las entradas
+# usadas hace mas tiempo hasta bajar al 90%.
+class CacheDisco:
+
+    def __init__(self, ruta, max_bytes, timeout=30):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "escrituras": 0, "desalojos": 0, "errores": 0}
+
+    def _conexion(self):
+        # Una conexion por hilo y proceso (una conexion heredada por fork no se
+        # puede usar en el hijo).
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is not None and self._local.pid == os.getpid():
+            return conexion
+
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            " clave TEXT PRIMARY KEY, grupo TEXT NOT NULL, version TEXT NOT NULL,"
+            " valor BLOB NOT NULL, bytes INTEGER NOT NULL, usado REAL NOT NULL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS entradas_usado ON entradas (usado)")
+        conexion.execute("CREATE INDEX IF NOT EXISTS entradas_grupo ON entradas (grupo, version)")
+        self._local.conexion, self._local.pid = conexion, os.getpid()
+        return conexion
+
+    def _contar(self, nombre):
+        with self._lock:
+            self._contadores[nombre] += 1
+
+    def obtener(self, grupo, clave, version, default=None):
+        # `grupo` junta lo que se invalida a la vez (p. ej. dataset y tipo); la
+        # version de datos es parte de la clave.
+        clave = self._clave(grupo, clave, version)
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute("SELECT valor FROM entradas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None:
+                self._contar("fallos")
+                return default
+            conexion.execute("UPDATE entradas SET usado = ? WHERE clave = ?", (time.time(), clave))
+            valor = pickle.loads(fila[0])
+        except Exception:
+            logger.exception("cache en disco: no se pudo leer %s", clave)
+            self._contar("errores")
+            return default
+        self._contar("aciertos")
+        return valor
+
+    def guardar(self, grupo, clave, version, valor):
+        # Nunca falla: si el valor no se puede serializar o la base no responde,
+        # solo queda sin guardar. Borra las versiones anteriores del grupo.
+        try:
+            datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+            conexion = self._conexion()
+            with conexion:
+                conexion.execute("BEGIN IMMEDIATE")
+                conexion.execute(
+                    "INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._clave(grupo, clave, version), grupo, version, datos, len(datos), time.time()),
+                )
+                conexion.execute(
+                    "DELETE FROM entradas WHERE grupo = ? AND version <> ?", (grupo, version)
+                )
+                self._recortar(conexion)
+        except Exception:
+            logger.exception("cache en disco: no se pudo guardar %s/%r", grupo, clave)
+            self._contar("errores")
+            return valor
+        self._contar("escrituras")
+        return valor
+
+    def _recortar(self, conexion):
+        total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM entradas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        sobrante = total - 0.9 * self.max_bytes
+        borrar = []
+        for clave, n in conexion.execute("SELECT clave, bytes FROM entradas ORDER BY usado"):
+            if sobrante <= 0:
+                break
+            borrar.append((clave,))
+            sobrante -= n
+        conexion.executemany("DELETE FROM entradas WHERE clave = ?", borrar)
+        with self._lock:
+            self._contadores["desalojos"] += len(borrar)
+
+    def limpiar(self):
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM entradas")
+
+    def estadisticas(self):
+        # Contadores de este proceso y contenido actual de la base (todos).
+        try:
+            entradas, total = self._conexion().execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entradas"
+            ).fetchone()
+        except Exception:
+            entradas, total = None, None
+        with self._lock:
+            contadores = dict(self._contadores)
+        return {**contadores, "entradas": entradas, "bytes": total, "max_bytes": self.max_bytes}
+
+    @staticmethod
+    def _clave(grupo, clave, version):
+        # repr de la clave (tuplas de str/int/float) -> estable entre procesos.
+        return f"{grupo}|{version}|{hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()}"
@@ -0,0 +1,146 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+ANILLOS_KM = (2, 5, 10)
+
+MAX_SITIOS = 2_000  # sitios por llamada (cada uno con todos sus anillos)
+
+# Formato de data/campus.json:
+# {
+#   "anillos_km": [2, 5, 10],
+#   "campus": [{"nombre": "UdlaPark", "lat": -0.163, "lon": -78.462}, ...]
+# }
+
+
+def cargar_campus(ruta=None):
+    from routes.main import dataset_actual
+
+    ruta = ruta or dataset_actual().ruta("campus")
+    with open(ruta, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return config.get("campus", []), tuple(config.get("anillos_km", ANILLOS_KM))
+
+
+def discos(x, y, radios_m):
+    # Un disco por (sitio, radio), ordenados por sitio: el disco j del sitio i
+    # esta en i * len(radios_m) + j.
+    centros = np.repeat(shapely.points(x, y), len(radios_m))
+    radios = np.tile(np.asarray(radios_m, dtype=float), len(x))
+    return shapely.buffer(centros, radios, quad_segs=16)
+
+
+def poblacion_en_discos(geometrias, poblacion, indice, circulos):
+    # Poblacion dentro de cada disco repartida por peso de area. Las parroquias
+    # enteras dentro del disco cuentan completas sin intersectar; para las que
+    # solo lo cruzan, todas las intersecciones salen de una llamada vectorizada.
+    total = np.zeros(len(circulos))
+
+    i_disco, i_parroquia = indice.query(circulos, predicate="intersects")
+    dentro = shapely.contains_properly(circulos[i_disco], geometrias[i_parroquia])
+    np.add.at(total, i_disco[dentro], poblacion[i_parroquia[dentro]])
+
+    i_disco, i_parroquia = i_disco[~dentro], i_parroquia[~dentro]
+    if len(i_disco):
+        comun = shapely.area(shapely.intersection(circulos[i_disco], geometrias[i_parroquia]))
+        peso = comun / shapely.area(geometrias[i_parroquia])
+        np.add.at(total, i_disco, peso * poblacion[i_parroquia])
+    return total
+
+
+def captacion(params, progreso=lambda *_: None):
+    # Tarea de servicios.trabajos: poblacion (censo, por peso de area) a menos
+    # de cada radio de cada sitio, y por banda (entre un radio y el anterior).
+    # La cache de `calcular` queda por conjunto de sitios y radios.
+    from routes.main import cargar_parroquias, dataset_actual
+    from servicios.proyeccion import parroquias_sin_dato, poblacion_base_parroquias
+
+    sitios = params["sitios"]
+    radios_km = sorted(float(r) for r in params.get("anillos_km", ANILLOS_KM))
+    area_crs = dataset_actual().area_crs
+
+    gdf = cargar_parroquias(scope="todas").to_crs(area_crs)
+    poblacion = poblacion_base_parroquias(gdf)
+    sin_poblacion = parroquias_sin_dato(gdf, poblacion)
+    poblacion = np.where(np.isnan(poblacion), 0.0, poblacion)
+
+    geometrias = gdf.geometry.values
+    indice = gdf.sindex
+    puntos = shapely.points([s["lon"] for s in sitios], [s["lat"] for s in sitios])
+    proyectados = np.asarray(gpd.GeoSeries(puntos, crs="EPSG:4326").to_crs(area_crs).values)
+
+    radios_m = [r * 1000 for r in radios_km]
+    totales = np.zeros((len(sitios), len(radios_m)))
+    bloque = max(1, 20_000 // len(radios_m))  # discos por llamada a shapely
+    for inicio in range(0, len(sitios), bloque):
+        fin = min(inicio + bloque, len(sitios))
+        circulos = discos(
+            shapely.get_x(proyectados[inicio:fin]), shapely.get_y(proyectados[inicio:fin]), radios_m
+        )
+        parcial = poblacion_en_discos(geometrias, poblacion, indice, circulos)
+        totales[inicio:fin] = parcial.reshape(fin - inicio, len(radios_m))
+        progreso(fin / len(sitios), f"{fin} sitios")
+
+    bandas = np.diff(totales, axis=1, prepend=0.0)
+    return {
+        "anillos_km": radios_km,
+        "sitios": [
+            {
+                "nombre": s.get("nombre") or f"Sitio {i + 1}",
+                "lat": s["lat"],
+                "lon": s["lon"],
+                "acumulada": [int(round(v)) for v in totales[i]],
+                "por_banda": [int(round(v)) for v in bandas[i]],
+            }
+            for i, s in enumerate(sitios)
+        ],
+        "parroquias_sin_poblacion": sin_poblacion,
+    }
+
+
+def capa_anillos(sitios, radios_km, area_crs):
+    # GeoJSON (EPSG:4326) de las bandas: disco del primer radio y coronas entre
+    # radios consecutivos, para dibujar en el mapa.
+    radios_m = [r * 1000 for r in sorted(radios_km)]
+    puntos = gpd.GeoSeries(
+        shapely.points([s["lon"] for s in sitios], [s["lat"] for s in sitios]), crs="EPSG:4326"
+    ).to_crs(area_crs)
+    circulos = discos(puntos.x.to_numpy(), puntos.y.to_numpy(), radios_m).reshape(len(sitios), -1)
+    coronas = circulos.copy()
+    coronas[:, 1:] = shapely.difference(circulos[:, 1:], circulos[:, :-1])
+
+    nombres = [s.get("nombre") or f"Sitio {i + 1}" for i, s in enumerate(sitios)]
+    anillos = gpd.GeoDataFrame(
+        {
+            "sitio": np.repeat(nombres, len(radios_m)),
+            "anillo": np.tile(np.arange(len(radios_m)), len(sitios)),
+        },
+        geometry=coronas.ravel(),
+        crs=area_crs,
+    ).to_crs("EPSG:4326")
+    return json.loads(anillos.to_json())
+
+
+def main():
+    import argparse
+
+    from servicios.trabajos import calcular
+
+    parser = argparse.ArgumentParser(description="Poblacion en anillos alrededor de cada campus.")
+    parser.add_argument("--config", default=None, help="por defecto data/campus.json")
+    args = parser.parse_args()
+
+    sitios, radios = cargar_campus(args.config)
+    resultado = calcular("captacion", {"sitios": sitios, "anillos_km": list(radios)})
+
+    encabezado = "".join(f"{f'<= {r:g} km':>14}" for r in resultado["anillos_km"])
+    print(f"{'campus':<20}{encabezado}")
+    for sitio in resultado["sitios"]:
+        print(f"{sitio['nombre']:<20}" + "".join(f"{v:>14,}" for v in sitio["acumulada"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+CARGA_WORKERS = int(os.environ.get("CARGA_WORKERS", "4"))
+
+
+def _medir(lector):
+    inicio = time.perf_counter()
+    valor = lector()
+    return valor, time.perf_counter() - inicio
+
+
+def cargar_concurrente(lectores, workers=None):
+    # Ejecuta todos los lectores (nombre -> funcion sin argumentos) a la vez en un
+    # pool de hilos: pyogrio/GDAL y la lectura de archivos sueltan el GIL, asi el
+    # arranque en frio tarda lo que la fuente mas lenta y no la suma de todas.
+    workers = workers or CARGA_WORKERS
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(lectores))),
+        thread_name_prefix="carga",
+    ) as pool:
+        futuros = {nombre: pool.submit(_medir, lector) for nombre, lector in lectores.items()}
+        resultados = {}
+        tiempos = {}
+        for nombre, futuro in futuros.items():
+            resultados[nombre], tiempos[nombre] = futuro.result()
+
+    tiempos["total"] = time.perf_counter() - inicio
+    for nombre, segundos in tiempos.items():
+        logger.info("carga %-16s %.3fs", nombre, segundos)
+
+    return resultados, tiempos
+
+
+def main():
+    import argparse
+
+    from routes.main import FUENTES
+    from servicios.datasets import obtener_dataset
+
+    parser = argparse.ArgumentParser(
+        description="Mide la carga en frio de las fuentes (secuencial vs concurrente)."
+    )
+    parser.add_argument("--workers", type=int, default=CARGA_WORKERS)
+    parser.add_argument("--dataset", default=None)
+    args = parser.parse_args()
+
+    ds = obtener_dataset(args.dataset)
+    lectores = {nombre: (lambda lector=lector: lector(ds)) for nombre, lector in FUENTES.items()}
+
+    # Pasada de calentamiento para que ambas mediciones partan con el disco en cache.
+    for lector in lectores.values():
+        lector()
+
+    inicio = time.perf_counter()
+    for lector in lectores.values():
+        lector()
+    secuencial = time.perf_counter() - inicio
+
+    _, tiempos = cargar_concurrente(lectores, workers=args.workers)
+    for nombre, segundos in tiempos.items():
+        print(f"{nombre:<18} {segundos:7.3f}s")
+    print(f"{'secuencial':<18} {secuencial:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
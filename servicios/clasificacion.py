@@ -0,0 +1,153 @@
+import numpy as np
+
+
+METODOS = ("jenks", "cuantiles", "intervalos")
+
+
+def _finitos(valores):
+    valores = np.asarray([np.nan if v is None else v for v in valores], dtype=float)
+    return valores[np.isfinite(valores)]
+
+
+def cortes_cuantiles(valores, clases=6):
+    valores = _finitos(np.ravel(valores))
+    if valores.size == 0:
+        return []
+    return np.unique(np.quantile(valores, np.linspace(0, 1, clases + 1)[1:-1])).tolist()
+
+
+def cortes_intervalos(valores, clases=6):
+    valores = _finitos(np.ravel(valores))
+    if valores.size == 0 or valores.min() == valores.max():
+        return []
+    return np.linspace(valores.min(), valores.max(), clases + 1)[1:-1].tolist()
+
+
+def cortes_jenks(valores, clases=6):
+    # Cortes naturales de Fisher: particion de los valores ordenados en `clases`
+    # tramos contiguos que minimiza la suma de cuadrados dentro de cada tramo.
+    # Programacion dinamica sobre los valores distintos (con su frecuencia como
+    # peso); el mejor inicio del ultimo tramo no decrece con el final, asi que
+    # cada fila se resuelve por divide y venceras: O(clases * n log n). Todos
+    # los subproblemas de un mismo nivel de la recursion se evaluan juntos con
+    # numpy (unas log2(n) pasadas por fila en vez de un bucle por final).
+    x, peso = np.unique(_finitos(np.ravel(valores)), return_counts=True)
+    n = len(x)
+    if n <= clases:
+        return x[1:].tolist()
+
+    centrados = x - x.mean()  # evita cancelacion en S2 - S1^2 / W
+    W = np.concatenate([[0.0], np.cumsum(peso)])
+    S1 = np.concatenate([[0.0], np.cumsum(peso * centrados)])
+    S2 = np.concatenate([[0.0], np.cumsum(peso * centrados**2)])
+
+    def costo(i, j):
+        # Suma de cuadrados de los tramos x[i:j] (i, j arreglos).
+        s = S1[j] - S1[i]
+        return (S2[j] - S2[i]) - s * s / (W[j] - W[i])
+
+    finales = np.arange(n + 1)
+    anterior = np.full(n + 1, np.inf)
+    anterior[1:] = costo(np.zeros(n, dtype=int), finales[1:])
+    inicios = []
+
+    for k in range(2, clases + 1):
+        actual = np.full(n + 1, np.inf)
+        inicio = np.zeros(n + 1, dtype=int)
+        # Subproblemas pendientes: finales jlo..jhi con inicios en ilo..ihi.
+        jlo, jhi = np.array([k]), np.array([n])
+        ilo, ihi = np.array([k - 1]), np.array([n - 1])
+        while jlo.size:
+            j = (jlo + jhi) // 2
+            largo = np.minimum(ihi, j - 1) - ilo + 1
+            tramo = np.repeat(np.arange(j.size), largo)
+            desde = np.cumsum(largo) - largo
+            candidatos = ilo[tramo] + np.arange(tramo.size) - desde[tramo]
+            total = anterior[candidatos] + costo(candidatos, j[tramo])
+            minimos = np.minimum.reduceat(total, desde)
+            # Primer minimo de cada subproblema (el mismo que daria argmin).
+            empates = np.flatnonzero(total == minimos[tramo])
+            _, primero = np.unique(tramo[empates], return_index=True)
+            mejor = candidatos[empates[primero]]
+            actual[j], inicio[j] = minimos, mejor
+
+            izq, der = j > jlo, j < jhi
+            jlo, jhi = np.concatenate([jlo[izq], j[der] + 1]), np.concatenate([j[izq] - 1, jhi[der]])
+            ilo, ihi = np.concatenate([ilo[izq], mejor[der]]), np.concatenate([mejor[izq], ihi[der]])
+        inicios.append(inicio)
+        anterior = actual
+
+    cortes = []
+    j = n
+    for inicio in reversed(inicios):
+        j = inicio[j]
+        cortes.append(float(x[j]))
+    return cortes[::-1]
+
+
+CORTES = {
+    "jenks": cortes_jenks,
+    "cuantiles": cortes_cuantiles,
+    "intervalos": cortes_intervalos,
+}
+
+
+def etiquetas_rangos(cortes, minimo, maximo, unidad="", decimales=2):
+    # "min - c1", "c1 - c2", ..., "ck - max", como las leyendas de los mapas
+    # (un solo valor si la clase no tiene rango, p. ej. un atipico aislado).
+    limites = [minimo] + list(cortes) + [maximo]
+    return [
+        f"{a:.{decimales}f}{unidad}" if a == b else f"{a:.{decimales}f}{unidad} - {b:.{decimales}f}{unidad}"
+        for a, b in zip(limites, limites[1:])
+    ]
+
+
+def clasificacion(valores, metodo="jenks", clases=6, unidad="", decimales=2):
+    # Cortes (redondeados como se muestran, para que color y leyenda coincidan),
+    # rango de los datos y etiquetas de la leyenda.
+    if metodo not in CORTES:
+        raise ValueError(f"metodo de clasificacion desconocido: {metodo}")
+    finitos = _finitos(valores)
+    if finitos.size == 0:
+        return {"metodo": metodo, "cortes": [], "minimo": None, "maximo": None, "etiquetas": []}
+
+    cortes = sorted({round(c, decimales) for c in CORTES[metodo](finitos, clases)})
+    minimo = round(float(finitos.min()), decimales)
+    maximo = round(float(finitos.max()), decimales)
+    return {
+        "metodo": metodo,
+        "cortes": cortes,
+        "minimo": minimo,
+        "maximo": maximo,
+        "etiquetas": etiquetas_rangos(cortes, minimo, maximo, unidad, decimales),
+    }
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Cortes de clase de las variables del mapa.")
+    parser.add_argument("--metodo", choices=METODOS, default="jenks")
+    parser.add_argument("--clases", type=int, default=6, help="solo con --prueba")
+    parser.add_argument("--prueba", type=int, default=0, help="mide el tiempo con N valores sinteticos")
+    args = parser.parse_args()
+
+    if args.prueba:
+        valores = np.random.default_rng(0).lognormal(0, 1, args.prueba)
+        inicio = time.perf_counter()
+        cortes = CORTES[args.metodo](valores, args.clases)
+        print(f"{args.prueba} valores: {time.perf_counter() - inicio:.3f} s -> {[round(c, 3) for c in cortes]}")
+        return
+
+    from routes.main import clasificacion_variable
+
+    for variable in ("tasa", "poblacion"):
+        resultado = clasificacion_variable(variable, args.metodo)
+        print(f"{variable}: {resultado['cortes']}")
+        for etiqueta in resultado["etiquetas"]:
+            print(f"  {etiqueta}")
+
+
+if __name__ == "__main__":
+    main()
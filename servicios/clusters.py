@@ -0,0 +1,128 @@
+import numpy as np
+
+
+def features_parroquias(gdf, incluir_espacial=False):
+    # Tasa de crecimiento (%), peso poblacional (%) y area (km2) por parroquia;
+    # con `incluir_espacial`, tambien el centroide. Devuelve el gdf con esas
+    # columnas y la matriz estandarizada (faltantes -> media de la columna).
+    from routes.main import dataset_actual, metrica_poblacion, metrica_tasa
+
+    gdf = gdf.copy()
+    proyectado = gdf.to_crs(dataset_actual().area_crs)
+    centroides = proyectado.geometry.centroid.to_crs(gdf.crs)
+
+    # float32 alcanza para porcentajes y km2 (~7 cifras); lat/lon quedan en
+    # float64 porque en float32 a ~78 grados el error ya es de ~1 m.
+    gdf["tasa_pct"] = np.array([np.nan if v is None else v for v in metrica_tasa(gdf)["valores"]], dtype=np.float32)
+    gdf["pob_pct"] = np.array([np.nan if v is None else v for v in metrica_poblacion(gdf)["valores"]], dtype=np.float32)
+    gdf["area_km2"] = (proyectado.geometry.area.to_numpy() / 1e6).astype(np.float32)
+    gdf["lon"] = centroides.x.to_numpy()
+    gdf["lat"] = centroides.y.to_numpy()
+
+    columnas = ["tasa_pct", "pob_pct", "area_km2"]
+    if incluir_espacial:
+        columnas += ["lat", "lon"]
+
+    X = gdf[columnas].to_numpy(dtype=float)
+    medias = np.nanmean(X, axis=0)
+    X = np.where(np.isnan(X), medias, X)
+    desvio = X.std(axis=0)
+    X = (X - X.mean(axis=0)) / np.where(desvio > 0, desvio, 1.0)
+    return gdf, X
+
+
+def _iniciar_centros(X, k, rng):
+    # k-means++: cada centro nuevo se elige con probabilidad proporcional a la
+    # distancia al cuadrado al centro mas cercano ya elegido.
+    centros = [X[rng.integers(len(X))]]
+    d2 = ((X - centros[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = d2.sum()
+        i = rng.integers(len(X)) if total == 0 else rng.choice(len(X), p=d2 / total)
+        centros.append(X[i])
+        d2 = np.minimum(d2, ((X - X[i]) ** 2).sum(axis=1))
+    return np.array(centros)
+
+
+def kmeans(X, k, n_init=10, max_iter=300, seed=0):
+    # Lloyd vectorizado; se queda con la mejor (menor inercia) de `n_init` semillas.
+    rng = np.random.default_rng(seed)
+    mejor = None
+
+    for _ in range(n_init):
+        centros = _iniciar_centros(X, k, rng)
+        for _ in range(max_iter):
+            d2 = ((X[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2)
+            etiquetas = d2.argmin(axis=1)
+            nuevos = np.array(
+                [X[etiquetas == j].mean(axis=0) if np.any(etiquetas == j) else centros[j] for j in range(k)]
+            )
+            if np.allclose(nuevos, centros):
+                break
+            centros = nuevos
+
+        inercia = float(d2[np.arange(len(X)), etiquetas].sum())
+        if mejor is None or inercia < mejor[2]:
+            mejor = (etiquetas, centros, inercia)
+
+    return mejor
+
+
+def silueta(X, etiquetas):
+    # Coeficiente de silueta medio (las parroquias solas en su cluster cuentan 0).
+    from scipy.spatial.distance import cdist
+
+    distancias = cdist(X, X)
+    grupos = np.unique(etiquetas)
+    if len(grupos) < 2:
+        return None
+
+    medias = np.column_stack([distancias[:, etiquetas == c].mean(axis=1) for c in grupos])
+    tamanos = np.array([(etiquetas == c).sum() for c in grupos])
+    propio = np.searchsorted(grupos, etiquetas)
+
+    # a: distancia media a los demas del propio cluster (sin contarse a si mismo).
+    n_propio = tamanos[propio]
+    a = medias[np.arange(len(X)), propio] * n_propio / np.maximum(n_propio - 1, 1)
+    medias[np.arange(len(X)), propio] = np.inf
+    b = medias.min(axis=1)
+
+    s = np.where(n_propio > 1, (b - a) / np.maximum(a, b), 0.0)
+    return float(s.mean())
+
+
+def clusterizar_parroquias(gdf, k=5, incluir_espacial=False, seed=0):
+    # Columna `cluster` (1..k) mas las features usadas, como espera mapa_clusters.
+    gdf, X = features_parroquias(gdf, incluir_espacial)
+    etiquetas, _, _ = kmeans(X, k, seed=seed)
+    gdf["cluster"] = etiquetas + 1
+    return gdf
+
+
+def barrido_clusters(params, progreso):
+    # Tarea de servicios.trabajos: k-means para cada k en [kmin, kmax], con
+    # inercia y silueta para elegir k, y la asignacion de cada parroquia.
+    from routes.main import cargar_parroquias
+
+    kmin = int(params.get("kmin", 2))
+    kmax = int(params.get("kmax", 10))
+    gdf = cargar_parroquias(scope=params.get("scope", "todas"))
+    gdf, X = features_parroquias(gdf, bool(params.get("espacial", False)))
+
+    ks = list(range(kmin, min(kmax, len(gdf)) + 1))
+    resultado = {
+        "codigos": gdf["codigo"].astype(str).tolist(),
+        "nombres": gdf["nombre"].astype(str).tolist(),
+        "k": ks,
+        "inercia": [],
+        "silueta": [],
+        "asignaciones": {},
+    }
+    for i, k in enumerate(ks):
+        etiquetas, _, inercia = kmeans(X, k, seed=int(params.get("seed", 0)))
+        resultado["inercia"].append(round(inercia, 4))
+        resultado["silueta"].append(silueta(X, etiquetas))
+        resultado["asignaciones"][str(k)] = (etiquetas + 1).tolist()
+        progreso((i + 1) / len(ks), f"k={k}")
+
+    return resultado
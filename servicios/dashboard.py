@@ -0,0 +1,220 @@
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.image as mimage
+import matplotlib.ticker as mtick
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from servicios.graficos import (
+    CATEGORIAS_EDAD,
+    cargar_edad_por_sector,
+    cargar_evolucion_por_sector,
+    lookups_sector,
+)
+
+
+SCOPES = ["todas", "urbanas", "rurales"]
+
+# Orden de los comparativos del tablero (el sector base se omite).
+ORDEN_SECTORES = ["UDLA", "VALLES", "NORTE", "CENTRO", "SUR", "NORORIENTE", "NOROCCIDENTE"]
+
+COLORES_ANIO = {"2001": "#1f77b4", "2010": "#6d7173", "2022": "#3fafd4"}
+
+DPI = 110
+
+
+def limpiar_etiqueta_edad(etiqueta):
+    txt = etiqueta.replace("De ", "").strip()
+    txt = re.sub(r"\s+a(?:ñ|n|\?)?(?:o|os)\b", "", txt, flags=re.IGNORECASE)
+    txt = re.sub(r"\s+a(?:ñ|\?)\b", "", txt, flags=re.IGNORECASE)
+    return txt.strip()
+
+
+def preparar_datos(scopes):
+    # Se lee todo una sola vez en el proceso principal; los workers reciben las
+    # tablas ya agregadas (unos pocos KB) y no vuelven a tocar Excel ni GeoJSON.
+    datos = {}
+    for scope in scopes:
+        lookups = lookups_sector(scope)
+        datos[scope] = {
+            "edad_pct": cargar_edad_por_sector(scope, lookups=lookups),
+            "evolucion": cargar_evolucion_por_sector(scope, lookups=lookups),
+        }
+    return datos
+
+
+def sectores_comparables(edad_pct, base):
+    disponibles = edad_pct.index.tolist()
+    orden = ORDEN_SECTORES + sorted(s for s in disponibles if s not in ORDEN_SECTORES)
+    return [s for s in orden if s != base and s in disponibles][:6]
+
+
+def figura_dashboard(datos_scope, base, scope):
+    edad_pct = datos_scope["edad_pct"]
+    evolucion = datos_scope["evolucion"]
+
+    fig = Figure(figsize=(18, 10), facecolor="white")
+    layout = fig.add_gridspec(1, 2, width_ratios=[60, 40], wspace=0.22)
+
+    # 60% izquierdo: hasta 6 comparativos base vs otros (3x2)
+    top_grid = layout[0].subgridspec(3, 2, hspace=0.34, wspace=0.2)
+    posiciones = list(range(len(CATEGORIAS_EDAD)))
+    etiquetas = [limpiar_etiqueta_edad(e) for e in CATEGORIAS_EDAD]
+    base_vals = edad_pct.loc[base, CATEGORIAS_EDAD].values
+
+    for idx, sector in enumerate(sectores_comparables(edad_pct, base)):
+        ax = fig.add_subplot(top_grid[idx // 2, idx % 2])
+        otro_vals = edad_pct.loc[sector, CATEGORIAS_EDAD].values
+
+        ax.plot(base_vals, posiciones, label=base, linewidth=1.8)
+        ax.plot(otro_vals, posiciones, label=sector, color="#808080", linewidth=1.6)
+        ax.fill_betweenx(
+            posiciones,
+            base_vals,
+            otro_vals,
+            where=(base_vals > otro_vals),
+            interpolate=True,
+            color="#9fd3eb",
+            alpha=0.55,
+        )
+
+        ax.set_title(f"{base} vs {sector}", fontsize=11)
+        ax.set_yticks(posiciones)
+        ax.set_yticklabels(etiquetas if idx % 2 == 0 else [], fontsize=8)
+        ax.xaxis.set_major_formatter(mtick.PercentFormatter(1.0))
+        ax.grid(axis="x", linestyle="--", alpha=0.35)
+        if idx == 0:
+            ax.legend(loc="best", fontsize=8)
+
+    # 40% derecho: evolucion del sector base por grupos de edad
+    ax_lateral = fig.add_subplot(layout[1])
+    anios = evolucion.columns.tolist()
+    if base in evolucion.index.get_level_values(0):
+        serie = evolucion.loc[base]
+        for anio in anios:
+            ax_lateral.plot(
+                serie[anio].values,
+                serie.index.astype(str),
+                label=anio,
+                linewidth=2,
+                color=COLORES_ANIO.get(anio, "#333333"),
+            )
+        ax_lateral.legend(title="Ano")
+    else:
+        ax_lateral.text(0.5, 0.5, "Sin datos por anio", ha="center", va="center")
+
+    ax_lateral.set_title(
+        f"Sector {base} - Evolucion por grupos de edad ({'/'.join(anios)})"
+    )
+    ax_lateral.set_xlabel("Poblacion")
+    ax_lateral.set_ylabel("Grupo de edad")
+    ax_lateral.grid(axis="x", linestyle="--", alpha=0.4)
+
+    fig.suptitle(f"Resumen {base} con sectores del mapa (scope={scope})", fontsize=16, y=0.995)
+    # tight_layout no soporta subgridspec anidados; margenes fijos.
+    fig.subplots_adjust(left=0.07, right=0.98, bottom=0.06, top=0.93)
+    return fig
+
+
+# Datos compartidos, entregados a cada worker una sola vez via initializer.
+_datos_worker = None
+
+
+def _iniciar_worker(datos):
+    global _datos_worker
+    _datos_worker = datos
+
+
+def _renderizar_dashboard(scope, base, salida):
+    inicio = time.perf_counter()
+    fig = figura_dashboard(_datos_worker[scope], base, scope)
+    ruta = os.path.join(salida, f"dashboard_{scope}_{base}.png")
+    fig.savefig(ruta, dpi=DPI)
+    return scope, base, ruta, time.perf_counter() - inicio
+
+
+def exportar_dashboards(salida, scopes=None, sectores=None, workers=None, pdf=True):
+    scopes = scopes or SCOPES
+    os.makedirs(salida, exist_ok=True)
+
+    inicio = time.perf_counter()
+    datos = preparar_datos(scopes)
+    t_datos = time.perf_counter() - inicio
+    print(f"Datos preparados en {t_datos:.2f}s")
+
+    tareas = [
+        (scope, base)
+        for scope in scopes
+        for base in datos[scope]["edad_pct"].index.tolist()
+        if sectores is None or base in sectores
+    ]
+
+    resultados = []
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_iniciar_worker,
+        initargs=(datos,),
+    ) as pool:
+        futuros = [pool.submit(_renderizar_dashboard, s, b, salida) for s, b in tareas]
+        for futuro in as_completed(futuros):
+            scope, base, ruta, segundos = futuro.result()
+            print(f"  {scope:<8} {base:<14} {segundos:6.2f}s  {ruta}")
+            resultados.append((scope, base, ruta, segundos))
+
+    resultados.sort(key=lambda r: (scopes.index(r[0]), r[1]))
+
+    if pdf:
+        t_pdf = time.perf_counter()
+        ruta_pdf = os.path.join(salida, "dashboards.pdf")
+        escribir_pdf(ruta_pdf, [r[2] for r in resultados])
+        print(f"PDF: {ruta_pdf} ({time.perf_counter() - t_pdf:.2f}s)")
+
+    total = time.perf_counter() - inicio
+    print(f"{len(resultados)} tableros en {total:.2f}s")
+    return resultados
+
+
+def escribir_pdf(ruta_pdf, rutas_png):
+    # Cada pagina reutiliza el PNG ya renderizado en paralelo, asi el PDF no
+    # obliga a redibujar todas las figuras en serie en el proceso principal.
+    with PdfPages(ruta_pdf) as pdf:
+        for ruta in rutas_png:
+            imagen = mimage.imread(ruta)
+            alto, ancho = imagen.shape[:2]
+            fig = Figure(figsize=(ancho / DPI, alto / DPI), dpi=DPI)
+            fig.figimage(imagen, resize=False)
+            pdf.savefig(fig, dpi=DPI)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta el tablero por sector (udlaDashboardSectores) en lote."
+    )
+    parser.add_argument("--salida", default="reportes")
+    parser.add_argument("--scopes", nargs="+", default=SCOPES, choices=SCOPES)
+    parser.add_argument("--sectores", nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sin-pdf", action="store_true")
+    args = parser.parse_args()
+
+    exportar_dashboards(
+        args.salida,
+        scopes=args.scopes,
+        sectores=args.sectores,
+        workers=args.workers,
+        pdf=not args.sin_pdf,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from servicios.cache import BASE_DIR, DATA_DIR, CacheDisco, CacheMemoria, version_codigo, version_datos
+
+
+logger = logging.getLogger(__name__)
+
+
+RAIZ_DIR = os.path.normpath(os.path.join(BASE_DIR, ".."))
+
+# Descriptores de regiones adicionales. Formato (rutas relativas a la raiz del repo):
+# {
+#   "cuenca": {
+#     "titulo": "Cuenca",
+#     "data_dir": "datos/cuenca",
+#     "area_crs": "EPSG:32717",
+#     "centro": [-2.90, -79.00],
+#     "zoom": 12,
+#     "codigo_otras": {"BANOS": "010152"},
+#     "codigos_canton": {"CUENCA": "0101"},
+#     "alias_parroquias": {"SAN JOAQUIN DE CUENCA": "SAN JOAQUIN"},
+#     "cantones_sin_desglose": ["GUALACEO"],
+#     "excluir_otras": [],
+#     "archivos": {"urbanas": "parroquias_urbanas.geojson"}
+#   }
+# }
+DATASETS_CONFIG = os.environ.get("DATASETS_CONFIG", os.path.join(RAIZ_DIR, "datasets.json"))
+
+DATASET_POR_DEFECTO = os.environ.get("DATASET", "quito")
+
+# Tope de memoria (estimada) para todos los datasets cargados, y segundos sin uso
+# tras los que un dataset se descarta completo.
+DATASETS_MAX_MB = float(os.environ.get("DATASETS_MAX_MB", "1024"))
+DATASETS_MAX_INACTIVO = float(os.environ.get("DATASETS_MAX_INACTIVO", "3600"))
+
+# Entradas maximas de cada cache por dataset (las que no estan aqui: 64).
+MAX_ITEMS = {
+    "fuentes": 64,
+    "topologias": 16,
+    "paginas": 32,
+}
+
+# Segundos durante los que, tras un cambio de datos, se sigue sirviendo la version
+# anterior de algo cacheado mientras la nueva se construye en segundo plano
+# (stale-while-revalidate). 0 = no servir versiones viejas.
+CACHE_SWR_SEGUNDOS = float(os.environ.get("CACHE_SWR_SEGUNDOS", "0"))
+
+# Segundo nivel, en disco y compartido entre los workers de gunicorn, debajo de
+# la memoria de cada proceso: solo para los tipos de cache listados (paginas,
+# resultados de la API, tablas derivadas). CACHE_DISCO_MB=0 lo desactiva.
+CACHE_DISCO_RUTA = os.environ.get("CACHE_DISCO_RUTA", os.path.join(RAIZ_DIR, "cache", "cache.sqlite3"))
+CACHE_DISCO_MB = float(os.environ.get("CACHE_DISCO_MB", "512"))
+CACHE_DISCO_TIPOS = set(
+    os.environ.get("CACHE_DISCO_TIPOS", "paginas,calculos,render,clasificacion,topologias,etiquetas").split(",")
+)
+
+# La cache en disco sobrevive a los reinicios, asi que sus entradas llevan
+# tambien la version del codigo: un deploy que cambia vistas, paletas o
+# calculos sin tocar data/ no sirve lo que armo el codigo anterior. VERSION_APP
+# (p. ej. el id del build) evita leer las fuentes al arrancar.
+VERSION_APP = os.environ.get("VERSION_APP") or version_codigo(RAIZ_DIR)
+
+ARCHIVOS = {
+    "crecimiento": "dataCrecimiento.xlsx",
+    "poblacion": "poblacionParroquias.xlsx",
+    "rurales": "parroquiasRurales.geojson",
+    "urbanas": "parroquiasUrbanas.geojson",
+    "otras": "otras.geojson",
+    "sectores": "sectores.json",
+    "campus": "campus.json",
+    "desglose": "parroquiasDesglose.xlsx",
+}
+
+
+class Dataset:
+
+    def __init__(
+        self,
+        nombre,
+        data_dir,
+        titulo=None,
+        area_crs="EPSG:32717",
+        centro=(-0.20, -78.50),
+        zoom=11,
+        codigo_otras=None,
+        excluir_otras=(),
+        archivos=None,
+        codigos_canton=None,
+        alias_parroquias=None,
+        cantones_sin_desglose=(),
+    ):
+        self.nombre = nombre
+        self.titulo = titulo or nombre.capitalize()
+        self.data_dir = data_dir
+        self.area_crs = area_crs
+        self.centro = list(centro)
+        self.zoom = zoom
+        # Codigos para parroquias sin DPA, por nombre normalizado (sin tildes, mayusculas).
+        self.codigo_otras = dict(codigo_otras or {})
+        self.excluir_otras = tuple(excluir_otras)
+        self.archivos = {**ARCHIVOS, **(archivos or {})}
+        # Canton del Excel de poblacion -> prefijo DPA de 4 digitos, para unir por
+        # canton y nombre (sin esto se une solo por nombre).
+        self.codigos_canton = dict(codigos_canton or {})
+        # Nombres del Excel de poblacion que difieren de los de las capas.
+        self.alias_parroquias = dict(alias_parroquias or {})
+        # Cantones cuyo Excel de poblacion repite un agregado en cada parroquia
+        # en lugar del dato propio: sus filas quedan sin poblacion.
+        self.cantones_sin_desglose = tuple(cantones_sin_desglose)
+
+    def ruta(self, clave):
+        return os.path.join(self.data_dir, self.archivos[clave])
+
+    def version(self):
+        return version_datos(self.data_dir)
+
+    def __repr__(self):
+        return f"Dataset({self.nombre!r}, {self.data_dir!r})"
+
+
+# Region original de la app: los mismos valores que las constantes de routes.main.
+QUITO = Dataset(
+    "quito",
+    DATA_DIR,
+    titulo="Quito",
+    area_crs="EPSG:32717",
+    centro=(-0.20, -78.50),
+    zoom=11,
+    codigo_otras={
+        "SANGOLQUI": "170501",
+        "RUMIPAMBA": "170552",
+        "COTOGCHOA": "170551",
+        "SAN RAFAEL": "170503",
+        "SAN PEDRO": "170502",
+        "FAJARDO": "170504",
+    },
+    excluir_otras=("FAJARDO",),
+    codigos_canton={"DISTRITO METROPOLITANO DE QUITO": "1701", "RUMINAHUI": "1705"},
+    alias_parroquias={"CONCEPCION": "LA CONCEPCION"},
+    # poblacionParroquias.xlsx trae el total de Pichincha en cada parroquia de Rumiñahui.
+    cantones_sin_desglose=("RUMINAHUI",),
+)
+
+
+def cargar_descriptores(ruta=DATASETS_CONFIG):
+    descriptores = {QUITO.nombre: QUITO}
+    if not os.path.exists(ruta):
+        return descriptores
+
+    with open(ruta, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    for nombre, opciones in config.items():
+        opciones = dict(opciones)
+        data_dir = os.path.join(RAIZ_DIR, opciones.pop("data_dir"))
+        descriptores[nombre] = Dataset(nombre, data_dir, **opciones)
+    return descriptores
+
+
+_descriptores = None
+_descriptores_lock = threading.Lock()
+
+
+def descriptores():
+    global _descriptores
+    with _descriptores_lock:
+        if _descriptores is None:
+            _descriptores = cargar_descriptores()
+        return _descriptores
+
+
+def obtener_dataset(nombre=None):
+    # KeyError si el nombre no esta registrado.
+    return descriptores()[nombre or DATASET_POR_DEFECTO]
+
+
+def estimar_bytes(valor):
+    # Aproximacion del tamano en memoria de lo que se cachea por dataset.
+    import pandas as pd
+
+    if isinstance(valor, pd.DataFrame):
+        geometria = getattr(valor, "_geometry_column_name", None)
+        if geometria is None or geometria not in valor.columns:
+            return int(valor.memory_usage(deep=True).sum())
+
+        import shapely
+
+        atributos = valor.drop(columns=geometria)
+        coordenadas = int(shapely.get_num_coordinates(valor[geometria].values).sum())
+        return int(atributos.memory_usage(deep=True).sum()) + coordenadas * 16
+    return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# Caches por dataset. Cada dataset tiene sus propias CacheMemoria; cuando la
+# memoria estimada supera el tope, o un dataset queda inactivo demasiado tiempo,
+# se descarta el dataset menos usado completo (todas sus caches a la vez).
+class RegistroDatasets:
+
+    def __init__(self, max_bytes=DATASETS_MAX_MB * 1024 * 1024, max_inactivo=DATASETS_MAX_INACTIVO):
+        self.max_bytes = max_bytes
+        self.max_inactivo = max_inactivo
+        self._estado = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache(self, dataset, tipo):
+        ahora = time.monotonic()
+        with self._lock:
+            estado = self._estado.get(dataset)
+            if estado is None:
+                estado = {"caches": {}, "bytes": 0, "ultimo_uso": ahora}
+                self._estado[dataset] = estado
+            estado["ultimo_uso"] = ahora
+            self._estado.move_to_end(dataset)
+
+            for nombre in list(self._estado)[:-1]:
+                if ahora - self._estado[nombre]["ultimo_uso"] > self.max_inactivo:
+                    self._desalojar(nombre, "inactivo")
+            self._recortar(dataset)
+
+            if tipo not in estado["caches"]:
+                # Lo que sale por reemplazo o LRU deja de contar para el tope.
+                estado["caches"][tipo] = CacheMemoria(
+                    max_items=MAX_ITEMS.get(tipo, 64),
+                    al_descartar=lambda clave, entrada: self._restar(estado, entrada.bytes),
+                )
+            return estado["caches"][tipo]
+
+    def sumar_bytes(self, dataset, n):
+        with self._lock:
+            if dataset not in self._estado:
+                return
+            self._estado[dataset]["bytes"] += n
+            self._recortar(dataset)
+
+    def _restar(self, estado, n):
+        # Sobre el estado con el que se creo la cache: si el dataset ya se
+        # desalojo (y quiza se volvio a crear), no toca al nuevo.
+        with self._lock:
+            estado["bytes"] = max(estado["bytes"] - n, 0)
+
+    def desalojar(self, dataset):
+        with self._lock:
+            if dataset in self._estado:
+                self._desalojar(dataset, "manual")
+
+    def resumen(self):
+        with self._lock:
+            return {
+                nombre: {
+                    "bytes": estado["bytes"],
+                    "entradas": {tipo: len(c) for tipo, c in estado["caches"].items()},
+                    "vuelos": {tipo: c.vuelos.estadisticas() for tipo, c in estado["caches"].items()},
+                }
+                for nombre, estado in self._estado.items()
+            }
+
+    def _recortar(self, en_uso):
+        # Descarta datasets completos, del menos reciente al mas reciente, hasta
+        # volver bajo el tope. Nunca el que esta en uso.
+        while self._total() > self.max_bytes and len(self._estado) > 1:
+            nombre = next(iter(self._estado))
+            if nombre == en_uso:
+                break
+            self._desalojar(nombre, "memoria")
+
+    def _total(self):
+        return sum(estado["bytes"] for estado in self._estado.values())
+
+    def _desalojar(self, dataset, motivo):
+        estado = self._estado.pop(dataset)
+        for cache in estado["caches"].values():
+            cache.limpiar()
+        logger.info(
+            "dataset %s descartado (%s, ~%.1f MB)", dataset, motivo, estado["bytes"] / 1e6
+        )
+
+
+registro = RegistroDatasets()
+
+
+# Lo cacheado por dataset se guarda con la version de datos con la que se
+# construyo; la clave no la incluye, asi la entrada vieja sigue a mano para
+# servirla mientras se reconstruye (ver obtener_o_construir).
+class _Entrada:
+    __slots__ = ("version", "valor", "bytes", "obsoleta_desde")
+
+    def __init__(self, version, valor, bytes=0):
+        self.version = version
+        self.valor = valor
+        self.bytes = bytes
+        self.obsoleta_desde = None
+
+
+disco = CacheDisco(CACHE_DISCO_RUTA, int(CACHE_DISCO_MB * 1024 * 1024)) if CACHE_DISCO_MB > 0 else None
+
+
+def _en_disco(tipo):
+    return disco is not None and tipo in CACHE_DISCO_TIPOS
+
+
+def _guardar_en_memoria(dataset, tipo, clave, valor, version):
+    # Al reemplazar la entrada anterior se restan sus bytes (al_descartar):
+    # guardar la misma clave otra vez no suma dos veces.
+    n = estimar_bytes(valor)
+    registro.cache(dataset.nombre, tipo).guardar(clave, _Entrada(version, valor, n))
+    registro.sumar_bytes(dataset.nombre, n)
+    return valor
+
+
+def _leer_de_disco(dataset, tipo, clave, version):
+    # Acierto en disco (lo armo otro worker o una corrida anterior): sube a memoria.
+    if not _en_disco(tipo):
+        return None
+    valor = disco.obtener(f"{dataset.nombre}|{tipo}", clave, f"{version}|{VERSION_APP}")
+    if valor is not None:
+        _guardar_en_memoria(dataset, tipo, clave, valor, version)
+    return valor
+
+
+def guardar_en_cache(dataset, tipo, clave, valor, version=None):
+    version = version or dataset.version()
+    if _en_disco(tipo):
+        disco.guardar(f"{dataset.nombre}|{tipo}", clave, f"{version}|{VERSION_APP}", valor)
+    return _guardar_en_memoria(dataset, tipo, clave, valor, version)
+
+
+def obtener_de_cache(dataset, tipo, clave):
+    # Valor de la version de datos actual (memoria y luego disco), o None.
+    version = dataset.version()
+    entrada = registro.cache(dataset.nombre, tipo).obtener(clave)
+    if entrada is None or entrada.version != version:
+        return _leer_de_disco(dataset, tipo, clave, version)
+    return entrada.valor
+
+
+def obtener_o_construir(dataset, tipo, clave, construir, swr=None):
+    # Valor cacheado de la version actual; si falta en memoria se busca en disco
+    # y, si tampoco esta, `construir()` corre una sola vez aunque lleguen muchos
+    # pedidos a la vez (los demas esperan ese mismo calculo). Con `swr` > 0,
+    # durante esos segundos tras detectar un cambio de datos se devuelve la
+    # version anterior y la nueva se arma en segundo plano.
+    swr = CACHE_SWR_SEGUNDOS if swr is None else swr
+    cache = registro.cache(dataset.nombre, tipo)
+    version = dataset.version()
+
+    def construir_y_guardar():
+        entrada = cache.obtener(clave)
+        if entrada is not None and entrada.version == version:
+            return entrada.valor
+        valor = _leer_de_disco(dataset, tipo, clave, version)
+        if valor is not None:
+            return valor
+        return guardar_en_cache(dataset, tipo, clave, construir(), version)
+
+    entrada = cache.obtener(clave)
+    if entrada is not None and entrada.version == version:
+        return entrada.valor
+
+    if entrada is not None and swr > 0:
+        ahora = time.monotonic()
+        if entrada.obsoleta_desde is None:
+            entrada.obsoleta_desde = ahora
+        if ahora - entrada.obsoleta_desde <= swr:
+            cache.vuelos.contar("obsoletas_servidas")
+            if not cache.vuelos.en_curso((clave, version)):
+                threading.Thread(
+                    target=_revalidar,
+                    args=(dataset, cache, (clave, version), construir_y_guardar),
+                    name="cache-revalidar",
+                    daemon=True,
+                ).start()
+            return entrada.valor
+
+    return cache.vuelos.ejecutar((clave, version), construir_y_guardar)
+
+
+def _revalidar(dataset, cache, clave, construir_y_guardar):
+    from routes.main import usar_dataset
+
+    try:
+        with usar_dataset(dataset):
+            cache.vuelos.ejecutar(clave, construir_y_guardar)
+        cache.vuelos.contar("revalidaciones")
+    except Exception:
+        logger.exception("no se pudo revalidar %s en %s", clave, dataset.nombre)
@@ -0,0 +1,105 @@
+import hashlib
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+# Tamano de fuente (px) de .parroquia-label en cada zoom, el mismo que aplica
+# ajustarTamañoFuente en templates/layout.html (por debajo de 9 se ocultan).
+FUENTE_POR_ZOOM = {9: 4, 10: 5, 11: 7, 12: 9, 13: 11, 14: 13, 15: 15, 16: 15, 17: 15, 18: 15}
+
+ANCHO_CARACTER = 0.62  # ancho medio de un caracter en negrita, en ems
+ALTO_LINEA = 1.25  # en ems
+MARGEN_PX = 2  # separacion minima entre etiquetas vecinas
+
+TAMANO_TESELA = 256
+
+
+def polos_inaccesibilidad(gdf, area_crs):
+    # (lon, lat) del punto interior mas alejado del borde de cada parroquia
+    # (centro del mayor circulo inscrito, en la parte mas ancha si tiene varias).
+    # A diferencia del centroide, siempre cae dentro, aun en formas concavas.
+    proyectadas = gdf.geometry.to_crs(area_crs).values
+    centros = shapely.get_point(shapely.maximum_inscribed_circle(shapely.make_valid(proyectadas)), 0)
+    polos = gpd.GeoSeries(centros, crs=area_crs).to_crs(gdf.crs)
+    return polos.x.to_numpy(), polos.y.to_numpy()
+
+
+def a_pixeles(lon, lat, zoom):
+    # Coordenadas de pixel (Web Mercator) en el zoom dado, como las usa Leaflet.
+    escala = TAMANO_TESELA * 2.0**zoom
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (lon + 180.0) / 360.0 * escala
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * escala
+    return x, y
+
+
+def seleccion_voraz(cajas, orden):
+    # Recorre las etiquetas por prioridad y acepta cada una si no choca con
+    # ninguna ya aceptada. Los choques posibles salen de una sola consulta al
+    # STRtree de todas las cajas.
+    i, j = shapely.STRtree(cajas).query(cajas, predicate="intersects")
+    distintos = i != j
+    i, j = i[distintos], j[distintos]
+    por_caja = np.argsort(i, kind="stable")
+    i, j = i[por_caja], j[por_caja]
+    inicios = np.searchsorted(i, np.arange(len(cajas) + 1))
+
+    aceptada = np.zeros(len(cajas), dtype=bool)
+    bloqueada = np.zeros(len(cajas), dtype=bool)
+    for k in orden:
+        if bloqueada[k]:
+            continue
+        aceptada[k] = True
+        bloqueada[j[inicios[k] : inicios[k + 1]]] = True
+    return aceptada
+
+
+def visibles_por_zoom(lon, lat, lineas, prioridad):
+    # Para cada etiqueta, la lista de zooms en los que se muestra. La caja de
+    # cada etiqueta se estima en pixeles con la fuente de ese zoom, centrada en
+    # su ancla.
+    caracteres = np.array([max((len(str(l)) for l in ls), default=0) for ls in lineas], dtype=float)
+    filas = np.array([len(ls) for ls in lineas], dtype=float)
+    validas = np.isfinite(lon) & np.isfinite(lat)
+    orden = [k for k in np.argsort(-np.asarray(prioridad, dtype=float), kind="stable") if validas[k]]
+
+    zooms = [[] for _ in lineas]
+    for zoom, fuente in FUENTE_POR_ZOOM.items():
+        x, y = a_pixeles(np.where(validas, lon, 0.0), np.where(validas, lat, 0.0), zoom)
+        medio_ancho = caracteres * fuente * ANCHO_CARACTER / 2 + MARGEN_PX
+        medio_alto = filas * fuente * ALTO_LINEA / 2 + MARGEN_PX
+        cajas = shapely.box(x - medio_ancho, y - medio_alto, x + medio_ancho, y + medio_alto)
+        for k in np.flatnonzero(seleccion_voraz(cajas, orden)):
+            zooms[k].append(zoom)
+    return zooms
+
+
+def ubicar_etiquetas(gdf, lineas, area_crs, prioridad=None):
+    # {"lon", "lat", "zooms"} alineados con las filas de `gdf`. Por defecto las
+    # parroquias mas grandes tienen prioridad cuando dos etiquetas chocan.
+    lon, lat = polos_inaccesibilidad(gdf, area_crs)
+    if prioridad is None:
+        prioridad = gdf.geometry.to_crs(area_crs).area.to_numpy()
+    return {
+        "lon": lon.tolist(),
+        "lat": lat.tolist(),
+        "zooms": visibles_por_zoom(lon, lat, lineas, prioridad),
+    }
+
+
+def etiquetas_cacheadas(capa, gdf, lineas, prioridad=None):
+    # Igual que ubicar_etiquetas, calculado una vez por capa, textos y version
+    # de datos del dataset actual.
+    from routes.main import dataset_actual
+    from servicios.datasets import obtener_o_construir
+
+    ds = dataset_actual()
+    huella = hashlib.sha1(repr([list(map(str, ls)) for ls in lineas]).encode("utf-8")).hexdigest()
+    return obtener_o_construir(
+        ds,
+        "etiquetas",
+        (capa, huella),
+        lambda: ubicar_etiquetas(gdf, lineas, ds.area_crs, prioridad),
+    )
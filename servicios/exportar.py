@@ -0,0 +1,174 @@
+import json
+import tempfile
+
+import pandas as pd
+import shapely
+
+
+FILAS_POR_BLOQUE = 2_000
+
+# Columnas exportadas, en orden (la geometria se agrega al final si se pide).
+COLUMNAS = [
+    "codigo",
+    "nombre",
+    "tipo",
+    "zona_admin",
+    "sector",
+    "tasa_pct",
+    "pob_pct",
+    "area_km2",
+    "lat",
+    "lon",
+]
+
+FORMATOS = {
+    "csv": "text/csv",  # Flask agrega "; charset=utf-8" a los text/*
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "geojson": "application/geo+json",
+}
+
+
+def tabla_parroquias(scope="todas"):
+    # Tabla unida a partir de las fuentes cacheadas: atributos, sector, tasa,
+    # peso poblacional, area y centroide. La geometria queda como columna del gdf.
+    from routes.main import cargar_parroquias, clasificar_sectorial
+    from servicios.clusters import features_parroquias
+
+    gdf, _ = features_parroquias(cargar_parroquias(scope=scope))
+    gdf["sector"] = clasificar_sectorial(gdf)["sector"].to_numpy()
+    for columna, decimales in (("tasa_pct", 4), ("pob_pct", 4), ("area_km2", 4), ("lat", 6), ("lon", 6)):
+        # A float64 antes de redondear: un float32 redondeado se imprime como
+        # 0.1234000027179718.
+        gdf[columna] = gdf[columna].astype(float).round(decimales)
+    return gdf
+
+
+def bloques(gdf, filas=FILAS_POR_BLOQUE):
+    for inicio in range(0, len(gdf), filas):
+        yield gdf.iloc[inicio : inicio + filas]
+
+
+def escribir_csv(gdf, geometria=False):
+    # Encabezado y luego un bloque de filas por vez; la geometria va como WKT.
+    columnas = COLUMNAS + (["geometry"] if geometria else [])
+    yield (",".join(columnas) + "\n").encode("utf-8")
+    for bloque in bloques(gdf):
+        tabla = pd.DataFrame(bloque[COLUMNAS])
+        if geometria:
+            tabla["geometry"] = shapely.to_wkt(bloque.geometry.values, rounding_precision=7)
+        yield tabla.to_csv(header=False, index=False).encode("utf-8")
+
+
+def escribir_geojson(gdf, geometria=True):
+    # FeatureCollection armada por partes: cada bloque es una tira de features
+    # separadas por coma (la geometria siempre va, es GeoJSON).
+    yield b'{"type": "FeatureCollection", "features": ['
+    primero = True
+    for bloque in bloques(gdf):
+        geometrias = shapely.to_geojson(bloque.geometry.values)
+        propiedades = bloque[COLUMNAS].astype(object).where(bloque[COLUMNAS].notna(), None)
+        features = [
+            f'{{"type": "Feature", "properties": {json.dumps(props, ensure_ascii=False)}, "geometry": {geo}}}'
+            for props, geo in zip(propiedades.to_dict("records"), geometrias)
+        ]
+        yield (("" if primero else ",") + ",".join(features)).encode("utf-8")
+        primero = False
+    yield b"]}"
+
+
+class _Sumidero:
+    # Archivo de solo escritura para pyarrow: acumula lo escrito hasta que el
+    # generador lo vacia con `vaciar`.
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b"".join(self.partes)
+        self.partes = []
+        return datos
+
+
+def escribir_parquet(gdf, geometria=False):
+    # Un row group por bloque. Con geometria, columna WKB con metadatos GeoParquet.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def tabla_arrow(bloque):
+        tabla = pa.Table.from_pandas(pd.DataFrame(bloque[COLUMNAS]), preserve_index=False)
+        if geometria:
+            tabla = tabla.append_column("geometry", pa.array(shapely.to_wkb(bloque.geometry.values), pa.binary()))
+        return tabla
+
+    esquema = tabla_arrow(gdf.iloc[:0]).schema
+    if geometria:
+        geo = {
+            "version": "1.0.0",
+            "primary_column": "geometry",
+            "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}},
+        }
+        esquema = esquema.with_metadata({**(esquema.metadata or {}), b"geo": json.dumps(geo).encode("utf-8")})
+
+    sumidero = _Sumidero()
+    with pq.ParquetWriter(sumidero, esquema, compression="zstd") as escritor:
+        for bloque in bloques(gdf):
+            escritor.write_table(tabla_arrow(bloque).cast(esquema))
+            yield sumidero.vaciar()
+    yield sumidero.vaciar()
+
+
+def escribir_xlsx(gdf, geometria=False):
+    # openpyxl en modo write_only vuelca las filas a disco a medida que llegan;
+    # el .xlsx (un zip) se arma en un archivo temporal y se envia por partes.
+    # Sin geometria: Excel corta las celdas en 32767 caracteres.
+    from openpyxl import Workbook
+
+    if geometria:
+        raise ValueError("xlsx no admite geometria (celdas de max. 32767 caracteres)")
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("parroquias")
+    hoja.append(COLUMNAS)
+    for bloque in bloques(gdf):
+        valores = bloque[COLUMNAS].astype(object).where(bloque[COLUMNAS].notna(), None)
+        for fila in valores.itertuples(index=False):
+            hoja.append(list(fila))
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            datos = archivo.read(1 << 16)
+            if not datos:
+                break
+            yield datos
+
+
+ESCRITORES = {
+    "csv": escribir_csv,
+    "xlsx": escribir_xlsx,
+    "parquet": escribir_parquet,
+    "geojson": escribir_geojson,
+}
+
+
+def exportar(gdf, formato, geometria=False):
+    # Generador de bytes del formato pedido (nunca arma el archivo completo en memoria).
+    return ESCRITORES[formato](gdf, geometria=geometria or formato == "geojson")
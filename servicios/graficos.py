@@ -0,0 +1,438 @@
+import io
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.ticker as mtick
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from scipy.interpolate import make_interp_spline
+
+from servicios.cache import CacheMemoria, DATA_DIR, version_datos
+
+
+EXCEL_EDADES = os.path.join(DATA_DIR, "edades.xlsx")
+
+EXCEL_DESGLOSE = os.path.join(DATA_DIR, "parroquiasDesglose.xlsx")
+
+EXCEL_EDADES_PARROQUIA = os.path.join(DATA_DIR, "parroquiasEdades.xlsx")
+
+
+ANIOS = [2001, 2010, 2022]
+
+AREAS = ["Rural", "Urbano"]
+
+ORDEN_ETAPAS = [
+    "Niñas/os (0 a 11 años)",
+    "Adolescentes (12 a 17 años)",
+    "Jóvenes (18 a 29 años)",
+    "Adultas/os (30 a 64 años)",
+    "Adultas/os mayores (65 años o más)",
+]
+
+CATEGORIAS_EDAD = [
+    "De 0 a 4 años",
+    "De 5 a 9 años",
+    "De 10 a 14 años",
+    "De 15 a 19 años",
+    "De 20 a 24 años",
+    "De 25 a 29 años",
+    "De 30 a 34 años",
+    "De 35 a 39 años",
+    "De 40 a 44 años",
+    "De 45 a 49 años",
+    "De 50 a 54 años",
+    "De 55 a 59 años",
+    "De 60 a 64 años",
+    "De 65 a 69 años",
+    "De 70 a 74 años",
+    "De 75 a 79 años",
+    "De 80 a 84 años",
+    "De 85 o mas",
+]
+
+COLORES_HOMBRE = {2001: "#4472C4", 2010: "#FFC000", 2022: "#C00000"}
+COLORES_MUJER = {2001: "#70AD47", 2010: "#7030A0", 2022: "#ED7D31"}
+ESTILOS_LINEA = {2001: "-", 2010: "-.", 2022: "--"}
+
+COLORES_AREA = {"Rural": "#C00000", "Urbano": "#4472C4"}
+ESTILOS_AREA = {"Rural": "--", "Urbano": "-"}
+
+# Filas agregadas de parroquiasEdades.xlsx que no son parroquias del mapa.
+ALIAS_SECTOR = {"GUAYABAMBA": "NORORIENTE", "QUITO": "CENTRO"}
+
+FORMATOS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def normalizar_texto(texto):
+    if pd.isna(texto):
+        return ""
+    texto = str(texto).strip().lower()
+    texto = "".join(
+        c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn"
+    )
+    return re.sub(r"\s+", " ", texto)
+
+
+def normalizar_codigo(valor):
+    if pd.isna(valor):
+        return ""
+    s = str(valor).strip()
+    if s.endswith(".0"):
+        s = s[:-2]
+    return s
+
+
+def normalizar_etapa(etapa):
+    # Algunas etapas de edad traen texto adicional en el Excel.
+    if "Niñas/os" in etapa:
+        return "Niñas/os (0 a 11 años)"
+    elif "Adolescentes" in etapa:
+        return "Adolescentes (12 a 17 años)"
+    elif "Jóvenes" in etapa:
+        return "Jóvenes (18 a 29 años)"
+    elif "Adultas/os mayores" in etapa:
+        return "Adultas/os mayores (65 años o más)"
+    elif "Adultas/os" in etapa:
+        return "Adultas/os (30 a 64 años)"
+    return etapa
+
+
+def cargar_edades():
+    df = pd.read_excel(EXCEL_EDADES)
+    df["Etapa Edad"] = df["Etapa Edad"].apply(normalizar_etapa)
+    return df
+
+
+def calcular_porcentajes(df_area):
+    # Porcentaje de poblacion por anio, genero y etapa (sobre el total del anio).
+    result = {}
+    for anio in ANIOS:
+        df_anio = df_area[df_area["Año"] == anio]
+        total = df_anio["pob_tT"].sum()
+        result[anio] = {}
+        for genero in ["Hombre", "Mujer"]:
+            df_genero = df_anio[df_anio["Genero"] == genero]
+            porcentajes = []
+            for etapa in ORDEN_ETAPAS:
+                pob = df_genero[df_genero["Etapa Edad"] == etapa]["pob_tT"].values
+                porcentajes.append((pob[0] / total) * 100 if len(pob) > 0 else 0)
+            result[anio][genero] = porcentajes
+    return result
+
+
+def lookups_sector(scope="todas"):
+    # Importado aqui para que los procesos de graficos solo carguen geopandas
+    # cuando de verdad necesitan el sector del mapa.
+    from routes.main import cargar_parroquias, clasificar_sectorial, normalizar_nombre
+
+    gdf = clasificar_sectorial(cargar_parroquias(scope=scope))
+    lookup_codigo = {
+        str(codigo).strip(): sector
+        for codigo, sector in zip(gdf["codigo"], gdf["sector"])
+        if str(codigo).strip()
+    }
+    lookup_nombre = {
+        normalizar_nombre(nombre): sector
+        for nombre, sector in zip(gdf["nombre"], gdf["sector"])
+    }
+    return lookup_codigo, lookup_nombre
+
+
+def cargar_edad_por_sector(scope="todas", lookups=None):
+    from routes.main import normalizar_nombre
+
+    lookup_codigo, lookup_nombre = lookups or lookups_sector(scope)
+
+    df = pd.read_excel(EXCEL_DESGLOSE)
+    df.columns = df.columns.str.strip()
+
+    mapa_cols = {normalizar_texto(c): c for c in df.columns}
+    col_parroquia = mapa_cols.get("parroquia")
+    col_codigo = next((c for c in df.columns if "codigo" in normalizar_texto(c)), None)
+    if col_parroquia is None or col_codigo is None:
+        raise ValueError(
+            "No se encontraron columnas parroquia/codigo en parroquiasDesglose.xlsx"
+        )
+
+    columnas_edad = []
+    for c in CATEGORIAS_EDAD:
+        clave = normalizar_texto(c)
+        if clave not in mapa_cols:
+            raise ValueError(f"Falta columna de edad: {c}")
+        columnas_edad.append(mapa_cols[clave])
+
+    df[columnas_edad] = (
+        df[columnas_edad].apply(pd.to_numeric, errors="coerce").fillna(0)
+    )
+
+    df["sector_mapa"] = df[col_codigo].apply(normalizar_codigo).map(lookup_codigo)
+    sin_sector = df["sector_mapa"].isna()
+    df.loc[sin_sector, "sector_mapa"] = (
+        df.loc[sin_sector, col_parroquia]
+        .apply(lambda x: normalizar_nombre(str(x)))
+        .map(lookup_nombre)
+    )
+    df = df[df["sector_mapa"].notna()]
+
+    sector_edad = df.groupby("sector_mapa")[columnas_edad].sum()
+    sector_edad.columns = CATEGORIAS_EDAD
+    return sector_edad.div(sector_edad.sum(axis=1), axis=0)
+
+
+def _encontrar_header(df, columnas):
+    for i in range(min(20, len(df))):
+        fila = [str(x).strip() for x in df.iloc[i].tolist()]
+        if all(c in fila for c in columnas):
+            return i
+    return None
+
+
+def cargar_evolucion_por_sector(scope="todas", lookups=None):
+    # Poblacion por grupo de edad y anio censal (parroquiasEdades.xlsx),
+    # agregada por el sector que asigna el mapa.
+    from routes.main import normalizar_nombre
+
+    _, lookup_nombre = lookups or lookups_sector(scope)
+
+    header_idx = _encontrar_header(
+        pd.read_excel(EXCEL_EDADES_PARROQUIA, header=None), ["SECTOR", "Grupo Edad"]
+    )
+    if header_idx is None:
+        raise ValueError("No se encontro header en parroquiasEdades.xlsx")
+
+    df = pd.read_excel(EXCEL_EDADES_PARROQUIA, header=header_idx)
+    df.columns = df.columns.astype(str).str.strip()
+
+    orden_grupos = list(reversed(df["Grupo Edad"].dropna().drop_duplicates().tolist()))
+    df["Grupo Edad"] = pd.Categorical(df["Grupo Edad"], categories=orden_grupos, ordered=True)
+    anios = [c for c in df.columns if c.isdigit() and len(c) == 4]
+
+    df["sector_mapa"] = df["Parroquia"].apply(lambda x: normalizar_nombre(str(x)))
+    df["sector_mapa"] = df["sector_mapa"].map(lookup_nombre).fillna(
+        df["sector_mapa"].map(ALIAS_SECTOR)
+    )
+    df = df[df["sector_mapa"].notna()]
+
+    return df.groupby(["sector_mapa", "Grupo Edad"], observed=False)[anios].sum()
+
+
+def _eje_piramide(ax, ncol):
+    ax.axvline(x=0, color="gray", linewidth=1)
+
+    ax.set_yticks(np.arange(len(ORDEN_ETAPAS)))
+    ax.set_yticklabels(ORDEN_ETAPAS)
+
+    max_val = 30  # Fijo para mejor visualizacion
+    ticks = list(range(-max_val, max_val + 1, 5))
+    ax.set_xlim(-max_val, max_val)
+    ax.set_xticks(ticks)
+    ax.set_xticklabels([f"{abs(t):.1f}%" for t in ticks])
+
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    ax.legend(
+        loc="upper center", bbox_to_anchor=(0.5, 1.08), ncol=ncol, frameon=False, fontsize=10
+    )
+
+
+def _linea_suave(ax, valores, color, estilo, etiqueta):
+    y_pos = np.arange(len(ORDEN_ETAPAS))
+    y_smooth = np.linspace(y_pos.min(), y_pos.max(), 100)
+    spline = make_interp_spline(y_pos, valores, k=2)
+    ax.plot(
+        spline(y_smooth), y_smooth, color=color, linestyle=estilo, linewidth=2.5, label=etiqueta
+    )
+
+
+def figura_piramide(df, area=None, anio=None):
+    fig = Figure(figsize=(12, 8), facecolor="white")
+    ax = fig.add_subplot()
+
+    if area is not None:
+        # Una sola area: una linea por anio (o solo el anio pedido).
+        datos = calcular_porcentajes(df[df["Area"] == area])
+        anios = [anio] if anio is not None else ANIOS
+        for a in anios:
+            _linea_suave(
+                ax, [-p for p in datos[a]["Hombre"]], COLORES_HOMBRE[a], ESTILOS_LINEA[a], f"H-{a}"
+            )
+            _linea_suave(ax, datos[a]["Mujer"], COLORES_MUJER[a], ESTILOS_LINEA[a], f"M-{a}")
+        titulo = f"Pirámide Poblacional - Área {area}"
+        if anio is not None:
+            titulo += f" - Año {anio}"
+        _eje_piramide(ax, ncol=2 * len(anios))
+    else:
+        # Un anio: Rural vs Urbano.
+        for a in AREAS:
+            datos = calcular_porcentajes(df[df["Area"] == a])
+            _linea_suave(
+                ax, [-p for p in datos[anio]["Hombre"]], COLORES_AREA[a], ESTILOS_AREA[a], f"H-{a}"
+            )
+            _linea_suave(ax, datos[anio]["Mujer"], COLORES_AREA[a], ESTILOS_AREA[a], f"M-{a}")
+        titulo = f"Pirámide Poblacional - Año {anio}"
+        _eje_piramide(ax, ncol=4)
+
+    ax.set_title(titulo, fontsize=14, fontweight="bold", pad=50)
+    fig.tight_layout()
+    return fig
+
+
+def figura_sectores(sector_edad_pct, base, otro):
+    fig = Figure(figsize=(7, 7), facecolor="white")
+    ax = fig.add_subplot()
+
+    posiciones = list(range(len(CATEGORIAS_EDAD)))
+    base_vals = sector_edad_pct.loc[base, CATEGORIAS_EDAD].values
+    otro_vals = sector_edad_pct.loc[otro, CATEGORIAS_EDAD].values
+
+    ax.plot(base_vals, posiciones, label=base)
+    ax.plot(otro_vals, posiciones, label=otro, color="#808080")
+    ax.fill_betweenx(
+        posiciones,
+        base_vals,
+        otro_vals,
+        where=(base_vals > otro_vals),
+        interpolate=True,
+        color="#9fd3eb",
+        alpha=0.6,
+    )
+
+    ax.set_yticks(posiciones)
+    ax.set_yticklabels(CATEGORIAS_EDAD)
+    ax.xaxis.set_major_formatter(mtick.PercentFormatter(1.0))
+    ax.set_xlabel("% de la poblacion")
+    ax.set_ylabel("Grupos de edad")
+    ax.set_title(f"Piramide poblacional {base} vs {otro} - 2022")
+    ax.spines["left"].set_color("black")
+    ax.spines["left"].set_linewidth(1.0)
+    ax.spines["right"].set_visible(False)
+    ax.spines["top"].set_visible(False)
+    ax.spines["bottom"].set_visible(False)
+    ax.grid(axis="x", linestyle="--", alpha=0.4)
+    ax.legend(title="Sector")
+
+    fig.tight_layout()
+    return fig
+
+
+def figura_a_bytes(fig, formato="png", dpi=100):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=formato, dpi=dpi)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Render en procesos: matplotlib no es seguro entre hilos, asi que cada figura se
+# dibuja en un proceso del pool y el hilo de Flask solo espera bytes.
+# ---------------------------------------------------------------------------
+
+# Datos ya leidos dentro de cada proceso del pool: nombre -> (version, datos).
+# Solo se guarda la ultima version de cada uno, asi la memoria del worker no
+# crece con cada cambio de datos.
+_datos_proceso = {}
+
+
+def _datos_en_proceso(nombre, version, cargar):
+    guardado = _datos_proceso.get(nombre)
+    if guardado is None or guardado[0] != version:
+        _datos_proceso[nombre] = guardado = (version, cargar())
+    return guardado[1]
+
+
+def renderizar_grafico(tipo, params, formato, version):
+    if tipo == "piramide":
+        df = _datos_en_proceso("edades", version, cargar_edades)
+        fig = figura_piramide(df, area=params.get("area"), anio=params.get("anio"))
+    elif tipo == "sectores":
+        tabla = _datos_en_proceso("edad_sector", version, cargar_edad_por_sector)
+        fig = figura_sectores(tabla, params["base"], params["otro"])
+    else:
+        raise ValueError(f"Tipo de grafico desconocido: {tipo}")
+
+    return figura_a_bytes(fig, formato=formato)
+
+
+GRAFICOS_WORKERS = int(os.environ.get("GRAFICOS_WORKERS", "2"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+cache_graficos = CacheMemoria(max_items=128)
+
+
+def obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" evita heredar hilos y locks de Flask en el proceso hijo.
+            _pool = ProcessPoolExecutor(
+                max_workers=GRAFICOS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    # Si un worker muere (p. ej. por memoria) el pool queda roto para siempre:
+    # se descarta y el proximo envio crea uno nuevo. Solo si sigue siendo el
+    # actual, para no tirar uno ya reemplazado por otro hilo.
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def enviar_al_pool(funcion, *args):
+    # submit al pool compartido (graficos y servicios.render). Un pool roto se
+    # reemplaza y se reintenta una vez.
+    pool = obtener_pool()
+    try:
+        futuro = pool.submit(funcion, *args)
+    except BrokenProcessPool:
+        _descartar_pool(pool)
+        pool = obtener_pool()
+        futuro = pool.submit(funcion, *args)
+
+    def al_terminar(f):
+        if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+            _descartar_pool(pool)
+
+    futuro.add_done_callback(al_terminar)
+    return futuro
+
+
+def _clave_grafico(tipo, params, formato):
+    return (tipo, tuple(sorted(params.items())), formato, version_datos())
+
+
+def solicitar_grafico(tipo, params, formato="png"):
+    # Devuelve un Future con los bytes del grafico. El Future mismo se cachea por
+    # parametros y version de datos, asi pedidos simultaneos comparten el render.
+    clave = _clave_grafico(tipo, params, formato)
+    version = clave[-1]
+
+    def enviar():
+        futuro = enviar_al_pool(renderizar_grafico, tipo, params, formato, version)
+        futuro.add_done_callback(
+            lambda f: cache_graficos.descartar(clave) if f.cancelled() or f.exception() else None
+        )
+        return futuro
+
+    return cache_graficos.obtener_o_calcular(clave, enviar)
+
+
+def descartar_grafico(tipo, params, formato="png"):
+    # Saca el Future de la cache (p. ej. tras un timeout), asi el proximo pedido
+    # vuelve a enviar el render en vez de esperar al mismo.
+    cache_graficos.descartar(_clave_grafico(tipo, params, formato))
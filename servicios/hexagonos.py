@@ -0,0 +1,167 @@
+import numpy as np
+import shapely
+
+from servicios.interpolacion import EXTENSIVA, INTENSIVA, interpolar, pares_interseccion
+
+
+# Radio (centro a vertice, en metros del area_crs) de cada nivel de la piramide,
+# del mas grueso al mas fino.
+TAMANOS_M = (4000, 2000, 1000, 500, 250)
+
+RAIZ3 = np.sqrt(3.0)
+
+
+def params_piramide(tamanos=TAMANOS_M):
+    # Params normalizados de la tarea "hexagonos" (la misma clave de cache para
+    # /api/hexagonos, /api/jobs y el precalculo).
+    return {"tamanos": sorted({float(t) for t in tamanos}, reverse=True)}
+
+
+def precalcular(dataset=None):
+    # Encola la piramide completa en el pool de servicios.trabajos al arrancar:
+    # tarda varios segundos y asi el primer pedido ya la encuentra en la cache
+    # (en memoria y en disco, compartida con los demas workers). No bloquea.
+    from servicios.trabajos import enviar
+
+    return enviar("hexagonos", params_piramide(), dataset=dataset)
+
+
+def centros_hexagonos(q, r, tamano):
+    # Hexagonos "pointy-top" en coordenadas axiales (q, r).
+    return tamano * RAIZ3 * (q + r / 2.0), tamano * 1.5 * r
+
+
+def grilla_hexagonal(limites, tamano):
+    # Ids axiales (q, r) de todos los hexagonos cuyo centro cae en `limites`
+    # (xmin, ymin, xmax, ymax) agrandados un radio.
+    xmin, ymin, xmax, ymax = limites
+    rmin = int(np.floor((ymin - tamano) / (1.5 * tamano)))
+    rmax = int(np.ceil((ymax + tamano) / (1.5 * tamano)))
+    ancho = tamano * RAIZ3
+    qmin = int(np.floor((xmin - tamano) / ancho - rmax / 2.0))
+    qmax = int(np.ceil((xmax + tamano) / ancho - rmin / 2.0))
+
+    q, r = np.meshgrid(np.arange(qmin, qmax + 1), np.arange(rmin, rmax + 1))
+    q, r = q.ravel(), r.ravel()
+    x, y = centros_hexagonos(q, r, tamano)
+    dentro = (x >= xmin - tamano) & (x <= xmax + tamano) & (y >= ymin - tamano) & (y <= ymax + tamano)
+    return q[dentro].astype(np.int32), r[dentro].astype(np.int32)
+
+
+def poligonos_hexagonos(q, r, tamano):
+    x, y = centros_hexagonos(q, r, tamano)
+    angulos = np.radians(30 + 60 * np.arange(7))  # el 7mo cierra el anillo
+    vertices = np.stack(
+        [x[:, None] + tamano * np.cos(angulos), y[:, None] + tamano * np.sin(angulos)], axis=2
+    )
+    return shapely.polygons(vertices)
+
+
+def transformacion_afin(limites, area_crs, muestras=21):
+    # Ajuste afin (x, y) del area_crs -> (lon, lat) sobre el area de estudio,
+    # para que el cliente arme los hexagonos solo con (q, r). Devuelve la matriz
+    # 2x3 y el error maximo (metros) en los puntos de muestra.
+    from pyproj import Transformer
+
+    xmin, ymin, xmax, ymax = limites
+    x, y = np.meshgrid(np.linspace(xmin, xmax, muestras), np.linspace(ymin, ymax, muestras))
+    x, y = x.ravel(), y.ravel()
+    lon, lat = Transformer.from_crs(area_crs, "EPSG:4326", always_xy=True).transform(x, y)
+
+    diseno = np.column_stack([x, y, np.ones_like(x)])
+    coeficientes, *_ = np.linalg.lstsq(diseno, np.column_stack([lon, lat]), rcond=None)
+    ajuste = diseno @ coeficientes
+
+    inversa = Transformer.from_crs("EPSG:4326", area_crs, always_xy=True)
+    xa, ya = inversa.transform(ajuste[:, 0], ajuste[:, 1])
+    error = float(np.hypot(xa - x, ya - y).max())
+    return coeficientes.T.round(12).tolist(), error
+
+
+def nivel_hexagonal(parroquias, valores, tamano):
+    # Un nivel de la piramide: hexagonos que tocan alguna parroquia, con la
+    # poblacion repartida por area, la densidad sobre el area cubierta y la tasa
+    # promedio ponderada por area.
+    from servicios.clasificacion import cortes_cuantiles
+
+    origen = parroquias.geometry.values
+    q, r = grilla_hexagonal(parroquias.total_bounds, tamano)
+    hexagonos = poligonos_hexagonos(q, r, tamano)
+
+    i_hex, i_parroquia, area = pares_interseccion(origen, hexagonos, parroquias.sindex)
+    usados, i_hex = np.unique(i_hex, return_inverse=True)
+
+    tipos = {"poblacion": EXTENSIVA, "tasa": INTENSIVA}
+    resultado = interpolar(valores, tipos, i_hex, i_parroquia, area, shapely.area(origen), len(usados))
+    cubierta_km2 = np.bincount(i_hex, weights=area, minlength=len(usados)) / 1e6
+    densidad = np.divide(
+        resultado["poblacion"], cubierta_km2, out=np.full(len(usados), np.nan), where=cubierta_km2 > 0
+    )
+
+    def lista(arreglo, decimales):
+        arreglo = np.asarray(arreglo, dtype=np.float32)
+        return [None if not np.isfinite(v) else round(float(v), decimales) for v in arreglo]
+
+    return {
+        "tamano": tamano,
+        "q": q[usados].tolist(),
+        "r": r[usados].tolist(),
+        "poblacion": lista(resultado["poblacion"], 0),
+        "densidad": lista(densidad, 1),
+        "tasa": lista(resultado["tasa"], 2),
+        "cortes": {
+            "densidad": [round(c, 1) for c in cortes_cuantiles(densidad[:, None])],
+            "tasa": [round(c, 2) for c in cortes_cuantiles(resultado["tasa"][:, None])],
+        },
+    }
+
+
+def piramide_hexagonal(params, progreso=lambda *_: None):
+    # Tarea de servicios.trabajos: todos los niveles de una vez (la cache de
+    # `calcular` los guarda por dataset y version de datos).
+    from routes.main import cargar_parroquias, dataset_actual
+    from servicios.interpolacion import valores_parroquias
+    from servicios.proyeccion import parroquias_sin_dato
+
+    tamanos = sorted((float(t) for t in params.get("tamanos", TAMANOS_M)), reverse=True)
+    area_crs = dataset_actual().area_crs
+
+    gdf = cargar_parroquias(scope="todas")
+    valores = valores_parroquias(gdf, ["poblacion", "tasa"], None)
+    parroquias = gdf.to_crs(area_crs)
+
+    niveles = []
+    for i, tamano in enumerate(tamanos):
+        niveles.append(nivel_hexagonal(parroquias, valores, tamano))
+        progreso((i + 1) / len(tamanos), f"hexagonos de {tamano:g} m")
+
+    afin, error = transformacion_afin(parroquias.total_bounds, area_crs)
+    return {
+        "afin": afin,
+        "error_afin_m": round(error, 3),
+        "niveles": niveles,
+        "parroquias_sin_poblacion": parroquias_sin_dato(gdf, valores["poblacion"]),
+    }
+
+
+def main():
+    import argparse
+
+    from servicios.trabajos import calcular
+
+    parser = argparse.ArgumentParser(description="Resumen de la piramide de hexagonos.")
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS_M))
+    args = parser.parse_args()
+
+    tamanos = [float(t) for t in args.tamanos.split(",")]
+    resultado = calcular("hexagonos", {"tamanos": tamanos})
+    print(f"error de la transformacion afin: {resultado['error_afin_m']} m")
+    if resultado["parroquias_sin_poblacion"]:
+        print(f"parroquias sin poblacion: {', '.join(resultado['parroquias_sin_poblacion'])}")
+    for nivel in resultado["niveles"]:
+        poblacion = sum(v for v in nivel["poblacion"] if v is not None)
+        print(f"{nivel['tamano']:>7g} m {len(nivel['q']):>8} hexagonos {poblacion:>14,.0f} hab")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+
+MAX_ZONAS = 20_000
+
+# Grupos de edad de parroquiasDesglose.xlsx (columnas del censo que se suman).
+GRUPOS_EDAD = {
+    "edad_0_14": ["De 0 a 4 años", "De 5 a 9 años", "De 10 a 14 años"],
+    "edad_15_24": ["De 15 a 19 años", "De 20 a 24 años"],
+    "edad_25_64": [
+        "De 25 a 29 años",
+        "De 30 a 34 años",
+        "De 35 a 39 años",
+        "De 40 a 44 años",
+        "De 45 a 49 años",
+        "De 50 a 54 años",
+        "De 55 a 59 años",
+        "De 60 a 64 años",
+    ],
+    "edad_65_mas": [
+        "De 65 a 69 años",
+        "De 70 a 74 años",
+        "De 75 a 79 años",
+        "De 80 a 84 años",
+        "De 85 o mas",
+    ],
+}
+
+# Extensivas (conteos: se reparten por fraccion de area de la parroquia) e
+# intensivas (tasas: promedio ponderado por el area de cada pedazo).
+EXTENSIVA = "extensiva"
+INTENSIVA = "intensiva"
+
+VARIABLES = {
+    "poblacion": EXTENSIVA,
+    "poblacion_pct": EXTENSIVA,
+    "proyeccion": EXTENSIVA,
+    "tasa": INTENSIVA,
+    **{grupo: EXTENSIVA for grupo in GRUPOS_EDAD},
+}
+
+
+def valores_parroquias(gdf, variables, anio):
+    # Una columna por variable, alineada con las filas de `gdf` (NaN = sin dato).
+    from routes.main import cargar_fuentes, metrica_poblacion, metrica_tasa
+    from servicios.proyeccion import poblacion_base_parroquias, proyeccion_parroquias
+
+    columnas = {}
+    if "poblacion" in variables:
+        columnas["poblacion"] = poblacion_base_parroquias(gdf)
+    if "poblacion_pct" in variables:
+        columnas["poblacion_pct"] = metrica_poblacion(gdf)["valores"]
+    if "proyeccion" in variables:
+        columnas["proyeccion"] = proyeccion_parroquias(gdf, anio, anio)[1][:, 0]
+    if "tasa" in variables:
+        columnas["tasa"] = metrica_tasa(gdf)["valores"]
+
+    grupos = [g for g in GRUPOS_EDAD if g in variables]
+    if grupos:
+        df = cargar_fuentes("desglose")["desglose"].dropna(subset=["Código_Parroq"])
+        codigos = df["Código_Parroq"].astype(int).astype(str)
+        for grupo in grupos:
+            conteo = df[GRUPOS_EDAD[grupo]].apply(pd.to_numeric, errors="coerce").fillna(0).sum(axis=1)
+            por_codigo = dict(zip(codigos, conteo))
+            columnas[grupo] = gdf["codigo"].astype(str).map(lambda c: por_codigo.get(c, np.nan))
+
+    return pd.DataFrame(columnas, index=gdf.index).astype(float)
+
+
+def pares_interseccion(origen, destino, indice=None):
+    # (i_destino, i_origen, area comun) de los pares que se tocan. Los candidatos
+    # salen del STRtree del origen; cuando la zona contiene entera a la
+    # parroquia el area es la de la parroquia y no hace falta intersectar.
+    indice = indice if indice is not None else shapely.STRtree(origen)
+    i_destino, i_origen = indice.query(destino, predicate="intersects")
+
+    area = shapely.area(origen[i_origen])
+    parcial = ~shapely.contains_properly(destino[i_destino], origen[i_origen])
+    area[parcial] = shapely.area(
+        shapely.intersection(destino[i_destino[parcial]], origen[i_origen[parcial]])
+    )
+    return i_destino, i_origen, area
+
+
+def interpolar(valores, tipos, i_destino, i_origen, area, area_origen, n_destino):
+    # Extensivas: sum_j v_j * a_ij / A_j. Intensivas: sum_j v_j * a_ij / sum_j a_ij
+    # sobre las parroquias con dato. Zonas sin ninguna parroquia con dato: NaN.
+    salida = {}
+    fraccion = area / area_origen[i_origen]
+    for variable, tipo in tipos.items():
+        v = valores[variable].to_numpy()[i_origen]
+        con_dato = np.isfinite(v)
+        peso = (fraccion if tipo == EXTENSIVA else area)[con_dato]
+
+        suma = np.bincount(i_destino[con_dato], weights=peso * v[con_dato], minlength=n_destino)
+        if tipo == EXTENSIVA:
+            hay = np.bincount(i_destino[con_dato], minlength=n_destino) > 0
+            salida[variable] = np.where(hay, suma, np.nan)
+        else:
+            total = np.bincount(i_destino[con_dato], weights=peso, minlength=n_destino)
+            salida[variable] = np.divide(suma, total, out=np.full(n_destino, np.nan), where=total > 0)
+    return salida
+
+
+def interpolacion(params, progreso=lambda *_: None):
+    # Tarea de servicios.trabajos: variables de las parroquias redistribuidas
+    # sobre las zonas de `params["zonas"]` (FeatureCollection en EPSG:4326).
+    from routes.main import cargar_parroquias, dataset_actual
+    from servicios.proyeccion import ANIO_BASE, parroquias_sin_dato
+
+    variables = params.get("variables") or list(VARIABLES)
+    anio = int(params.get("anio", ANIO_BASE))
+    area_crs = dataset_actual().area_crs
+
+    gdf = cargar_parroquias(scope="todas")
+    valores = valores_parroquias(gdf, variables, anio)
+    parroquias = gdf.to_crs(area_crs)
+    origen = parroquias.geometry.values
+    area_origen = shapely.area(origen)
+
+    zonas = gpd.GeoDataFrame.from_features(params["zonas"]["features"], crs="EPSG:4326")
+    destino = shapely.make_valid(zonas.to_crs(area_crs).geometry.values)
+    progreso(0.2, "datos cargados")
+
+    i_destino, i_origen, area = pares_interseccion(origen, destino, parroquias.sindex)
+    progreso(0.8, f"{len(i_destino)} pares")
+
+    tipos = {v: VARIABLES[v] for v in variables}
+    resultado = interpolar(valores, tipos, i_destino, i_origen, area, area_origen, len(destino))
+    cubierta = np.bincount(i_destino, weights=area, minlength=len(destino))
+    area_destino = shapely.area(destino)
+
+    def redondear(arreglo, decimales):
+        return [None if not np.isfinite(v) else round(float(v), decimales) for v in arreglo]
+
+    return {
+        "variables": tipos,
+        "anio": anio,
+        "valores": {
+            v: redondear(resultado[v], 4 if tipos[v] == INTENSIVA or v == "poblacion_pct" else 1)
+            for v in variables
+        },
+        "area_km2": redondear(area_destino / 1e6, 4),
+        "cobertura": redondear(
+            np.divide(cubierta, area_destino, out=np.zeros(len(destino)), where=area_destino > 0), 4
+        ),
+        "pares": int(len(i_destino)),
+        # Las extensivas suman sin estas parroquias (sin dato o con un agregado).
+        "parroquias_sin_dato": {
+            v: parroquias_sin_dato(gdf, valores[v]) for v in variables if tipos[v] == EXTENSIVA
+        },
+    }
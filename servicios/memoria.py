@@ -0,0 +1,141 @@
+import pickle
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import shapely
+
+
+# Capas medidas por el reporte: nombre -> funcion que la arma (sin argumentos).
+def _capas():
+    from routes.main import cargar_parroquias, clasificar_sectorial
+    from servicios.clusters import features_parroquias
+
+    return {
+        "parroquias_todas": lambda: cargar_parroquias(scope="todas"),
+        "parroquias_urbanas": lambda: cargar_parroquias(scope="urbanas"),
+        "parroquias_rurales": lambda: cargar_parroquias(scope="rurales"),
+        "sectorial": lambda: clasificar_sectorial(cargar_parroquias(scope="todas")),
+        "features": lambda: features_parroquias(cargar_parroquias(scope="todas"))[0],
+    }
+
+
+def medir(funcion):
+    # Resultado de `funcion()` y los bytes que asigno segun tracemalloc: los que
+    # siguen vivos al terminar (el resultado) y el pico durante la llamada.
+    # GEOS reserva con su propio malloc: las geometrias no aparecen aca.
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        resultado = funcion()
+        actual, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, {"retenido": actual - base, "pico": pico - base}
+
+
+def _bytes_reconstruida(serie):
+    datos = pickle.dumps(serie, protocol=pickle.HIGHEST_PROTOCOL)
+    copia, medida = medir(lambda: pickle.loads(datos))
+    del copia
+    return medida["retenido"]
+
+
+def bytes_columna(serie):
+    # Una columna reconstruida desde pickle: crea de nuevo los arreglos y los
+    # objetos (strings incluidos), asi tracemalloc los cuenta todos. Se resta
+    # la misma columna vacia (Series, indice, dtype) para quedarse con los datos.
+    return max(_bytes_reconstruida(serie) - _bytes_reconstruida(serie.iloc[:0]), 0)
+
+
+def reporte_columnas(gdf):
+    # Por columna: dtype, bytes por tracemalloc y por pandas (memory_usage
+    # deep). La geometria se estima ademas por coordenadas (16 bytes c/u).
+    geometria = getattr(gdf, "_geometry_column_name", None)
+    pandas_bytes = gdf.memory_usage(deep=True, index=False)
+    filas = []
+    for columna in gdf.columns:
+        fila = {
+            "columna": columna,
+            "dtype": str(gdf[columna].dtype),
+            "tracemalloc": bytes_columna(gdf[columna]),
+            "pandas": int(pandas_bytes[columna]),
+        }
+        if columna == geometria:
+            fila["pandas"] = int(shapely.get_num_coordinates(gdf[columna].values).sum()) * 16
+        filas.append(fila)
+    return filas
+
+
+def sin_compactar(gdf):
+    # La misma capa con los tipos de antes (object y float64), para comparar.
+    gdf = gdf.copy()
+    for columna in gdf.columns:
+        dtype = gdf[columna].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            gdf[columna] = gdf[columna].astype(object)
+        elif dtype == np.float32:
+            gdf[columna] = gdf[columna].astype(np.float64)
+    return gdf
+
+
+def reporte(capas=None):
+    # {capa: {"filas", "construccion", "columnas", "total", "sin_compactar"}}.
+    funciones = _capas()
+    salida = {}
+    for nombre in capas or list(funciones):
+        funciones[nombre]()  # calienta las fuentes cacheadas: se mide solo la capa
+        gdf, construccion = medir(funciones[nombre])
+        columnas = reporte_columnas(gdf)
+        previas = reporte_columnas(sin_compactar(gdf))
+        salida[nombre] = {
+            "filas": len(gdf),
+            "construccion": construccion,
+            "columnas": columnas,
+            "total": {
+                "tracemalloc": sum(c["tracemalloc"] for c in columnas),
+                "pandas": sum(c["pandas"] for c in columnas),
+            },
+            "sin_compactar": {
+                "tracemalloc": sum(c["tracemalloc"] for c in previas),
+                "pandas": sum(c["pandas"] for c in previas),
+            },
+        }
+    return salida
+
+
+def _kb(n):
+    return f"{n / 1024:,.1f}"
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Memoria por columna y total de las capas de datos.")
+    parser.add_argument("--capas", default=None, help="separadas por coma (por defecto todas)")
+    parser.add_argument("--json", action="store_true", help="imprime el reporte como JSON")
+    args = parser.parse_args()
+
+    datos = reporte(args.capas.split(",") if args.capas else None)
+    if args.json:
+        print(json.dumps(datos, indent=2))
+        return
+
+    for nombre, capa in datos.items():
+        construccion = capa["construccion"]
+        print(
+            f"{nombre} ({capa['filas']} filas) construccion: retenido {_kb(construccion['retenido'])} KB, "
+            f"pico {_kb(construccion['pico'])} KB"
+        )
+        print(f"  {'columna':<14}{'dtype':<12}{'tracemalloc KB':>16}{'pandas KB':>12}")
+        for c in capa["columnas"]:
+            print(f"  {c['columna']:<14}{c['dtype']:<12}{_kb(c['tracemalloc']):>16}{_kb(c['pandas']):>12}")
+        total, previo = capa["total"], capa["sin_compactar"]
+        print(f"  {'total':<26}{_kb(total['tracemalloc']):>16}{_kb(total['pandas']):>12}")
+        print(f"  {'sin compactar':<26}{_kb(previo['tracemalloc']):>16}{_kb(previo['pandas']):>12}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
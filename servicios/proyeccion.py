@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+COLUMNA_TASA = "Tasa de crecimiento anual poblacion"
+
+ANIO_BASE = 2022  # Censo 2022: anio de la columna Total de poblacionParroquias.xlsx
+
+
+# Etiquetas de filas de totales (no de parroquias) en la columna Parroquia.
+ETIQUETAS_AGREGADO = ("TOTAL", "SUBTOTAL", "TOTAL CANTON", "TOTAL PROVINCIA")
+
+
+def tabla_poblacion_base():
+    # Excel de poblacion con la clave de union de cada fila: (canton, nombre
+    # normalizado), con el canton como prefijo DPA segun dataset.codigos_canton
+    # ("" si el dataset no los define). Quedan en NaN, con su porcentaje, las
+    # filas que no son el dato de una parroquia, segun su etiqueta:
+    # - filas de totales (ETIQUETAS_AGREGADO, o el nombre del canton o de la
+    #   provincia en la columna Parroquia);
+    # - las de dataset.cantones_sin_desglose, cuyo Excel repite un agregado
+    #   (p. ej. el total provincial) en cada parroquia;
+    # - las claves repetidas, que no se sabe a que parroquia corresponden.
+    from routes.main import cargar_fuentes, dataset_actual, normalizar_nombre
+
+    ds = dataset_actual()
+    df = cargar_fuentes("poblacion")["poblacion"]
+    parroquia = df["Parroquia"].map(normalizar_nombre)
+    vacia = pd.Series("", index=df.index)
+    nombre_canton = df["Cantón"].map(normalizar_nombre) if "Cantón" in df.columns else vacia
+    nombre_provincia = df["Provincia"].map(normalizar_nombre) if "Provincia" in df.columns else vacia
+    if ds.codigos_canton:
+        canton = nombre_canton.map(ds.codigos_canton)
+    else:
+        canton = vacia
+    nombre = parroquia.replace(ds.alias_parroquias)
+    total = pd.to_numeric(df["Total"], errors="coerce")
+
+    agregado = (
+        parroquia.isin(ETIQUETAS_AGREGADO)
+        | (parroquia == "")
+        | (parroquia == nombre_canton)
+        | (parroquia == nombre_provincia)
+    )
+    sin_desglose = pd.Series(False, index=df.index)
+    if ds.cantones_sin_desglose:
+        sin_desglose = nombre_canton.isin([normalizar_nombre(c) for c in ds.cantones_sin_desglose])
+    ambiguo = pd.DataFrame({"canton": canton, "nombre": nombre}).duplicated(keep=False)
+    invalido = agregado | sin_desglose | ambiguo
+    return pd.DataFrame(
+        {
+            "canton": canton,
+            "nombre": nombre,
+            "total": total.mask(invalido),
+            "porcentaje": df["Porcentaje"].mask(invalido),
+        }
+    )
+
+
+def claves_parroquias(gdf):
+    # (canton, nombre normalizado) de cada fila de `gdf`, como en tabla_poblacion_base.
+    from routes.main import dataset_actual, normalizar_nombre
+
+    if dataset_actual().codigos_canton:
+        canton = gdf["codigo"].astype(str).str[:4]
+    else:
+        canton = [""] * len(gdf)
+    return list(zip(canton, gdf["nombre"].map(normalizar_nombre)))
+
+
+def cargar_poblacion_base():
+    # {(canton, nombre normalizado): Total}, sin agregados ni claves ambiguas.
+    tabla = tabla_poblacion_base().dropna(subset=["canton", "total"])
+    return dict(zip(zip(tabla["canton"], tabla["nombre"]), tabla["total"].astype(float)))
+
+
+def poblacion_base_parroquias(gdf):
+    # Poblacion del censo alineada con las filas de `gdf` (NaN = sin dato).
+    base = cargar_poblacion_base()
+    return np.array([base.get(clave, np.nan) for clave in claves_parroquias(gdf)], dtype=float)
+
+
+def parroquias_sin_dato(gdf, valores):
+    # Nombres de las parroquias con NaN en `valores`: se informan en cada
+    # resultado que suma poblacion, para que el faltante no pase por un cero.
+    return gdf.loc[~np.isfinite(np.asarray(valores, dtype=float)), "nombre"].astype(str).tolist()
+
+
+def cargar_tasas():
+    from routes.main import cargar_fuentes
+
+    df = cargar_fuentes("crecimiento")["crecimiento"]
+    return dict(zip(df["Cod_Parr"].astype(str), df[COLUMNA_TASA].astype(float)))
+
+
+def proyectar(poblacion_base, tasas, anios, anio_base=ANIO_BASE):
+    # P(t) = P0 * (1 + r) ** (t - t0), para todas las parroquias (filas) y todos los
+    # anios (columnas) en una sola operacion con broadcasting.
+    poblacion_base = np.asarray(poblacion_base, dtype=float)[:, None]
+    tasas = np.asarray(tasas, dtype=float)[:, None]
+    pasos = (np.asarray(anios, dtype=float) - anio_base)[None, :]
+    return poblacion_base * np.power(1.0 + tasas, pasos)
+
+
+def proyeccion_parroquias(gdf, desde, hasta, anio_base=ANIO_BASE):
+    # Alinea poblacion base (por canton y nombre) y tasa (por codigo) con las filas
+    # de `gdf`. Las parroquias sin alguno de los dos datos quedan con NaN en toda la fila.
+    tasas = cargar_tasas()
+
+    base = poblacion_base_parroquias(gdf)
+    tasa = gdf["codigo"].astype(str).map(lambda c: tasas.get(c, np.nan))
+
+    anios = np.arange(desde, hasta + 1)
+    return anios, proyectar(base, tasa.to_numpy(), anios, anio_base)
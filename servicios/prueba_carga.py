@@ -0,0 +1,318 @@
+import argparse
+import html
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+RAIZ_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Ruta -> peso relativo en la mezcla de pedidos.
+MEZCLA = {
+    "/": 3,
+    "/urbanas": 3,
+    "/poblacion": 2,
+    "/sectores?scope=todas": 1,
+    "/sectores?scope=urbanas": 1,
+    "/sectores?scope=rurales": 1,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_gunicorn(puerto, workers, threads, timeout=120):
+    # gunicorn como subproceso, con el repo como directorio de trabajo.
+    comando = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--workers",
+        str(workers),
+        "--threads",
+        str(threads),
+        "--bind",
+        f"127.0.0.1:{puerto}",
+        "--timeout",
+        str(timeout),
+        "--log-level",
+        "warning",
+        "app:app",
+    ]
+    return subprocess.Popen(comando, cwd=RAIZ_DIR)
+
+
+def esperar_servidor(url, proceso, limite=60):
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn termino con codigo {proceso.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(0.5)
+    raise RuntimeError(f"gunicorn no respondio en {limite}s")
+
+
+def rss_proceso(pid):
+    # RSS en bytes desde /proc (Linux); None si no se puede leer.
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def hijos(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="utf-8") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+class MonitorMemoria:
+    # Muestrea el RSS del master y de cada worker de gunicorn cada `intervalo` s.
+
+    def __init__(self, pid_master, intervalo=1.0):
+        self.pid_master = pid_master
+        self.intervalo = intervalo
+        self.muestras = {}
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._correr, name="monitor-rss", daemon=True)
+
+    def _correr(self):
+        while not self._parar.is_set():
+            for pid in [self.pid_master] + hijos(self.pid_master):
+                rss = rss_proceso(pid)
+                if rss is not None:
+                    self.muestras.setdefault(pid, []).append(rss)
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *_):
+        self._parar.set()
+        self._hilo.join()
+
+    def resumen(self):
+        return {
+            str(pid): {
+                "rol": "master" if pid == self.pid_master else "worker",
+                "rss_max_mb": round(max(valores) / 2**20, 1),
+                "rss_final_mb": round(valores[-1] / 2**20, 1),
+            }
+            for pid, valores in self.muestras.items()
+        }
+
+
+def pedir(base, ruta, programado, timeout):
+    # La latencia se mide desde el instante programado y no desde el envio: si el
+    # generador se atrasa porque el servidor esta saturado, esa espera cuenta
+    # (evita la "omision coordinada").
+    try:
+        with urllib.request.urlopen(base + ruta, timeout=timeout) as respuesta:
+            respuesta.read()
+            estado = respuesta.status
+    except urllib.error.HTTPError as e:
+        estado = e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        estado = None
+    return ruta, estado, time.monotonic() - programado
+
+
+def generar_carga(base, mezcla, tasa, duracion, concurrencia, timeout, seed=0):
+    # Carga de lazo abierto: pedidos a `tasa` por segundo durante `duracion` s,
+    # con rutas sorteadas segun los pesos de `mezcla`.
+    rng = random.Random(seed)
+    rutas = list(mezcla)
+    pesos = [mezcla[r] for r in rutas]
+    total = int(tasa * duracion)
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="carga") as pool:
+        futuros = []
+        for i in range(total):
+            programado = inicio + i / tasa
+            espera = programado - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            ruta = rng.choices(rutas, weights=pesos)[0]
+            futuros.append(pool.submit(pedir, base, ruta, programado, timeout))
+        resultados = [f.result() for f in futuros]
+    return resultados, time.monotonic() - inicio
+
+
+def estadisticas(resultados, duracion):
+    latencias = np.array([r[2] for r in resultados]) * 1000
+    errores = sum(1 for r in resultados if r[1] is None or r[1] >= 400)
+    salida = {
+        "pedidos": len(resultados),
+        "errores": errores,
+        "tasa_error": round(errores / len(resultados), 4) if resultados else None,
+        "rps": round(len(resultados) / duracion, 2) if duracion > 0 else None,
+    }
+    if len(latencias):
+        salida.update(
+            {f"p{p}_ms": round(float(np.percentile(latencias, p)), 1) for p in PERCENTILES}
+        )
+        salida["media_ms"] = round(float(latencias.mean()), 1)
+        salida["max_ms"] = round(float(latencias.max()), 1)
+    return salida
+
+
+def informe(resultados, duracion, config, memoria):
+    por_ruta = {}
+    for r in resultados:
+        por_ruta.setdefault(r[0], []).append(r)
+    return {
+        "config": config,
+        "duracion_s": round(duracion, 2),
+        "total": estadisticas(resultados, duracion),
+        "por_ruta": {ruta: estadisticas(rs, duracion) for ruta, rs in sorted(por_ruta.items())},
+        "memoria": memoria,
+    }
+
+
+def informe_html(datos):
+    columnas = ["pedidos", "errores", "tasa_error", "rps"] + [f"p{p}_ms" for p in PERCENTILES] + ["media_ms", "max_ms"]
+
+    def fila(nombre, stats):
+        celdas = "".join(f"<td>{stats.get(c, '')}</td>" for c in columnas)
+        return f"<tr><th>{html.escape(nombre)}</th>{celdas}</tr>"
+
+    filas = [fila("TOTAL", datos["total"])] + [fila(r, s) for r, s in datos["por_ruta"].items()]
+    memoria = "".join(
+        f"<tr><th>{pid}</th><td>{m['rol']}</td><td>{m['rss_max_mb']}</td><td>{m['rss_final_mb']}</td></tr>"
+        for pid, m in datos["memoria"].items()
+    )
+    config = ", ".join(f"{k}={html.escape(str(v))}" for k, v in datos["config"].items() if k != "mezcla")
+
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+  <meta charset="utf-8" />
+  <title>Prueba de carga</title>
+  <style>
+    body {{ font-family: sans-serif; margin: 2rem; }}
+    table {{ border-collapse: collapse; margin-bottom: 1.5rem; }}
+    th, td {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}
+    thead th {{ background: #0057B8; color: white; }}
+    tbody th {{ text-align: left; }}
+  </style>
+</head>
+<body>
+  <h2>Prueba de carga</h2>
+  <p>{config} | duracion real {datos['duracion_s']} s</p>
+  <h3>Latencia y throughput</h3>
+  <table>
+    <thead><tr><th>ruta</th>{''.join(f'<th>{c}</th>' for c in columnas)}</tr></thead>
+    <tbody>{''.join(filas)}</tbody>
+  </table>
+  <h3>Memoria (RSS, MB)</h3>
+  <table>
+    <thead><tr><th>pid</th><th>rol</th><th>max</th><th>final</th></tr></thead>
+    <tbody>{memoria}</tbody>
+  </table>
+</body>
+</html>
+"""
+
+
+def leer_mezcla(texto):
+    # "/=3,/urbanas=1,/sectores?scope=todas=2" (el peso va despues del ultimo "=").
+    mezcla = {}
+    for parte in texto.split(","):
+        ruta, peso = parte.rsplit("=", 1)
+        mezcla[ruta.strip()] = float(peso)
+    return mezcla
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prueba de carga: levanta la app con gunicorn y mide latencias."
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--tasa", type=float, default=10.0, help="pedidos por segundo")
+    parser.add_argument("--duracion", type=float, default=30.0, help="segundos")
+    parser.add_argument("--concurrencia", type=int, default=64, help="pedidos en vuelo maximos")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--mezcla", type=leer_mezcla, default=MEZCLA)
+    parser.add_argument("--sin-calentar", action="store_true", help="medir tambien el arranque en frio")
+    parser.add_argument("--salida", default="reportes")
+    args = parser.parse_args()
+
+    puerto = puerto_libre()
+    base = f"http://127.0.0.1:{puerto}"
+    proceso = iniciar_gunicorn(puerto, args.workers, args.threads, timeout=int(args.timeout))
+    try:
+        esperar_servidor(base + "/api/cache", proceso)
+        if not args.sin_calentar:
+            # Una pasada por ruta y worker para medir en caliente (el kernel reparte
+            # las conexiones, asi que algun worker puede quedar en frio).
+            for ruta in args.mezcla:
+                for _ in range(args.workers):
+                    pedir(base, ruta, time.monotonic(), args.timeout)
+
+        with MonitorMemoria(proceso.pid) as monitor:
+            resultados, duracion = generar_carga(
+                base, args.mezcla, args.tasa, args.duracion, args.concurrencia, args.timeout
+            )
+        config = {
+            "workers": args.workers,
+            "threads": args.threads,
+            "tasa_objetivo": args.tasa,
+            "duracion_objetivo_s": args.duracion,
+            "concurrencia": args.concurrencia,
+            "calentado": not args.sin_calentar,
+            "mezcla": args.mezcla,
+        }
+        datos = informe(resultados, duracion, config, monitor.resumen())
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(timeout=30)
+
+    os.makedirs(args.salida, exist_ok=True)
+    nombre = f"carga_w{args.workers}_t{args.threads}_{time.strftime('%Y%m%d_%H%M%S')}"
+    ruta_json = os.path.join(args.salida, nombre + ".json")
+    ruta_html = os.path.join(args.salida, nombre + ".html")
+    with open(ruta_json, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    with open(ruta_html, "w", encoding="utf-8") as f:
+        f.write(informe_html(datos))
+
+    total = datos["total"]
+    print(
+        f"{total['pedidos']} pedidos, {total['rps']} rps, errores {total['tasa_error']:.2%}, "
+        + ", ".join(f"p{p} {total.get(f'p{p}_ms')} ms" for p in PERCENTILES)
+    )
+    for pid, m in datos["memoria"].items():
+        print(f"  {m['rol']:<7} {pid:>8} RSS max {m['rss_max_mb']} MB")
+    print(f"Informe: {ruta_json} / {ruta_html}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import numpy as np
+import shapely
+
+
+BLOQUE_PUNTOS = 50_000
+
+
+def ubicar_puntos(params, progreso):
+    # Tarea de servicios.trabajos: parroquia (codigo, nombre) que contiene cada
+    # punto [lat, lon], consultando el indice espacial por bloques. Los puntos
+    # fuera de todas las parroquias quedan en None.
+    from routes.main import cargar_parroquias
+
+    gdf = cargar_parroquias(scope=params.get("scope", "todas"))
+    puntos = np.asarray(params.get("puntos") or [], dtype=float).reshape(-1, 2)
+
+    codigos = gdf["codigo"].astype(str).to_numpy()
+    nombres = gdf["nombre"].astype(str).to_numpy()
+    indice = np.full(len(puntos), -1)
+
+    for inicio in range(0, len(puntos), BLOQUE_PUNTOS):
+        bloque = puntos[inicio : inicio + BLOQUE_PUNTOS]
+        geometrias = shapely.points(bloque[:, 1], bloque[:, 0])
+        # intersects (no within): un punto justo en el borde tambien cuenta.
+        i_punto, i_parroquia = gdf.sindex.query(geometrias, predicate="intersects")
+
+        # Si un punto cae en el borde de dos parroquias, gana la primera.
+        i_punto, primero = np.unique(i_punto, return_index=True)
+        indice[inicio + i_punto] = i_parroquia[primero]
+        progreso(min(1.0, (inicio + len(bloque)) / len(puntos)), f"{inicio + len(bloque)} puntos")
+
+    encontrado = indice >= 0
+    return {
+        "codigo": [c if ok else None for c, ok in zip(codigos[indice], encontrado)],
+        "nombre": [n if ok else None for n, ok in zip(nombres[indice], encontrado)],
+        "sin_parroquia": int((~encontrado).sum()),
+    }
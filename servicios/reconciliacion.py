@@ -0,0 +1,213 @@
+import argparse
+import csv
+import os
+from collections import Counter
+
+import pandas as pd
+
+
+ESTADO_COINCIDE = "COINCIDE"
+ESTADO_CAMBIO = "CAMBIO_SECTOR"
+ESTADO_FALTANTE = "NO_EXISTE_EN_MAPA"
+ESTADO_SOLO_MAPA = "SOLO_EN_MAPA"
+
+COLUMNAS_SALIDA = [
+    "Parroquia",
+    "clave",
+    "sector_hoja",
+    "sectores_mapa",
+    "estado",
+]
+
+CHUNK_FILAS = 50_000
+
+
+def referencia_mapa(scope="todas", gdf=None):
+    # Tabla hash clave canonica -> sectores del mapa en vivo. Una clave puede tener
+    # varios sectores (p. ej. RUMIPAMBA urbana y rural).
+    from routes.main import cargar_parroquias, clasificar_sectorial, normalizar_nombre
+
+    if gdf is None:
+        gdf = clasificar_sectorial(cargar_parroquias(scope=scope))
+
+    referencia = {}
+    for nombre, sector in zip(gdf["nombre"], gdf["sector"]):
+        referencia.setdefault(normalizar_nombre(nombre), set()).add(
+            normalizar_nombre(sector)
+        )
+    return referencia
+
+
+def leer_por_bloques(ruta, hoja=0, chunk=CHUNK_FILAS):
+    # Genera DataFrames de a `chunk` filas sin cargar la hoja completa.
+    extension = os.path.splitext(ruta)[1].lower()
+
+    if extension == ".csv":
+        yield from pd.read_csv(ruta, chunksize=chunk, dtype=str)
+        return
+
+    from openpyxl import load_workbook
+
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hoja_xl = libro.worksheets[hoja] if isinstance(hoja, int) else libro[hoja]
+        filas = hoja_xl.iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else "" for c in next(filas)]
+
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) >= chunk:
+                yield pd.DataFrame(bloque, columns=encabezado)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezado)
+    finally:
+        libro.close()
+
+
+def _normalizar_columna(serie):
+    # Normaliza solo los valores distintos: las hojas repiten mucho las parroquias.
+    from routes.main import normalizar_nombre
+
+    serie = serie.astype("string").fillna("")
+    mapa = {valor: normalizar_nombre(valor) for valor in serie.unique()}
+    return serie.map(mapa)
+
+
+def reconciliar_bloque(df, referencia, col_parroquia="Parroquia", col_sector="SECTOR"):
+    claves = _normalizar_columna(df[col_parroquia])
+    sectores_hoja = _normalizar_columna(df[col_sector])
+
+    pares_mapa = {f"{k}|{s}" for k, sectores in referencia.items() for s in sectores}
+    coincide = (claves + "|" + sectores_hoja).isin(pares_mapa)
+    existe = claves.isin(referencia.keys())
+
+    estado = pd.Series(ESTADO_FALTANTE, index=df.index)
+    estado[existe] = ESTADO_CAMBIO
+    estado[coincide] = ESTADO_COINCIDE
+
+    texto_mapa = {k: ", ".join(sorted(sectores)) for k, sectores in referencia.items()}
+
+    return pd.DataFrame(
+        {
+            "Parroquia": df[col_parroquia],
+            "clave": claves,
+            "sector_hoja": sectores_hoja,
+            "sectores_mapa": claves.map(texto_mapa).fillna(""),
+            "estado": estado,
+        }
+    )
+
+
+class EscritorCSV:
+    def __init__(self, ruta):
+        self._archivo = open(ruta, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._archivo)
+        self._writer.writerow(COLUMNAS_SALIDA)
+
+    def escribir(self, df):
+        self._writer.writerows(df[COLUMNAS_SALIDA].itertuples(index=False, name=None))
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorXLSX:
+    # Libro write_only de openpyxl: las filas se vuelcan a disco a medida que llegan.
+    def __init__(self, ruta):
+        from openpyxl import Workbook
+
+        self._ruta = ruta
+        self._libro = Workbook(write_only=True)
+        self._hoja = self._libro.create_sheet("Comparativa")
+        self._hoja.append(COLUMNAS_SALIDA)
+
+    def escribir(self, df):
+        for fila in df[COLUMNAS_SALIDA].itertuples(index=False, name=None):
+            self._hoja.append(list(fila))
+
+    def cerrar(self):
+        self._libro.save(self._ruta)
+
+
+def crear_escritor(ruta):
+    if ruta.lower().endswith(".xlsx"):
+        return EscritorXLSX(ruta)
+    return EscritorCSV(ruta)
+
+
+def reconciliar(
+    ruta_hoja,
+    salida,
+    hoja=0,
+    col_parroquia="Parroquia",
+    col_sector="SECTOR",
+    scope="todas",
+    chunk=CHUNK_FILAS,
+    referencia=None,
+):
+    referencia = referencia if referencia is not None else referencia_mapa(scope)
+    vistas = set()
+    resumen = Counter()
+
+    escritor = crear_escritor(salida)
+    try:
+        for df in leer_por_bloques(ruta_hoja, hoja=hoja, chunk=chunk):
+            resultado = reconciliar_bloque(df, referencia, col_parroquia, col_sector)
+            escritor.escribir(resultado)
+            resumen.update(resultado["estado"].value_counts().to_dict())
+            vistas.update(resultado["clave"].unique())
+
+        # Parroquias del mapa que la hoja no menciona.
+        faltantes = sorted(set(referencia) - vistas)
+        if faltantes:
+            escritor.escribir(
+                pd.DataFrame(
+                    {
+                        "Parroquia": faltantes,
+                        "clave": faltantes,
+                        "sector_hoja": "",
+                        "sectores_mapa": [", ".join(sorted(referencia[k])) for k in faltantes],
+                        "estado": ESTADO_SOLO_MAPA,
+                    }
+                )
+            )
+            resumen[ESTADO_SOLO_MAPA] += len(faltantes)
+    finally:
+        escritor.cerrar()
+
+    return dict(resumen)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara una hoja de asignacion de sectores contra el mapa."
+    )
+    parser.add_argument("hoja_externa", help="Archivo .xlsx o .csv con Parroquia/SECTOR")
+    parser.add_argument("salida", help="Archivo de salida .csv o .xlsx")
+    parser.add_argument("--hoja", default="0", help="Indice o nombre de la hoja Excel")
+    parser.add_argument("--col-parroquia", default="Parroquia")
+    parser.add_argument("--col-sector", default="SECTOR")
+    parser.add_argument("--scope", default="todas")
+    parser.add_argument("--chunk", type=int, default=CHUNK_FILAS)
+    args = parser.parse_args()
+
+    hoja = int(args.hoja) if args.hoja.isdigit() else args.hoja
+    resumen = reconciliar(
+        args.hoja_externa,
+        args.salida,
+        hoja=hoja,
+        col_parroquia=args.col_parroquia,
+        col_sector=args.col_sector,
+        scope=args.scope,
+        chunk=args.chunk,
+    )
+
+    for estado, total in sorted(resumen.items()):
+        print(f"{estado:<20} {total}")
+    print(f"Resultado: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
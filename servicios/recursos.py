@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import urllib.parse
+import urllib.request
+
+from folium.elements import JSCSSMixin
+
+try:
+    import brotli
+
+    HAY_BROTLI = True
+except ImportError:  # pragma: no cover - depende del entorno
+    HAY_BROTLI = False
+
+
+logger = logging.getLogger(__name__)
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VENDOR_DIR = os.path.join(BASE_DIR, "..", "static", "vendor")
+
+MANIFIESTO = "manifest.json"
+
+URL_PREFIJO = "/recursos"
+
+# Lo que layout.html pide a CDNs (Bootstrap 4 y jQuery slim para la navbar).
+RECURSOS_LAYOUT = {
+    "bootstrap_css": "https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css",
+    "jquery": "https://code.jquery.com/jquery-3.5.1.slim.min.js",
+    "bootstrap_js": "https://cdn.jsdelivr.net/npm/bootstrap@4.5.2/dist/js/bootstrap.bundle.min.js",
+}
+
+COMPRIMIBLES = {".js", ".css", ".svg", ".json", ".ttf", ".eot", ".otf", ".map"}
+
+_URL_CSS = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+def clases_folium():
+    # Todas las clases de folium (y plugins) que declaran default_js/default_css.
+    import folium.plugins  # noqa: F401 - registra las subclases de los plugins
+
+    pendientes = [JSCSSMixin]
+    clases = []
+    while pendientes:
+        clase = pendientes.pop()
+        for sub in clase.__subclasses__():
+            pendientes.append(sub)
+            if "default_js" in vars(sub) or "default_css" in vars(sub):
+                clases.append(sub)
+    return clases
+
+
+def urls_a_vendorizar():
+    urls = list(RECURSOS_LAYOUT.values())
+    for clase in clases_folium():
+        for _, url in list(vars(clase).get("default_js", [])) + list(
+            vars(clase).get("default_css", [])
+        ):
+            if url.startswith(("http://", "https://")):
+                urls.append(url)
+    return list(dict.fromkeys(urls))
+
+
+def descargar(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as respuesta:
+        return respuesta.read()
+
+
+def nombre_con_huella(url, contenido):
+    # jquery-3.5.1.slim.min.js -> jquery-3.5.1.slim.min.3f2a9c01de.js
+    base = posixpath.basename(urllib.parse.urlparse(url).path) or "recurso"
+    raiz, ext = posixpath.splitext(base)
+    huella = hashlib.sha256(contenido).hexdigest()[:10]
+    return f"{raiz}.{huella}{ext}"
+
+
+class _Vendorizador:
+
+    def __init__(self, salida, descargar=descargar):
+        self.salida = salida
+        self.descargar = descargar
+        self.manifiesto = {}
+
+    def escribir(self, nombre, contenido):
+        ruta = os.path.join(self.salida, nombre)
+        if not os.path.exists(ruta):
+            tmp = f"{ruta}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(contenido)
+            os.replace(tmp, ruta)
+
+        # Variantes precomprimidas para servirlas sin comprimir en cada request.
+        if os.path.splitext(nombre)[1] in COMPRIMIBLES:
+            with open(f"{ruta}.gz", "wb") as f:
+                f.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+            if HAY_BROTLI:
+                with open(f"{ruta}.br", "wb") as f:
+                    f.write(brotli.compress(contenido, quality=11))
+
+    def vendorizar(self, url):
+        if url in self.manifiesto:
+            return self.manifiesto[url]
+
+        contenido = self.descargar(url)
+        if urllib.parse.urlparse(url).path.endswith(".css"):
+            contenido = self._reescribir_css(url, contenido)
+
+        nombre = nombre_con_huella(url, contenido)
+        self.escribir(nombre, contenido)
+        self.manifiesto[url] = nombre
+        return nombre
+
+    def _reescribir_css(self, url, contenido):
+        # Fuentes e imagenes referenciadas con url(...) relativas: se vendorizan
+        # tambien y la referencia pasa al archivo local (mismo directorio).
+        texto = contenido.decode("utf-8")
+
+        def reemplazar(m):
+            referencia = m.group(2).strip()
+            if referencia.startswith(("data:", "#")):
+                return m.group(0)
+            absoluta = urllib.parse.urljoin(url, referencia)
+            partes = urllib.parse.urlparse(absoluta)
+            sufijo = ("?" + partes.query if partes.query else "") + (
+                "#" + partes.fragment if partes.fragment else ""
+            )
+            limpia = urllib.parse.urlunparse(partes._replace(query="", fragment=""))
+            try:
+                nombre = self.vendorizar(limpia)
+            except OSError as e:
+                logger.warning("No se pudo vendorizar %s (%s); queda remoto", limpia, e)
+                return f"url({absoluta})"
+            return f"url({nombre}{sufijo})"
+
+        return _URL_CSS.sub(reemplazar, texto).encode("utf-8")
+
+
+def construir(salida=VENDOR_DIR, urls=None, descargar=descargar):
+    # Descarga cada recurso (y lo que sus CSS referencian), lo guarda como
+    # nombre.<huella>.ext con variantes .gz/.br y escribe el manifiesto url -> archivo.
+    # Los archivos de builds anteriores que ya no estan en el manifiesto se borran.
+    os.makedirs(salida, exist_ok=True)
+    vendorizador = _Vendorizador(salida, descargar)
+
+    for url in urls or urls_a_vendorizar():
+        vendorizador.vendorizar(url)
+
+    vigentes = set(vendorizador.manifiesto.values())
+    for nombre in os.listdir(salida):
+        base = re.sub(r"\.(gz|br)$", "", nombre)
+        if base != MANIFIESTO and base not in vigentes:
+            os.remove(os.path.join(salida, nombre))
+
+    tmp = os.path.join(salida, f"{MANIFIESTO}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(vendorizador.manifiesto, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(salida, MANIFIESTO))
+
+    return vendorizador.manifiesto
+
+
+def cargar_manifiesto(directorio=VENDOR_DIR):
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_manifiesto = {}
+
+
+def url_recurso(url):
+    # URL local con huella si el recurso esta vendorizado; si no, la del CDN.
+    nombre = _manifiesto.get(url)
+    return f"{URL_PREFIJO}/{nombre}" if nombre else url
+
+
+def instalar(app, directorio=VENDOR_DIR):
+    # Expone `recurso(url)` a las plantillas y reescribe default_js/default_css
+    # de folium para que los mapas carguen las copias locales. Sin manifiesto
+    # (no se corrio `python -m servicios.recursos`) todo sigue saliendo del CDN.
+    _manifiesto.clear()
+    _manifiesto.update(cargar_manifiesto(directorio))
+    app.add_template_global(url_recurso, "recurso")
+
+    if not _manifiesto:
+        logger.info("Sin %s en %s: recursos desde CDN", MANIFIESTO, directorio)
+        return
+
+    for clase in clases_folium():
+        for atributo in ("default_js", "default_css"):
+            if atributo in vars(clase):
+                setattr(
+                    clase,
+                    atributo,
+                    [(nombre, url_recurso(url)) for nombre, url in vars(clase)[atributo]],
+                )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Descarga los recursos de CDN (layout y folium) a static/vendor con huella."
+    )
+    parser.add_argument("--salida", default=VENDOR_DIR)
+    args = parser.parse_args()
+
+    manifiesto = construir(args.salida)
+    for url, nombre in sorted(manifiesto.items(), key=lambda x: x[1]):
+        print(f"{nombre:<60} {url}")
+    if not HAY_BROTLI:
+        print("brotli no esta instalado: solo se generaron variantes .gz")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
+
+from servicios.datasets import obtener_o_construir
+
+
+CRITERIOS = ("queen", "rook")
+
+TOLERANCIA_M = 1.0  # metros: bordes que no coinciden exactamente entre archivos
+
+
+def grafo_adyacencia(gdf, criterio="queen", tolerancia=TOLERANCIA_M, area_crs="EPSG:32717"):
+    # Matriz CSR binaria y simetrica de vecinos. Los candidatos salen del indice
+    # espacial (no se compara cada par); queen = se tocan en al menos un punto,
+    # rook = comparten un tramo de borde de mas de 2 * tolerancia.
+    if criterio not in CRITERIOS:
+        raise ValueError(f"criterio debe ser uno de: {', '.join(CRITERIOS)}")
+
+    geometrias = gdf.to_crs(area_crs).geometry.values
+    indice = gpd.GeoSeries(geometrias).sindex
+    izq, der = indice.query(shapely.buffer(geometrias, tolerancia), predicate="intersects")
+    par = izq < der
+    izq, der = izq[par], der[par]
+
+    if criterio == "rook" and len(izq):
+        bordes = shapely.boundary(geometrias)
+        comun = shapely.intersection(bordes[izq], shapely.buffer(bordes[der], tolerancia))
+        largo = shapely.length(comun) > 2 * tolerancia
+        izq, der = izq[largo], der[largo]
+
+    n = len(geometrias)
+    A = sparse.coo_matrix((np.ones(len(izq)), (izq, der)), shape=(n, n))
+    return (A + A.T).tocsr()
+
+
+def adyacencia_parroquias(scope="todas", criterio="queen"):
+    # Grafo de `cargar_parroquias(scope)`, una vez por dataset y version de datos.
+    from routes.main import cargar_parroquias, dataset_actual
+
+    ds = dataset_actual()
+    return obtener_o_construir(
+        ds,
+        "adyacencia",
+        (scope, criterio),
+        lambda: grafo_adyacencia(cargar_parroquias(scope=scope), criterio, area_crs=ds.area_crs),
+    )
+
+
+def _ssd(conteo, suma, suma2):
+    # Suma de cuadrados intra-region a partir de agregados (conteo, sum x, sum x^2).
+    if conteo <= 0:
+        return 0.0
+    return float((suma2 - suma**2 / conteo).sum())
+
+
+def _mejor_corte(nodos, vecinos, X, peso, min_peso):
+    # Enraiza el arbol de la region, acumula agregados de cada subarbol en
+    # post-orden y evalua todos los cortes posibles en O(n).
+    raiz = nodos[0]
+    padre = {raiz: -1}
+    orden = [raiz]
+    for nodo in orden:
+        for v in vecinos[nodo]:
+            if v not in padre:
+                padre[v] = nodo
+                orden.append(v)
+
+    conteo = {v: 1 for v in orden}
+    suma = {v: X[v].copy() for v in orden}
+    suma2 = {v: X[v] ** 2 for v in orden}
+    pesos = {v: peso[v] for v in orden}
+    for v in reversed(orden[1:]):
+        p = padre[v]
+        conteo[p] += conteo[v]
+        suma[p] = suma[p] + suma[v]
+        suma2[p] = suma2[p] + suma2[v]
+        pesos[p] += pesos[v]
+
+    total = _ssd(conteo[raiz], suma[raiz], suma2[raiz])
+    mejor = None
+    for v in orden[1:]:
+        resto_peso = pesos[raiz] - pesos[v]
+        if pesos[v] < min_peso or resto_peso < min_peso:
+            continue
+        ganancia = total - _ssd(conteo[v], suma[v], suma2[v]) - _ssd(
+            conteo[raiz] - conteo[v], suma[raiz] - suma[v], suma2[raiz] - suma2[v]
+        )
+        if mejor is None or ganancia > mejor[0]:
+            mejor = (ganancia, padre[v], v)
+    return mejor
+
+
+def skater(X, A, k, peso=None, min_peso=0.0, progreso=lambda *_: None):
+    # SKATER: arbol de expansion minima sobre el grafo de contiguidad (costo =
+    # distancia entre atributos) y cortes sucesivos del arco que mas reduce la
+    # suma de cuadrados intra-region. Cada region resultante es contigua; con
+    # `min_peso` ninguna queda con menos de ese peso (p. ej. % de poblacion).
+    n = len(X)
+    peso = np.ones(n) if peso is None else np.asarray(peso, dtype=float)
+
+    i, j = sparse.triu(A, k=1).nonzero()
+    costo = np.linalg.norm(X[i] - X[j], axis=1) + 1e-9  # el MST descarta costos 0
+    arbol = minimum_spanning_tree(sparse.csr_matrix((costo, (i, j)), shape=(n, n))).tocoo()
+
+    vecinos = [set() for _ in range(n)]
+    for a, b in zip(arbol.row, arbol.col):
+        vecinos[a].add(b)
+        vecinos[b].add(a)
+
+    # Islas (componentes sin vecinos en comun) ya son regiones separadas.
+    n_regiones, etiquetas = connected_components(arbol, directed=False)
+    if k < n_regiones:
+        raise ValueError(f"k={k} es menor que el numero de componentes aisladas ({n_regiones})")
+
+    objetivo = k - n_regiones
+    while n_regiones < k:
+        candidatos = []
+        for r in range(n_regiones):
+            nodos = np.flatnonzero(etiquetas == r).tolist()
+            if len(nodos) > 1:
+                corte = _mejor_corte(nodos, vecinos, X, peso, min_peso)
+                if corte is not None:
+                    candidatos.append(corte)
+        if not candidatos:
+            raise ValueError(f"No se pueden formar {k} regiones con el peso minimo pedido")
+
+        _, a, b = max(candidatos)
+        vecinos[a].discard(b)
+        vecinos[b].discard(a)
+
+        # El lado de `b` pasa a ser una region nueva.
+        pendientes = [b]
+        visto = {b}
+        while pendientes:
+            v = pendientes.pop()
+            etiquetas[v] = n_regiones
+            for w in vecinos[v]:
+                if w not in visto:
+                    visto.add(w)
+                    pendientes.append(w)
+        n_regiones += 1
+        progreso(1 - (k - n_regiones) / max(objetivo, 1), f"{n_regiones} regiones")
+
+    return etiquetas
+
+
+def config_sectorial(gdf, etiquetas, prefijo="REGION"):
+    # Mismo formato que data/sectores.json: una entrada NOMBRE|TIPO:<tipo> por parroquia.
+    from routes.main import normalizar_nombre
+
+    por_parroquia = {
+        f"{normalizar_nombre(nombre)}|TIPO:{normalizar_nombre(tipo)}": f"{prefijo} {e + 1}"
+        for nombre, tipo, e in zip(gdf["nombre"], gdf["tipo"], etiquetas)
+    }
+    return {
+        "por_parroquia": por_parroquia,
+        "por_zona": {},
+        "lat_split": {"sur_max": -0.22, "norte_min": -0.15},
+        "default": "OTROS",
+    }
+
+
+def regionalizar(params, progreso=lambda *_: None):
+    # Tarea de servicios.trabajos: k regiones contiguas homogeneas en tasa de
+    # crecimiento y peso poblacional, cada una con al menos `min_poblacion` % de
+    # la poblacion. Devuelve la asignacion, un resumen y la config exportable.
+    from routes.main import cargar_parroquias
+    from servicios.clusters import features_parroquias
+
+    k = int(params.get("k", 7))
+    scope = params.get("scope", "todas")
+    criterio = params.get("criterio", "queen")
+    min_poblacion = float(params.get("min_poblacion", 0.0))
+    peso_tasa, peso_poblacion = params.get("pesos", [1.0, 1.0])
+
+    gdf, _ = features_parroquias(cargar_parroquias(scope=scope))
+    X = gdf[["tasa_pct", "pob_pct"]].to_numpy(dtype=float)
+    X = np.where(np.isnan(X), np.nanmean(X, axis=0), X)
+    desvio = X.std(axis=0)
+    X = (X - X.mean(axis=0)) / np.where(desvio > 0, desvio, 1.0)
+    X = X * np.array([peso_tasa, peso_poblacion], dtype=float)
+
+    A = adyacencia_parroquias(scope, criterio)
+    poblacion = gdf["pob_pct"].fillna(0.0).to_numpy()
+    etiquetas = skater(X, A, k, peso=poblacion, min_peso=min_poblacion, progreso=progreso)
+
+    regiones = []
+    for r in range(k):
+        filas = gdf[etiquetas == r]
+        regiones.append(
+            {
+                "region": f"REGION {r + 1}",
+                "parroquias": int(len(filas)),
+                "poblacion_pct": round(float(filas["pob_pct"].sum()), 2),
+                "tasa_media_pct": (
+                    None if filas["tasa_pct"].isna().all() else round(float(filas["tasa_pct"].mean()), 2)
+                ),
+            }
+        )
+
+    return {
+        "k": k,
+        "criterio": criterio,
+        "codigos": gdf["codigo"].astype(str).tolist(),
+        "nombres": gdf["nombre"].astype(str).tolist(),
+        "regiones_por_parroquia": (etiquetas + 1).tolist(),
+        "regiones": regiones,
+        "vecinos": int(A.nnz // 2),
+        "config": config_sectorial(gdf, etiquetas),
+    }
+
+
+def main():
+    import argparse
+
+    from servicios.trabajos import calcular
+
+    parser = argparse.ArgumentParser(
+        description="Regiones contiguas (SKATER) exportadas como config de sectores."
+    )
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--scope", default="todas")
+    parser.add_argument("--criterio", choices=CRITERIOS, default="queen")
+    parser.add_argument("--min-poblacion", type=float, default=0.0, help="% minimo por region")
+    parser.add_argument("--salida", default=None, help="p. ej. data/sectores_regiones.json")
+    args = parser.parse_args()
+
+    resultado = calcular(
+        "regionalizacion",
+        {
+            "k": args.k,
+            "scope": args.scope,
+            "criterio": args.criterio,
+            "min_poblacion": args.min_poblacion,
+        },
+    )
+
+    for region in resultado["regiones"]:
+        print(
+            f"{region['region']:<10} {region['parroquias']:>4} parroquias"
+            f" {region['poblacion_pct']:>7.2f}% pob  tasa {region['tasa_media_pct']}"
+        )
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado["config"], f, ensure_ascii=False, indent=2)
+        print(f"config escrita en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import shapely
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch, PathPatch
+from matplotlib.path import Path
+
+
+# Mapas estaticos (PNG) para los reportes: las mismas capas, clasificacion y
+# paletas que los mapas interactivos, dibujadas con matplotlib en el pool de
+# procesos de servicios.graficos.
+MAPAS = ("crecimiento", "poblacion", "sectores")
+
+SCOPES = ("todas", "urbanas", "rurales")
+
+DPI = 100
+ANCHO, ALTO = 1600, 1200
+MIN_PX, MAX_PX = 200, 4000
+
+SIN_DATOS = "#CCCCCC"
+
+RENDER_TIMEOUT = 120  # segundos de espera maxima por un render
+
+
+def capa_mapa(mapa, scope="todas", metodo=None):
+    # En el proceso de Flask: geometria (WKB), color de cada parroquia y leyenda.
+    # Solo esto viaja al proceso que dibuja.
+    from routes.main import cargar_parroquias, metrica_poblacion, metrica_sector, metrica_tasa
+
+    gdf = cargar_parroquias(scope=scope)
+    if mapa == "crecimiento":
+        metrica = metrica_tasa(gdf, metodo)
+    elif mapa == "poblacion":
+        metrica = metrica_poblacion(gdf, metodo)
+    elif mapa == "sectores":
+        metrica = metrica_sector(gdf)
+    else:
+        raise ValueError(f"Mapa desconocido: {mapa}")
+
+    return {
+        "titulo": metrica["titulo"],
+        "subtitulo": f"scope={scope}",
+        "wkb": shapely.to_wkb(gdf.geometry.values),
+        "colores": [SIN_DATOS if c is None else metrica["colores"][c] for c in metrica["clases"]],
+        "leyenda": list(zip(metrica["colores"], metrica["etiquetas"])),
+    }
+
+
+def _trazo(geometria):
+    # Path de matplotlib con todos los anillos (exteriores y huecos) del poligono.
+    partes = []
+    for poligono in shapely.get_parts(geometria):
+        if poligono.geom_type != "Polygon":
+            continue
+        for anillo in [poligono.exterior, *poligono.interiors]:
+            coords = np.asarray(anillo.coords)[:, :2]
+            codigos = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+            codigos[0], codigos[-1] = Path.MOVETO, Path.CLOSEPOLY
+            partes.append(Path(coords, codigos))
+    return Path.make_compound_path(*partes) if partes else None
+
+
+def dibujar_mapa(capa, ancho=ANCHO, alto=ALTO):
+    # En el proceso del pool: PNG de ancho x alto pixeles.
+    geometrias = shapely.from_wkb(capa["wkb"])
+    fig = Figure(figsize=(ancho / DPI, alto / DPI), dpi=DPI, facecolor="white")
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+
+    parches, colores = [], []
+    for geometria, color in zip(geometrias, capa["colores"]):
+        trazo = None if geometria is None else _trazo(geometria)
+        if trazo is not None:
+            parches.append(PathPatch(trazo))
+            colores.append(color)
+    ax.add_collection(
+        PatchCollection(parches, facecolors=colores, edgecolors="black", linewidths=0.4, alpha=0.85)
+    )
+
+    # lon/lat sin proyectar: el aspecto 1/cos(lat) conserva las proporciones
+    # cerca del centro, como se ve en el mapa web. Los limites se agrandan en
+    # un eje para que el area llene la imagen con ese aspecto.
+    xmin, ymin, xmax, ymax = shapely.total_bounds(geometrias)
+    aspecto = 1 / np.cos(np.radians((ymin + ymax) / 2))
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    dx, dy = (xmax - xmin) * 1.06, (ymax - ymin) * 1.06
+    dx, dy = max(dx, dy * aspecto * ancho / alto), max(dy, dx * alto / ancho / aspecto)
+    ax.set_xlim(cx - dx / 2, cx + dx / 2)
+    ax.set_ylim(cy - dy / 2, cy + dy / 2)
+    ax.set_aspect(aspecto)
+
+    ax.legend(
+        handles=[Patch(facecolor=c, edgecolor="black", label=e) for c, e in capa["leyenda"]],
+        title=capa["titulo"],
+        loc="lower right",
+        fontsize=9,
+        title_fontsize=10,
+        framealpha=0.95,
+    )
+    ax.text(
+        0.01, 0.99, capa["subtitulo"], transform=ax.transAxes, va="top", fontsize=9, color="#555"
+    )
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=DPI)
+    return buffer.getvalue()
+
+
+def mapa_png(mapa, scope="todas", ancho=ANCHO, alto=ALTO, metodo=None):
+    # Bytes del PNG, cacheados por dataset, parametros y version de datos. La
+    # capa se arma aca (desde las fuentes cacheadas) y se dibuja en el pool.
+    from routes.main import METODO_CLASIFICACION, dataset_actual
+    from servicios.datasets import obtener_o_construir
+    from servicios.graficos import enviar_al_pool
+
+    metodo = metodo or METODO_CLASIFICACION
+
+    def construir():
+        capa = capa_mapa(mapa, scope, metodo)
+        futuro = enviar_al_pool(dibujar_mapa, capa, ancho, alto)
+        return futuro.result(timeout=RENDER_TIMEOUT)
+
+    clave = (mapa, scope, ancho, alto, metodo)
+    return obtener_o_construir(dataset_actual(), "render", clave, construir)
+
+
+def lote_png(mapas=MAPAS, scopes=SCOPES, ancho=ANCHO, alto=ALTO, metodo=None):
+    # Todos los mapas x scopes a la vez: un hilo por pedido que solo espera al
+    # pool de procesos. Devuelve {"<mapa>_<scope>.png": bytes}.
+    from routes.main import dataset_actual, usar_dataset
+    from servicios.graficos import GRAFICOS_WORKERS
+
+    ds = dataset_actual()
+
+    def uno(mapa, scope):
+        with usar_dataset(ds):
+            return mapa_png(mapa, scope, ancho, alto, metodo)
+
+    pedidos = [(mapa, scope) for mapa in mapas for scope in scopes]
+    with ThreadPoolExecutor(max_workers=max(1, GRAFICOS_WORKERS * 2), thread_name_prefix="render") as hilos:
+        futuros = {f"{mapa}_{scope}.png": hilos.submit(uno, mapa, scope) for mapa, scope in pedidos}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+
+def main():
+    import argparse
+    import time
+
+    from routes.main import usar_dataset
+    from servicios.datasets import obtener_dataset
+
+    parser = argparse.ArgumentParser(description="Genera los PNG de los mapas para los reportes.")
+    parser.add_argument("--mapas", default=",".join(MAPAS))
+    parser.add_argument("--scopes", default=",".join(SCOPES))
+    parser.add_argument("--ancho", type=int, default=ANCHO)
+    parser.add_argument("--alto", type=int, default=ALTO)
+    parser.add_argument("--clasificacion", default=None, help="jenks, cuantiles o intervalos")
+    parser.add_argument("--dataset", default=None)
+    parser.add_argument("--salida", default=os.path.join("reportes", "mapas"))
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    with usar_dataset(obtener_dataset(args.dataset)):
+        imagenes = lote_png(
+            args.mapas.split(","), args.scopes.split(","), args.ancho, args.alto, args.clasificacion
+        )
+
+    os.makedirs(args.salida, exist_ok=True)
+    for nombre, contenido in imagenes.items():
+        with open(os.path.join(args.salida, nombre), "wb") as f:
+            f.write(contenido)
+    print(f"{len(imagenes)} mapas en {args.salida} ({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import gzip
+import json
+
+import numpy as np
+
+
+CUANTIZACION = 100_000  # 1e5 pasos por eje: ~0.5 m sobre la extension de Quito
+
+
+def _anillos(geometria):
+    # Anillos de cada poligono como arreglos (n, 2) sin el punto de cierre.
+    if geometria is None or geometria.is_empty:
+        return []
+    if geometria.geom_type == "Polygon":
+        poligonos = [geometria]
+    elif geometria.geom_type == "MultiPolygon":
+        poligonos = list(geometria.geoms)
+    else:
+        raise ValueError(f"Solo se codifican poligonos, no {geometria.geom_type}")
+
+    return [
+        [np.asarray(anillo.coords)[:-1, :2] for anillo in (p.exterior, *p.interiors)]
+        for p in poligonos
+    ]
+
+
+def _sin_repetidos(puntos):
+    # Tras cuantizar, vertices vecinos pueden caer en la misma celda.
+    if len(puntos) == 0:
+        return puntos
+    distinto = np.any(puntos != np.roll(puntos, 1, axis=0), axis=1)
+    distinto[0] = True
+    puntos = puntos[distinto]
+    while len(puntos) > 1 and np.array_equal(puntos[0], puntos[-1]):
+        puntos = puntos[:-1]
+    return puntos
+
+
+def _uniones(anillos, q):
+    # Un vertice es union si aparece con pares de vecinos distintos: ahi empieza o
+    # termina un borde compartido y hay que cortar el anillo en arcos.
+    if not anillos:
+        return np.empty(0, dtype=np.int64)
+
+    claves = []
+    pares = []
+    for puntos in anillos:
+        clave = puntos[:, 0] * q + puntos[:, 1]
+        previo = np.roll(clave, 1)
+        siguiente = np.roll(clave, -1)
+        claves.append(clave)
+        pares.append(np.column_stack([np.minimum(previo, siguiente), np.maximum(previo, siguiente)]))
+
+    filas = np.unique(np.column_stack([np.concatenate(claves), np.concatenate(pares)]), axis=0)
+    clave, conteo = np.unique(filas[:, 0], return_counts=True)
+    return clave[conteo > 1]
+
+
+class _Arcos:
+
+    def __init__(self):
+        self.arcos = []
+        self._indice = {}
+
+    def agregar(self, arco):
+        # Un arco ya visto (en cualquier sentido) se referencia, no se repite:
+        # ~i es el arco i recorrido al reves.
+        adelante = np.ascontiguousarray(arco).tobytes()
+        if adelante in self._indice:
+            return self._indice[adelante]
+        atras = np.ascontiguousarray(arco[::-1]).tobytes()
+        if atras in self._indice:
+            return ~self._indice[atras]
+
+        i = len(self.arcos)
+        self._indice[adelante] = i
+        self.arcos.append(arco)
+        return i
+
+
+def _rotar_al_minimo(puntos, q):
+    k = int(np.argmin(puntos[:, 0] * q + puntos[:, 1]))
+    puntos = np.roll(puntos, -k, axis=0)
+    return np.vstack([puntos, puntos[:1]])
+
+
+def _cortar_anillo(puntos, es_union, arcos, q):
+    cortes = np.flatnonzero(es_union)
+
+    if len(cortes) == 0:
+        # Anillo sin bordes compartidos: un solo arco cerrado, rotado a su vertice
+        # minimo para reconocerlo (en cualquier sentido) si otro poligono lo repite.
+        return [arcos.agregar(_rotar_al_minimo(puntos, q))]
+
+    n = len(puntos)
+    puntos = np.roll(puntos, -cortes[0], axis=0)
+    cerrado = np.vstack([puntos, puntos[:1]])
+    posiciones = np.append((cortes - cortes[0]) % n, n)
+
+    return [
+        arcos.agregar(cerrado[inicio : fin + 1])
+        for inicio, fin in zip(posiciones[:-1], posiciones[1:])
+    ]
+
+
+def codificar_topologia(gdf, propiedades=(), objeto="parroquias", q=CUANTIZACION):
+    # GeoDataFrame de poligonos (EPSG:4326) -> TopoJSON cuantizado: coordenadas
+    # enteras con `transform`, bordes compartidos guardados una sola vez y arcos
+    # codificados como diferencias entre vertices consecutivos.
+    x0, y0, x1, y1 = (float(v) for v in gdf.total_bounds)
+    kx = (x1 - x0) / (q - 1) if x1 > x0 else 1.0
+    ky = (y1 - y0) / (q - 1) if y1 > y0 else 1.0
+
+    def cuantizar(coords):
+        enteros = np.column_stack(
+            [np.round((coords[:, 0] - x0) / kx), np.round((coords[:, 1] - y0) / ky)]
+        ).astype(np.int64)
+        return _sin_repetidos(enteros)
+
+    poligonos_por_fila = []
+    for geometria in gdf.geometry:
+        poligonos = []
+        for anillos in _anillos(geometria):
+            anillos = [cuantizar(a) for a in anillos]
+            # Un exterior degenerado elimina el poligono; un hueco degenerado, solo el hueco.
+            if len(anillos[0]) < 3:
+                continue
+            poligonos.append([anillos[0]] + [a for a in anillos[1:] if len(a) >= 3])
+        poligonos_por_fila.append(poligonos)
+
+    todos = [a for poligonos in poligonos_por_fila for p in poligonos for a in p]
+    uniones = _uniones(todos, q)
+
+    arcos = _Arcos()
+    geometrias = []
+    for (_, fila), poligonos in zip(gdf.iterrows(), poligonos_por_fila):
+        if not poligonos:
+            continue
+
+        referencias = [
+            [
+                _cortar_anillo(a, np.isin(a[:, 0] * q + a[:, 1], uniones), arcos, q)
+                for a in p
+            ]
+            for p in poligonos
+        ]
+        geometria = (
+            {"type": "Polygon", "arcs": referencias[0]}
+            if len(referencias) == 1
+            else {"type": "MultiPolygon", "arcs": referencias}
+        )
+        geometria["properties"] = {
+            campo: (valor.item() if hasattr(valor, "item") else valor)
+            for campo, valor in ((c, fila[c]) for c in propiedades)
+        }
+        geometrias.append(geometria)
+
+    return {
+        "type": "Topology",
+        "bbox": [x0, y0, x1, y1],
+        "transform": {"scale": [kx, ky], "translate": [x0, y0]},
+        "objects": {objeto: {"type": "GeometryCollection", "geometries": geometrias}},
+        "arcs": [
+            np.vstack([arco[:1], np.diff(arco, axis=0)]).tolist() for arco in arcos.arcos
+        ],
+    }
+
+
+def copia_estilable(topologia):
+    # folium.TopoJson escribe properties.style en cada geometria al renderizar:
+    # copia solo esa parte para no ensuciar la topologia cacheada (los arcos se comparten).
+    objetos = {
+        nombre: {
+            **objeto,
+            "geometries": [
+                {**g, "properties": dict(g.get("properties", {}))} for g in objeto["geometries"]
+            ],
+        }
+        for nombre, objeto in topologia["objects"].items()
+    }
+    return {**topologia, "objects": objetos}
+
+
+def tamanos(objeto):
+    # Bytes del objeto tal como se incrusta en la pagina (json.dumps de folium/Jinja)
+    # y comprimido, que es lo que viaja si el servidor usa gzip.
+    texto = json.dumps(objeto).encode("utf-8")
+    return len(texto), len(gzip.compress(texto, compresslevel=6))
+
+
+def main():
+    import argparse
+
+    import pandas as pd
+
+    from routes.main import capa_indexada, cargar_fuentes, cargar_parroquias, obtener_nombre
+
+    parser = argparse.ArgumentParser(
+        description="Compara el tamano de la capa de parroquias como GeoJSON y como TopoJSON."
+    )
+    parser.add_argument("--q", type=int, default=CUANTIZACION, help="pasos de cuantizacion por eje")
+    args = parser.parse_args()
+
+    def concatenar(*nombres):
+        fuentes = cargar_fuentes(*nombres)
+        return pd.concat([fuentes[n] for n in nombres], ignore_index=True)
+
+    # Geometria que incrusta cada ruta (hoy como GeoJSON a doble precision).
+    rutas = {
+        "/": lambda: concatenar("rurales", "otras_rurales"),
+        "/urbanas": lambda: concatenar("urbanas", "otras_urbanas"),
+        "/poblacion": lambda: concatenar("rurales", "urbanas", "otras"),
+        "/sectores?scope=rurales": lambda: cargar_parroquias("rurales"),
+        "/sectores?scope=urbanas": lambda: cargar_parroquias("urbanas"),
+        "/sectores, /proyeccion, /comparar": lambda: cargar_parroquias("todas"),
+    }
+
+    print(
+        f"{'ruta':<36} {'geojson':>10} {'gz':>9} {'topojson':>10} {'gz':>9} {'arcos':>6} {'ahorro':>7}"
+    )
+    for ruta, cargar in rutas.items():
+        gdf = cargar()
+        gdf = gdf.assign(nombre=gdf.apply(obtener_nombre, axis=1))
+        capa = capa_indexada(gdf)
+
+        geojson, geojson_gz = tamanos(capa.__geo_interface__)
+        topologia = codificar_topologia(capa, propiedades=("idx", "nombre"), q=args.q)
+        topojson, topojson_gz = tamanos(topologia)
+
+        print(
+            f"{ruta:<36} {geojson:>10,} {geojson_gz:>9,} {topojson:>10,} {topojson_gz:>9,}"
+            f" {len(topologia['arcs']):>6} {1 - topojson / geojson:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from servicios.datasets import guardar_en_cache, obtener_de_cache, obtener_dataset, obtener_o_construir
+
+
+logger = logging.getLogger(__name__)
+
+
+TRABAJOS_WORKERS = int(os.environ.get("TRABAJOS_WORKERS", "2"))
+
+MAX_TRABAJOS = 500  # trabajos terminados que se recuerdan para /api/jobs/<id>
+
+MAX_PARAM_RESUMEN = 200  # caracteres de JSON de un param que se guardan en el trabajo
+
+# Tareas disponibles: nombre -> "modulo:funcion". La funcion recibe (params, progreso)
+# y devuelve algo serializable a JSON.
+TAREAS = {
+    "clusters": "servicios.clusters:barrido_clusters",
+    "puntos": "servicios.puntos:ubicar_puntos",
+    "regionalizacion": "servicios.regionalizacion:regionalizar",
+    "autocorrelacion": "servicios.autocorrelacion:autocorrelacion",
+    "captacion": "servicios.captacion:captacion",
+    "interpolacion": "servicios.interpolacion:interpolacion",
+    "hexagonos": "servicios.hexagonos:piramide_hexagonal",
+}
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+TERMINADO = "terminado"
+ERROR = "error"
+
+
+def resolver_tarea(tarea):
+    if tarea not in TAREAS:
+        raise KeyError(tarea)
+    modulo, funcion = TAREAS[tarea].split(":")
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+def clave_calculo(tarea, params):
+    # Misma clave para el trabajo en segundo plano y para la ruta sincronica (la
+    # version de datos va aparte, en la entrada de la cache).
+    huella = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+    return (tarea, huella)
+
+
+# --- Lado del worker -------------------------------------------------------
+
+_cola_progreso = None
+
+
+def _iniciar_worker(cola):
+    global _cola_progreso
+    _cola_progreso = cola
+
+
+def _ejecutar(id_trabajo, tarea, params, dataset):
+    from routes.main import usar_dataset
+
+    def progreso(fraccion, mensaje=""):
+        _cola_progreso.put((id_trabajo, float(fraccion), str(mensaje)))
+
+    _cola_progreso.put((id_trabajo, 0.0, EJECUTANDO))
+    with usar_dataset(obtener_dataset(dataset)):
+        return resolver_tarea(tarea)(params, progreso)
+
+
+# --- Lado del servidor -----------------------------------------------------
+
+_pool = None
+_cola = None
+_lock = threading.Lock()
+_trabajos = OrderedDict()
+_en_curso = {}  # clave de calculo -> id, para no lanzar dos veces lo mismo
+
+
+def _escuchar_progreso(cola):
+    while True:
+        id_trabajo, fraccion, mensaje = cola.get()
+        with _lock:
+            trabajo = _trabajos.get(id_trabajo)
+            if trabajo is None or trabajo["estado"] in (TERMINADO, ERROR):
+                continue
+            trabajo["estado"] = EJECUTANDO
+            trabajo["progreso"] = fraccion
+            if mensaje != EJECUTANDO:
+                trabajo["mensaje"] = mensaje
+
+
+def obtener_pool():
+    global _pool, _cola
+    with _lock:
+        if _pool is None:
+            # "spawn" evita heredar hilos y locks de Flask en el proceso hijo. El
+            # progreso vuelve por una cola que se entrega a cada worker al crearlo.
+            contexto = multiprocessing.get_context("spawn")
+            _cola = contexto.Queue()
+            _pool = ProcessPoolExecutor(
+                max_workers=TRABAJOS_WORKERS,
+                mp_context=contexto,
+                initializer=_iniciar_worker,
+                initargs=(_cola,),
+            )
+            threading.Thread(
+                target=_escuchar_progreso, args=(_cola,), name="trabajos-progreso", daemon=True
+            ).start()
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def resumen_params(params):
+    # Lo que el trabajo recuerda de sus params (y devuelve en cada consulta):
+    # los valores chicos tal cual y, de los grandes (puntos, zonas GeoJSON),
+    # solo cuantos elementos tienen. La huella identifica el pedido completo.
+    resumen = {"huella": clave_calculo("", params)[1]}
+    for nombre, valor in params.items():
+        if len(json.dumps(valor)) <= MAX_PARAM_RESUMEN:
+            resumen[nombre] = valor
+        elif isinstance(valor, dict) and isinstance(valor.get("features"), list):
+            resumen[nombre] = {"features": len(valor["features"])}
+        else:
+            resumen[nombre] = {"elementos": len(valor) if hasattr(valor, "__len__") else None}
+    return resumen
+
+
+def _nuevo_trabajo(tarea, params, dataset):
+    id_trabajo = uuid.uuid4().hex
+    trabajo = {
+        "id": id_trabajo,
+        "tarea": tarea,
+        "params": resumen_params(params),
+        "dataset": dataset,
+        "estado": PENDIENTE,
+        "progreso": 0.0,
+        "mensaje": "",
+        "resultado": None,
+        "error": None,
+        "creado": time.time(),
+        "terminado": None,
+    }
+    _trabajos[id_trabajo] = trabajo
+    while len(_trabajos) > MAX_TRABAJOS:
+        viejo = next(iter(_trabajos))
+        if _trabajos[viejo]["estado"] in (PENDIENTE, EJECUTANDO):
+            break
+        _trabajos.popitem(last=False)
+    return trabajo
+
+
+def _terminar(trabajo, resultado=None, error=None):
+    trabajo["estado"] = ERROR if error else TERMINADO
+    trabajo["progreso"] = 1.0 if not error else trabajo["progreso"]
+    trabajo["resultado"] = resultado
+    trabajo["error"] = error
+    trabajo["terminado"] = time.time()
+
+
+def enviar(tarea, params, dataset=None):
+    # Encola la tarea y devuelve el trabajo (dict) de inmediato. Si el resultado
+    # ya esta en la cache del dataset, el trabajo nace terminado; si el mismo
+    # calculo ya esta en curso, se devuelve ese trabajo.
+    resolver_tarea(tarea)
+    ds = obtener_dataset(dataset)
+    version = ds.version()
+    clave = clave_calculo(tarea, params)
+    cacheado = obtener_de_cache(ds, "calculos", clave)
+
+    with _lock:
+        if cacheado is not None:
+            trabajo = _nuevo_trabajo(tarea, params, ds.nombre)
+            _terminar(trabajo, resultado=cacheado)
+            return dict(trabajo)
+
+        en_curso = (ds.nombre, clave, version)
+        if en_curso in _en_curso and _en_curso[en_curso] in _trabajos:
+            return dict(_trabajos[_en_curso[en_curso]])
+
+        trabajo = _nuevo_trabajo(tarea, params, ds.nombre)
+        _en_curso[en_curso] = trabajo["id"]
+
+    try:
+        futuro = obtener_pool().submit(_ejecutar, trabajo["id"], tarea, params, ds.nombre)
+    except BrokenProcessPool as e:
+        # Un worker murio (p. ej. por memoria): el pool no se puede reusar, el
+        # proximo envio crea uno nuevo.
+        _descartar_pool()
+        with _lock:
+            _en_curso.pop(en_curso, None)
+            _terminar(trabajo, error=f"{type(e).__name__}: {e}")
+            return dict(trabajo)
+
+    def al_terminar(f):
+        error = f.exception()
+        if isinstance(error, BrokenProcessPool):
+            _descartar_pool()
+        if error is None:
+            guardar_en_cache(ds, "calculos", clave, f.result(), version)
+        else:
+            logger.error(
+                "trabajo %s (%s) fallo: %s",
+                trabajo["id"],
+                tarea,
+                "".join(traceback.format_exception(error)),
+            )
+        with _lock:
+            _en_curso.pop(en_curso, None)
+            if error is None:
+                _terminar(trabajo, resultado=f.result())
+            else:
+                _terminar(trabajo, error=f"{type(error).__name__}: {error}")
+
+    futuro.add_done_callback(al_terminar)
+    with _lock:
+        return dict(trabajo)
+
+
+def consultar(id_trabajo):
+    with _lock:
+        trabajo = _trabajos.get(id_trabajo)
+        return None if trabajo is None else dict(trabajo)
+
+
+def calcular(tarea, params, dataset=None):
+    # Version sincronica (en el hilo del request) que comparte la cache con
+    # `enviar`; requests simultaneos con los mismos params esperan un solo calculo.
+    ds = obtener_dataset(dataset)
+    return obtener_o_construir(
+        ds,
+        "calculos",
+        clave_calculo(tarea, params),
+        lambda: resolver_tarea(tarea)(params, lambda *_: None),
+    )
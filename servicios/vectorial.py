@@ -0,0 +1,171 @@
+import logging
+import os
+import tempfile
+import time
+
+import geopandas as gpd
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAY_ARROW = True
+except ImportError:  # pragma: no cover - depende del entorno
+    HAY_ARROW = False
+
+
+logger = logging.getLogger(__name__)
+
+
+MOTORES = ("arrow", "pyogrio", "fiona")
+
+MOTOR_VECTORIAL = os.environ.get("MOTOR_VECTORIAL", "arrow" if HAY_ARROW else "pyogrio")
+
+
+def resolver_motor(motor=None):
+    motor = (motor or MOTOR_VECTORIAL).lower()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor vectorial desconocido: {motor} ({', '.join(MOTORES)})")
+    if motor == "arrow" and not HAY_ARROW:
+        logger.warning("pyarrow no esta instalado; se usa pyogrio sin Arrow")
+        return "pyogrio"
+    return motor
+
+
+def leer_vector(ruta, columnas=None, where=None, bbox=None, motor=None):
+    # Lee un archivo vectorial empujando al lector la seleccion de columnas, el
+    # filtro de atributos (`where`, sintaxis SQL de OGR) y el bbox, para no
+    # materializar features ni columnas que luego se descartan.
+    motor = resolver_motor(motor)
+
+    if motor in ("arrow", "pyogrio"):
+        return gpd.read_file(
+            ruta,
+            engine="pyogrio",
+            use_arrow=motor == "arrow",
+            columns=columnas,
+            where=where,
+            bbox=bbox,
+        )
+
+    # fiona no soporta seleccionar columnas en todos los drivers (GeoJSON no):
+    # filtra where/bbox en el lector y recorta columnas despues.
+    gdf = gpd.read_file(ruta, engine="fiona", where=where, bbox=bbox)
+    if columnas is not None:
+        gdf = gdf[[c for c in columnas if c in gdf.columns] + [gdf.geometry.name]]
+    return gdf
+
+
+def _medir(funcion, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor, len(resultado)
+
+
+def escribir_sintetico(ruta, n, seed=0):
+    # Poligonos circulares de 20 vertices sobre Quito, con atributos similares
+    # a otras.geojson (nombre, ur_ru) y columnas de relleno.
+    import numpy as np
+    import shapely
+
+    rng = np.random.default_rng(seed)
+    centros = np.column_stack(
+        [rng.uniform(-78.7, -78.3, n), rng.uniform(-0.45, 0.05, n)]
+    )
+    angulos = np.linspace(0, 2 * np.pi, 20, endpoint=False)
+    radios = rng.uniform(0.001, 0.004, n)[:, None]
+    xs = centros[:, :1] + radios * np.cos(angulos)
+    ys = centros[:, 1:] + radios * np.sin(angulos)
+    anillos = np.stack([xs, ys], axis=-1)
+    anillos = np.concatenate([anillos, anillos[:, :1]], axis=1)
+
+    gdf = gpd.GeoDataFrame(
+        {
+            "nombre": [f"PARROQUIA {i % 500}" for i in range(n)],
+            "ur_ru": rng.choice(["RURAL", "URBANO"], n),
+            "relleno_a": rng.normal(size=n),
+            "relleno_b": rng.normal(size=n),
+            "relleno_c": [f"texto {i}" for i in range(n)],
+        },
+        geometry=shapely.polygons(anillos),
+        crs="EPSG:4326",
+    )
+    gdf.to_file(ruta, driver="GeoJSON", engine="pyogrio")
+    return ruta
+
+
+def comparar_motores(ruta, columnas, where, bbox, repeticiones=3):
+    filas = []
+    for motor in MOTORES:
+        if motor == "arrow" and not HAY_ARROW:
+            continue
+        completo, n_completo = _medir(lambda: leer_vector(ruta, motor=motor), repeticiones)
+        filtrado, n_filtrado = _medir(
+            lambda: leer_vector(ruta, columnas=columnas, where=where, bbox=bbox, motor=motor),
+            repeticiones,
+        )
+        filas.append((motor, completo, n_completo, filtrado, n_filtrado))
+    return filas
+
+
+def main():
+    import argparse
+
+    from routes.main import GJSON_OTRAS, GJSON_URBANA
+
+    parser = argparse.ArgumentParser(
+        description="Compara motores de lectura vectorial con y sin filtros empujados."
+    )
+    parser.add_argument("--sintetico", type=int, default=100_000, help="features (0 = omitir)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    casos = [
+        (
+            "otras.geojson",
+            GJSON_OTRAS,
+            ["nombre", "ur_ru"],
+            "ur_ru = 'RURAL' AND nombre <> 'FAJARDO'",
+            None,
+        ),
+        (
+            "parroquiasUrbanas.geojson",
+            GJSON_URBANA,
+            ["dpa_parroq", "dpa_despar", "AD_ZONAL"],
+            None,
+            (-78.55, -0.25, -78.45, -0.10),
+        ),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.sintetico:
+            ruta = escribir_sintetico(os.path.join(tmp, "sintetico.geojson"), args.sintetico)
+            casos.append(
+                (
+                    f"sintetico ({args.sintetico})",
+                    ruta,
+                    ["nombre", "ur_ru"],
+                    "ur_ru = 'RURAL'",
+                    (-78.6, -0.3, -78.4, -0.1),
+                )
+            )
+
+        print(
+            f"{'archivo':<28} {'motor':<8} {'completo':>10} {'filas':>8}"
+            f" {'pushdown':>10} {'filas':>8}"
+        )
+        for nombre, ruta, columnas, where, bbox in casos:
+            for motor, completo, n_completo, filtrado, n_filtrado in comparar_motores(
+                ruta, columnas, where, bbox, args.repeticiones
+            ):
+                print(
+                    f"{nombre:<28} {motor:<8} {completo:9.3f}s {n_completo:8d}"
+                    f" {filtrado:9.3f}s {n_filtrado:8d}"
+                )
+
+
+if __name__ == "__main__":
+    main()
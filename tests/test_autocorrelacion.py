@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from servicios.autocorrelacion import (
+    ALTO_BAJO,
+    BAJO_ALTO,
+    NO_SIGNIFICATIVO,
+    moran_global,
+    moran_local,
+    pesos_por_fila,
+)
+
+
+def _reticula(lado, criterio="rook"):
+    # Adyacencia binaria de una reticula lado x lado (celdas numeradas por filas).
+    pasos = [(0, 1), (1, 0)] if criterio == "rook" else [(0, 1), (1, 0), (1, 1), (1, -1)]
+    izq, der = [], []
+    for f in range(lado):
+        for c in range(lado):
+            for df, dc in pasos:
+                if 0 <= f + df < lado and 0 <= c + dc < lado:
+                    izq.append(f * lado + c)
+                    der.append((f + df) * lado + c + dc)
+    A = sparse.coo_matrix((np.ones(len(izq)), (izq, der)), shape=(lado**2, lado**2))
+    return (A + A.T).tocsr()
+
+
+def _ajedrez(lado):
+    f, c = np.divmod(np.arange(lado**2), lado)
+    return np.where((f + c) % 2 == 0, 1.0, -1.0)
+
+
+def test_moran_ajedrez_rook():
+    # Cada celda tiene solo vecinos del color opuesto: I = -1 exacto.
+    z = _ajedrez(8)
+    resultado = moran_global(z, pesos_por_fila(_reticula(8)), permutaciones=199, rng=np.random.default_rng(0))
+
+    assert resultado["I"] == pytest.approx(-1.0)
+    assert resultado["esperado"] == pytest.approx(-1 / 63)
+    assert resultado["p"] == pytest.approx(1 / 200)
+    assert resultado["z"] < -5
+
+
+def test_moran_ajedrez_queen():
+    # Con queen las diagonales son del mismo color: (Wz)_i = z_i (d_i - r_i) / (d_i + r_i).
+    # 4 esquinas (r=2, d=1), 24 bordes (r=3, d=2) y 36 interiores (r=d=4):
+    # I = (4 * -1/3 + 24 * -1/5) / 64 = -23/240.
+    z = _ajedrez(8)
+    resultado = moran_global(z, pesos_por_fila(_reticula(8, "queen")), permutaciones=9)
+    assert resultado["I"] == pytest.approx(-23 / 240)
+
+
+def test_moran_igual_a_formula_densa():
+    rng = np.random.default_rng(3)
+    A = _reticula(6, "queen")
+    W = pesos_por_fila(A)
+    z = rng.normal(size=36)
+    z = z - z.mean()
+
+    denso = W.toarray()
+    esperado = len(z) / denso.sum() * (z @ denso @ z) / (z @ z)
+    assert moran_global(z, W, permutaciones=9)["I"] == pytest.approx(esperado)
+
+
+def test_moran_local_ajedrez():
+    z = _ajedrez(8)
+    Ii, p, rezago, cuadrante = moran_local(
+        z, pesos_por_fila(_reticula(8)), permutaciones=499, rng=np.random.default_rng(0)
+    )
+
+    assert np.allclose(Ii, -1.0)
+    assert np.allclose(rezago, -z)
+    assert np.all((p > 0) & (p <= 0.5))
+    significativos = cuadrante != NO_SIGNIFICATIVO
+    assert significativos.any()
+    assert set(cuadrante[significativos & (z > 0)]) <= {ALTO_BAJO}
+    assert set(cuadrante[significativos & (z < 0)]) <= {BAJO_ALTO}
+
+
+def test_pesos_por_fila_islas():
+    A = sparse.csr_matrix(np.array([[0, 1, 0], [1, 0, 0], [0, 0, 0]], dtype=float))
+    W = pesos_por_fila(A)
+    assert np.asarray(W.sum(axis=1)).ravel().tolist() == [1.0, 1.0, 0.0]
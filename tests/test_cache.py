@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+
+import pytest
+
+from servicios.cache import CacheDisco, CacheMemoria, VueloUnico
+
+HILOS = 8
+
+
+def _esperar(condicion, limite=5.0):
+    fin = time.monotonic() + limite
+    while not condicion():
+        if time.monotonic() > fin:
+            raise AssertionError("la condicion no se cumplio a tiempo")
+        time.sleep(0.001)
+
+
+def _en_paralelo(funcion, n=HILOS):
+    # Corre funcion() en n hilos; devuelve (hilos, resultados, errores).
+    resultados, errores = [], []
+
+    def correr():
+        try:
+            resultados.append(funcion())
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=correr) for _ in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    return hilos, resultados, errores
+
+
+def _calculo_bloqueado(valor):
+    # calcular() que cuenta sus llamadas y no termina hasta `soltar.set()`.
+    llamadas = []
+    soltar = threading.Event()
+
+    def calcular():
+        llamadas.append(1)
+        soltar.wait(5)
+        return valor
+
+    return calcular, llamadas, soltar
+
+
+def test_vuelo_unico_calcula_una_vez():
+    vuelos = VueloUnico()
+    calcular, llamadas, soltar = _calculo_bloqueado({"valor": 42})
+
+    hilos, resultados, errores = _en_paralelo(lambda: vuelos.ejecutar("clave", calcular))
+    _esperar(lambda: vuelos.estadisticas()["coalescidos"] == HILOS - 1)
+    assert vuelos.en_curso("clave")
+    soltar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(llamadas) == 1
+    assert errores == []
+    assert len(resultados) == HILOS and all(r is resultados[0] for r in resultados)
+    assert vuelos.estadisticas() == {"ejecuciones": 1, "coalescidos": HILOS - 1, "errores": 0, "en_curso": 0}
+    assert not vuelos.en_curso("clave")
+
+
+def test_vuelo_unico_propaga_el_error():
+    vuelos = VueloUnico()
+    soltar = threading.Event()
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        soltar.wait(5)
+        raise RuntimeError("fallo el calculo")
+
+    hilos, resultados, errores = _en_paralelo(lambda: vuelos.ejecutar("clave", calcular))
+    _esperar(lambda: vuelos.estadisticas()["coalescidos"] == HILOS - 1)
+    soltar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(llamadas) == 1
+    assert resultados == []
+    assert len(errores) == HILOS and all(isinstance(e, RuntimeError) for e in errores)
+    assert vuelos.estadisticas()["errores"] == 1
+
+    # Terminado el vuelo fallido, la clave se vuelve a calcular.
+    assert vuelos.ejecutar("clave", lambda: "otra vez") == "otra vez"
+
+
+def test_vuelo_unico_claves_distintas_no_se_esperan():
+    vuelos = VueloUnico()
+    calcular, llamadas, soltar = _calculo_bloqueado("lento")
+
+    hilos, _, _ = _en_paralelo(lambda: vuelos.ejecutar("a", calcular), n=1)
+    _esperar(lambda: vuelos.en_curso("a"))
+    assert vuelos.ejecutar("b", lambda: "rapido") == "rapido"
+    soltar.set()
+    hilos[0].join()
+    assert len(llamadas) == 1
+
+
+def test_cache_memoria_obtener_o_calcular_coalesce():
+    cache = CacheMemoria()
+    calcular, llamadas, soltar = _calculo_bloqueado([1, 2, 3])
+
+    hilos, resultados, errores = _en_paralelo(lambda: cache.obtener_o_calcular("clave", calcular))
+    _esperar(lambda: cache.vuelos.estadisticas()["coalescidos"] == HILOS - 1)
+    soltar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(llamadas) == 1
+    assert errores == []
+    assert all(r is resultados[0] for r in resultados)
+
+    # Ya guardado: no vuelve a calcular ni abre otro vuelo.
+    assert cache.obtener_o_calcular("clave", lambda: pytest.fail("no debia recalcular")) is resultados[0]
+    assert cache.vuelos.estadisticas()["ejecuciones"] == 1
+
+
+def test_cache_memoria_lru_y_al_descartar():
+    descartados = []
+    cache = CacheMemoria(max_items=2, al_descartar=lambda clave, valor: descartados.append((clave, valor)))
+
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.obtener("a")  # "b" queda como la menos usada
+    cache.guardar("c", 3)
+    cache.guardar("a", 10)
+    cache.descartar("c")
+    cache.limpiar()
+
+    assert descartados == [("b", 2), ("a", 1), ("c", 3)]
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def disco(tmp_path):
+    return CacheDisco(str(tmp_path / "cache" / "disco.sqlite"), max_bytes=10_000)
+
+
+def test_cache_disco_falla_tras_cambio_de_version(disco):
+    disco.guardar("todas|calculos", ("mapa", 1), "v1", {"valores": [1, 2, 3]})
+
+    assert disco.obtener("todas|calculos", ("mapa", 1), "v1") == {"valores": [1, 2, 3]}
+    assert disco.obtener("todas|calculos", ("mapa", 1), "v2") is None
+    assert disco.obtener("todas|calculos", ("mapa", 2), "v1", default="nada") == "nada"
+
+    # Guardar con la version nueva borra las anteriores del grupo, no las de otros grupos.
+    disco.guardar("todas|graficos", ("barras",), "v1", "otro grupo")
+    disco.guardar("todas|calculos", ("mapa", 1), "v2", {"valores": [4]})
+    assert disco.obtener("todas|calculos", ("mapa", 1), "v1") is None
+    assert disco.obtener("todas|calculos", ("mapa", 1), "v2") == {"valores": [4]}
+    assert disco.obtener("todas|graficos", ("barras",), "v1") == "otro grupo"
+
+    estadisticas = disco.estadisticas()
+    assert estadisticas["entradas"] == 2
+    assert estadisticas["fallos"] == 3
+
+
+def test_cache_disco_compartida_entre_instancias(disco):
+    disco.guardar("g", "clave", "v1", b"datos")
+    otra = CacheDisco(disco.ruta, max_bytes=disco.max_bytes)
+    assert otra.obtener("g", "clave", "v1") == b"datos"
+
+
+def test_cache_disco_desaloja_hasta_el_90_por_ciento(disco):
+    valor = b"x" * 1000
+    tamano = None
+    for i in range(9):
+        disco.guardar("g", i, "v1", valor)
+        time.sleep(0.002)  # `usado` distinto para cada entrada
+        tamano = tamano or disco.estadisticas()["bytes"]
+    assert disco.estadisticas()["bytes"] == 9 * tamano <= disco.max_bytes
+    assert disco.estadisticas()["desalojos"] == 0
+
+    disco.obtener("g", 0, "v1")  # la entrada 0 pasa a ser la mas reciente
+    time.sleep(0.002)
+    disco.guardar("g", 9, "v1", valor)  # 10 entradas: pasa de max_bytes
+
+    # Se borran las menos usadas (1, 2, ...) hasta bajar al 90%, ni una mas.
+    borrados = math.ceil((10 * tamano - 0.9 * disco.max_bytes) / tamano)
+    estadisticas = disco.estadisticas()
+    assert borrados >= 1
+    assert estadisticas["bytes"] == (10 - borrados) * tamano <= 0.9 * disco.max_bytes
+    assert estadisticas["desalojos"] == borrados
+    presentes = [i for i in range(10) if disco.obtener("g", i, "v1") is not None]
+    assert presentes == [0] + list(range(borrados + 1, 10))
+
+
+def test_cache_disco_nunca_falla_al_guardar(disco):
+    valor = threading.Lock()  # no se puede serializar con pickle
+    assert disco.guardar("g", "clave", "v1", valor) is valor
+    assert disco.obtener("g", "clave", "v1") is None
+    assert disco.estadisticas()["errores"] == 1
@@ -0,0 +1,57 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from servicios.clasificacion import clasificacion, cortes_jenks
+
+
+def _ssd_tramos(valores, cortes):
+    # Suma de cuadrados intra-clase con las clases [c_i, c_i+1) de los cortes.
+    valores = np.sort(np.asarray(valores, dtype=float))
+    clases = np.searchsorted(cortes, valores, side="right")
+    return sum(((t - t.mean()) ** 2).sum() for t in (valores[clases == c] for c in np.unique(clases)))
+
+
+def _jenks_fuerza_bruta(valores, clases):
+    # Prueba todas las formas de partir los valores distintos en `clases` tramos.
+    distintos = np.unique(valores)
+    mejor = None
+    for posiciones in combinations(range(1, len(distintos)), clases - 1):
+        cortes = distintos[list(posiciones)]
+        ssd = _ssd_tramos(valores, cortes)
+        if mejor is None or ssd < mejor[0] - 1e-9:
+            mejor = (ssd, cortes.tolist())
+    return mejor
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_jenks_igual_a_fuerza_bruta(semilla):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(0, 30, rng.integers(8, 14)).astype(float)
+    valores[rng.integers(0, len(valores), 3)] = rng.normal(50, 20, 3)  # con repetidos y atipicos
+    clases = int(rng.integers(2, 5))
+    if len(np.unique(valores)) <= clases:
+        pytest.skip("menos valores distintos que clases")
+
+    ssd, _ = _jenks_fuerza_bruta(valores, clases)
+    cortes = cortes_jenks(valores, clases)
+
+    assert len(cortes) == clases - 1
+    assert cortes == sorted(cortes)
+    assert _ssd_tramos(valores, cortes) == pytest.approx(ssd, abs=1e-9)
+
+
+def test_jenks_grupos_separados():
+    valores = [1, 1, 2, 2, 10, 11, 11, 50, 52, 51]
+    assert cortes_jenks(valores, 3) == [10.0, 50.0]
+
+
+def test_jenks_pocos_valores_distintos():
+    assert cortes_jenks([3, 1, 3, None, float("nan"), 2], 6) == [2.0, 3.0]
+
+
+def test_clasificacion_etiquetas():
+    resultado = clasificacion([1, 1, 2, 2, 10, 11, 11, 50, 52, 51], clases=3, unidad="%", decimales=0)
+    assert resultado["cortes"] == [10, 50]
+    assert resultado["etiquetas"] == ["1% - 10%", "10% - 50%", "50% - 52%"]
@@ -0,0 +1,93 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import connected_components
+from shapely.geometry import box
+
+from servicios.regionalizacion import grafo_adyacencia, skater
+
+CRS = "EPSG:32717"
+LADO_M = 1000.0
+
+
+def _grilla(filas, columnas):
+    # Celdas cuadradas de 1 km en UTM 17S, numeradas fila por fila.
+    celdas = [
+        box(c * LADO_M, f * LADO_M, (c + 1) * LADO_M, (f + 1) * LADO_M)
+        for f in range(filas)
+        for c in range(columnas)
+    ]
+    return gpd.GeoDataFrame(geometry=celdas, crs=CRS)
+
+
+def _es_contigua(A, nodos):
+    n_componentes, _ = connected_components(A[nodos][:, nodos], directed=False)
+    return n_componentes == 1
+
+
+def test_grafo_queen_y_rook():
+    gdf = _grilla(3, 3)
+    queen = grafo_adyacencia(gdf, "queen", area_crs=CRS)
+    rook = grafo_adyacencia(gdf, "rook", area_crs=CRS)
+
+    assert (queen != queen.T).nnz == 0
+    assert np.asarray(rook.sum(axis=1)).ravel().tolist() == [2, 3, 2, 3, 4, 3, 2, 3, 2]
+    assert np.asarray(queen.sum(axis=1)).ravel().tolist() == [3, 5, 3, 5, 8, 5, 3, 5, 3]
+
+
+@pytest.mark.parametrize("semilla", range(10))
+@pytest.mark.parametrize("k", [2, 5, 9])
+def test_skater_regiones_contiguas(semilla, k):
+    gdf = _grilla(6, 7)
+    A = grafo_adyacencia(gdf, "rook", area_crs=CRS)
+    X = np.random.default_rng(semilla).normal(size=(len(gdf), 3))
+
+    etiquetas = skater(X, A, k)
+
+    assert sorted(set(etiquetas.tolist())) == list(range(k))
+    for region in range(k):
+        assert _es_contigua(A, np.flatnonzero(etiquetas == region))
+
+
+def test_skater_separa_bloques_homogeneos():
+    # Mitad izquierda baja y mitad derecha alta: el unico corte bueno es el borde.
+    gdf = _grilla(4, 6)
+    A = grafo_adyacencia(gdf, "rook", area_crs=CRS)
+    columna = np.arange(len(gdf)) % 6
+    X = np.where(columna < 3, 0.0, 10.0)[:, None] + np.random.default_rng(0).normal(0, 0.1, (len(gdf), 1))
+
+    etiquetas = skater(X, A, 2)
+
+    assert len(set(etiquetas[columna < 3])) == 1
+    assert len(set(etiquetas[columna >= 3])) == 1
+    assert etiquetas[0] != etiquetas[-1]
+
+
+def test_skater_respeta_peso_minimo():
+    gdf = _grilla(5, 5)
+    A = grafo_adyacencia(gdf, "rook", area_crs=CRS)
+    X = np.random.default_rng(1).normal(size=(len(gdf), 2))
+    peso = np.full(len(gdf), 1 / len(gdf))
+
+    etiquetas = skater(X, A, 4, peso=peso, min_peso=0.15)
+
+    for region in range(4):
+        nodos = np.flatnonzero(etiquetas == region)
+        assert peso[nodos].sum() >= 0.15 - 1e-12
+        assert _es_contigua(A, nodos)
+
+
+def test_skater_islas_son_regiones():
+    # Dos grupos de celdas separados por 5 km: nunca pueden quedar juntos.
+    gdf = _grilla(2, 2)
+    lejos = gdf.translate(xoff=5 * LADO_M)
+    gdf = gpd.GeoDataFrame(geometry=list(gdf.geometry) + list(lejos), crs=CRS)
+    A = grafo_adyacencia(gdf, "queen", area_crs=CRS)
+    X = np.zeros((len(gdf), 1))
+
+    etiquetas = skater(X, A, 2)
+    assert len(set(etiquetas[:4])) == 1 and len(set(etiquetas[4:])) == 1
+    assert etiquetas[0] != etiquetas[4]
+
+    with pytest.raises(ValueError):
+        skater(X, A, 1)
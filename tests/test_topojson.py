@@ -0,0 +1,121 @@
+from collections import Counter
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from servicios.topojson import codificar_topologia
+
+
+def _capa(geometrias):
+    return gpd.GeoDataFrame(
+        {"nombre": [f"P{i}" for i in range(len(geometrias))]}, geometry=geometrias, crs="EPSG:4326"
+    )
+
+
+def _decodificar(topologia, objeto="parroquias"):
+    # TopoJSON -> poligonos shapely: deshace las diferencias, la cuantizacion y
+    # une los arcos de cada anillo (~i = arco i al reves).
+    escala = np.asarray(topologia["transform"]["scale"])
+    origen = np.asarray(topologia["transform"]["translate"])
+    arcos = [np.cumsum(np.asarray(a), axis=0) * escala + origen for a in topologia["arcs"]]
+
+    def anillo(referencias):
+        tramos = [arcos[i] if i >= 0 else arcos[~i][::-1] for i in referencias]
+        return np.vstack([tramos[0]] + [t[1:] for t in tramos[1:]])
+
+    def poligono(anillos):
+        return Polygon(anillo(anillos[0]), [anillo(a) for a in anillos[1:]])
+
+    geometrias = []
+    for g in topologia["objects"][objeto]["geometries"]:
+        if g["type"] == "Polygon":
+            geometrias.append(poligono(g["arcs"]))
+        else:
+            geometrias.append(MultiPolygon([poligono(p) for p in g["arcs"]]))
+    return geometrias
+
+
+def _referencias(geometria):
+    arcos = geometria["arcs"] if geometria["type"] == "MultiPolygon" else [geometria["arcs"]]
+    return [i for poligono in arcos for anillo in poligono for i in anillo]
+
+
+# Parroquias de juguete cerca de Quito (grados): dos cuadrados que comparten un
+# lado, uno debajo de ambos con un vertice extra en el borde comun y una
+# parroquia separada de dos partes, una de ellas con un hueco.
+LADO = 0.01
+X0, Y0 = -78.5, -0.2
+GEOMETRIAS = [
+    box(X0, Y0, X0 + LADO, Y0 + LADO),
+    box(X0 + LADO, Y0, X0 + 2 * LADO, Y0 + LADO),
+    Polygon([
+        (X0, Y0 - LADO), (X0 + 2 * LADO, Y0 - LADO), (X0 + 2 * LADO, Y0),
+        (X0 + LADO, Y0), (X0, Y0),
+    ]),
+    MultiPolygon([
+        Polygon(
+            [(X0 + 3 * LADO, Y0), (X0 + 4 * LADO, Y0), (X0 + 4 * LADO, Y0 + LADO), (X0 + 3 * LADO, Y0 + LADO)],
+            [[(X0 + 3.4 * LADO, Y0 + 0.4 * LADO), (X0 + 3.6 * LADO, Y0 + 0.4 * LADO),
+              (X0 + 3.6 * LADO, Y0 + 0.6 * LADO), (X0 + 3.4 * LADO, Y0 + 0.6 * LADO)]],
+        ),
+        box(X0 + 3 * LADO, Y0 - 2 * LADO, X0 + 4 * LADO, Y0 - LADO),
+    ]),
+]
+
+
+def test_ida_y_vuelta_conserva_geometrias():
+    topologia = codificar_topologia(_capa(GEOMETRIAS), propiedades=("nombre",))
+    decodificadas = _decodificar(topologia)
+
+    # Cada vertice se mueve a lo sumo medio paso de cuantizacion por eje.
+    paso = max(topologia["transform"]["scale"])
+    assert len(decodificadas) == len(GEOMETRIAS)
+    for original, decodificada in zip(GEOMETRIAS, decodificadas):
+        assert decodificada.is_valid
+        assert decodificada.geom_type == original.geom_type
+        assert decodificada.area == pytest.approx(original.area, rel=1e-3)
+        assert original.symmetric_difference(decodificada).area <= original.length * paso
+        assert original.hausdorff_distance(decodificada) <= paso
+
+    nombres = [g["properties"]["nombre"] for g in topologia["objects"]["parroquias"]["geometries"]]
+    assert nombres == ["P0", "P1", "P2", "P3"]
+
+
+def test_bordes_compartidos_una_sola_vez():
+    topologia = codificar_topologia(_capa(GEOMETRIAS))
+    geometrias = topologia["objects"]["parroquias"]["geometries"]
+
+    usos = Counter()
+    for geometria in geometrias:
+        for i in _referencias(geometria):
+            usos[i if i >= 0 else ~i] += 1
+
+    # Cada arco se guarda una vez y se usa una (borde exterior) o dos veces
+    # (borde entre dos parroquias, recorrido en sentidos opuestos).
+    assert sorted(usos) == list(range(len(topologia["arcs"])))
+    compartidos = [i for i, usos_i in usos.items() if usos_i == 2]
+    assert set(usos.values()) == {1, 2}
+
+    # P0|P1 (lado vertical), P0|P2 y P1|P2 (el borde superior de P2 cortado en el vertice comun).
+    assert len(compartidos) == 3
+    for i in compartidos:
+        duenos = [
+            (n, sentido)
+            for n, geometria in enumerate(geometrias)
+            for sentido, referencia in ((1, i), (-1, ~i))
+            if referencia in _referencias(geometria)
+        ]
+        assert len({n for n, _ in duenos}) == 2
+        assert {sentido for _, sentido in duenos} == {1, -1}
+
+    # Las coordenadas de los arcos son enteros: el primero absoluto, el resto diferencias.
+    assert all(isinstance(c, int) for arco in topologia["arcs"] for punto in arco for c in punto)
+
+
+def test_parroquias_sin_vecinos_no_comparten_arcos():
+    separadas = [box(X0, Y0, X0 + LADO, Y0 + LADO), box(X0 + 2 * LADO, Y0, X0 + 3 * LADO, Y0 + LADO)]
+    topologia = codificar_topologia(_capa(separadas))
+    assert len(topologia["arcs"]) == 2
+    assert [_referencias(g) for g in topologia["objects"]["parroquias"]["geometries"]] == [[0], [1]]